@@ -65,6 +65,21 @@ EMAIL_FROM = 'eugen@django-lessons.com'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = '/home/eugen/django_emails/'
 DJANGO_LESSONS_NOTIFY_EMAIL = os.environ['DJANGO_LESSONS_NOTIFY_EMAIL']
+# coalesce sign up/subscriber notifications into one email per N minutes
+DJANGO_LESSONS_NOTIFY_DIGEST_MINUTES = int(
+    os.environ.get('DJANGO_LESSONS_NOTIFY_DIGEST_MINUTES', 0)
+)
+# Prometheus scrapes /metrics with "Authorization: Bearer <token>"
+DJANGO_LESSONS_METRICS_TOKEN = os.environ.get('DJANGO_LESSONS_METRICS_TOKEN')
+# anonymous full page cache (0 disables it)
+DJANGO_LESSONS_PAGE_CACHE_SECONDS = int(
+    os.environ.get('DJANGO_LESSONS_PAGE_CACHE_SECONDS', 600)
+)
+# static pages (about, privacy, ...) built by prerender_pages command
+DJANGO_LESSONS_PRERENDER_ROOT = os.environ.get(
+    'DJANGO_LESSONS_PRERENDER_ROOT',
+    '/opt/django-lessons/prerendered'
+)
 
 # Provider specific settings
 SOCIALACCOUNT_PROVIDERS = {
@@ -105,3 +120,7 @@ PAYPAL_PLAN_ANNUAL_ID = os.environ.get('PAYPAL_PLAN_ANNUAL_ID')
 PAYPAL_CLIENT_ID = os.environ.get('PAYPAL_CLIENT_ID')
 PAYPAL_CLIENT_SECRET = os.environ.get('PAYPAL_CLIENT_SECRET')
 PAYPAL_WEBHOOK_ID = os.environ.get('PAYPAL_WEBHOOK_ID')
+# point payment clients to local mock server (payments_mock_server command),
+# e.g. http://127.0.0.1:12111
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE')
+PAYPAL_API_ENDPOINT = os.environ.get('PAYPAL_API_ENDPOINT')
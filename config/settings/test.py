@@ -5,4 +5,11 @@ STRIPE_PUBLISHABLE_KEY = ""
 STRIPE_PLAN_MONTHLY_ID = ""
 STRIPE_PLAN_ANNUAL_ID = ""
 STRIPE_WEBHOOK_SIGNING_KEY = ""
-TEST = True
\ No newline at end of file
+PAYPAL_PLAN_MONTHLY_ID = ""
+PAYPAL_PLAN_ANNUAL_ID = ""
+PAYPAL_CLIENT_ID = ""
+PAYPAL_CLIENT_SECRET = ""
+PAYPAL_WEBHOOK_ID = ""
+TEST = True
+# tests which need full page cache enable it with override_settings
+DJANGO_LESSONS_PAGE_CACHE_SECONDS = 0
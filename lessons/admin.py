@@ -5,8 +5,8 @@ from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 
-from .models import (Contact, Course, Lesson, LessonGroup, Subscription,
-                     UserProfile)
+from .models import (Contact, Course, Lesson, LessonGroup, Notification,
+                     PaymentEvent, Subscription, UserProfile)
 
 
 class ProfileInline(admin.StackedInline):
@@ -87,6 +87,8 @@ class CustomUserAdmin(UserAdmin):
     inlines = [
         ProfileInline,
     ]
+    # columns below are read from user profile
+    list_select_related = ('profile',)
     list_filter = UserAdmin.list_filter + (
         IsPROListFilter,
         HasDiscountListFilter,
@@ -123,6 +125,32 @@ class SubscriptionAdmin(admin.ModelAdmin):
     pass
 
 
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = (
+        'title',
+        'status',
+        'attempts',
+        'created_at',
+        'next_attempt_at',
+        'sent_at'
+    )
+    list_filter = ('status',)
+
+
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = (
+        'event_type',
+        'event_id',
+        'status',
+        'attempts',
+        'received_at',
+        'processed_at',
+        'processing_time'
+    )
+    list_filter = ('provider', 'status', 'event_type')
+    search_fields = ('event_id',)
+
+
 class CourseAdmin(admin.ModelAdmin):
     pass
 
@@ -139,6 +167,8 @@ admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Subscription, SubscriptionAdmin)
 admin.site.register(Contact, ContactAdmin)
+admin.site.register(Notification, NotificationAdmin)
+admin.site.register(PaymentEvent, PaymentEventAdmin)
 admin.site.register(Course, CourseAdmin)
 admin.site.register(Lesson, LessonAdmin)
 admin.site.register(LessonGroup, LessonGroupAdmin)
@@ -0,0 +1,329 @@
+"""
+End to end benchmark of public pages (used by bench_site management
+command).
+
+seed() creates a dataset which looks like production: lessons with text,
+code and PRO blocks, tags, courses and the tag index page. run() requests
+scenario URLs from several threads at once, either in process (with
+django test client; number of SQL queries per request is recorded too)
+or over HTTP against a running server.
+"""
+import json
+import logging
+import math
+import random
+import threading
+import time
+from itertools import count
+
+import requests
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from wagtail.core.models import Page
+
+from .models import FREE, PRO, Course, Lesson, LessonGroup, LessonTagIndex
+from .utils import default_host
+
+logger = logging.getLogger(__name__)
+
+SLUG_PREFIX = 'bench-'
+TAGS_PAGE_SLUG = 'tags'
+HTTP_TIMEOUT = 30
+
+WORDS = (
+    "django model view template queryset migration form admin signal "
+    "middleware cache deployment postgres docker nginx gunicorn celery "
+    "wagtail stripe paypal test fixture url request response session "
+    "authentication permission serializer api static media"
+).split()
+
+CODE = '''
+class {name}(models.Model):
+    title = models.CharField(max_length=128)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.title
+'''
+
+STATIC_PAGES = [
+    'privacy',
+    'about',
+    'prices',
+    'mission',
+]
+
+
+def sentence(rnd, length):
+    return " ".join(rnd.choice(WORDS) for _ in range(length)).capitalize()
+
+
+def lesson_content(rnd, number):
+    content = []
+    for index in range(rnd.randint(4, 10)):
+        content.append({
+            'type': 'paragraph',
+            'value': f"<p>{sentence(rnd, 60)}.</p>"
+        })
+        if index % 2:
+            content.append({
+                'type': 'code',
+                'value': {
+                    'code': CODE.format(name=f"Model{number}x{index}"),
+                    'lang': 'python'
+                }
+            })
+    content.append({
+        'type': 'pro_paragraph',
+        'value': f"<p>{sentence(rnd, 80)}.</p>"
+    })
+
+    return json.dumps(content)
+
+
+def tags_page(homepage):
+    page = LessonTagIndex.objects.filter(slug=TAGS_PAGE_SLUG).first()
+
+    if page is None:
+        page = LessonTagIndex(title="Tags", slug=TAGS_PAGE_SLUG)
+        homepage.add_child(instance=page)
+        page.save_revision().publish()
+
+    return page
+
+
+def seed(lessons=200, courses=10, tags=30, random_seed=0):
+    """
+    Creates (published) benchmark lessons and courses, unless there are
+    already enough of them. Returns number of created lessons.
+    """
+    rnd = random.Random(random_seed)
+    homepage = Page.objects.get(url_path='/home/')
+    tags_page(homepage)
+    tag_names = [f"{rnd.choice(WORDS)}-{number}" for number in range(tags)]
+
+    existing = Lesson.objects.filter(slug__startswith=SLUG_PREFIX).count()
+    for number in range(existing + 1, lessons + 1):
+        lesson = Lesson(
+            title=sentence(rnd, 5),
+            slug=f"{SLUG_PREFIX}lesson-{number}",
+            short_description=f"<p>{sentence(rnd, 25)}.</p>",
+            # about one lesson in four is PRO
+            lesson_type=PRO if rnd.random() < 0.25 else FREE,
+            script=f"<p>{sentence(rnd, 200)}.</p>",
+            content=lesson_content(rnd, number),
+        )
+        homepage.add_child(instance=lesson)
+        lesson.tags.add(*rnd.sample(tag_names, min(3, len(tag_names))))
+        lesson.save_revision().publish()
+
+    all_lessons = list(
+        Lesson.objects.filter(slug__startswith=SLUG_PREFIX).order_by('id')
+    )
+    existing_courses = Course.objects.filter(
+        slug__startswith=SLUG_PREFIX
+    ).count()
+    for number in range(existing_courses + 1, courses + 1):
+        course = Course(
+            title=sentence(rnd, 4),
+            slug=f"{SLUG_PREFIX}course-{number}",
+            short_description=f"<p>{sentence(rnd, 20)}.</p>"
+        )
+        homepage.add_child(instance=course)
+        course.save_revision().publish()
+        for order, lesson in enumerate(
+            rnd.sample(all_lessons, min(8, len(all_lessons))),
+            start=1
+        ):
+            LessonGroup.objects.create(
+                title=f"Part {order}",
+                short_description="Part",
+                order=order,
+                lesson=lesson,
+                course=course
+            )
+
+    return max(0, lessons - existing)
+
+
+def scenarios(sample=20, random_seed=0):
+    """
+    Returns a dictionary scenario name => list of URLs (paths) to request.
+    """
+    rnd = random.Random(random_seed)
+    lessons = list(Lesson.objects.filter(live=True).order_by('id'))
+    lessons = rnd.sample(lessons, min(sample, len(lessons)))
+    courses = list(Course.objects.filter(live=True).order_by('id')[:sample])
+    tag_names = list(
+        Lesson.tags.through.objects.values_list(
+            'tag__name', flat=True
+        ).distinct().order_by('tag__name')[:sample]
+    )
+    page = LessonTagIndex.objects.filter(live=True).first()
+    index = reverse('index')
+
+    ret = {
+        'index': [index] + [f"{index}?page={number}" for number in (2, 3)],
+        'index_search': [
+            f"{index}?q={word}" for word in rnd.sample(WORDS, 3)
+        ],
+        'index_ltype': [f"{index}?ltype={FREE}", f"{index}?ltype={PRO}"],
+        'typeahead': [
+            f"{reverse('typeahead')}?q={word[:3]}"
+            for word in rnd.sample(WORDS, 3)
+        ],
+        'lesson': [lesson.get_absolute_url() for lesson in lessons],
+        'lesson_course_view': [
+            f"{lesson.get_absolute_url()}?view=course" for lesson in lessons
+        ],
+        'course': [course.url for course in courses],
+        'tag_index': [
+            f"{page.url}?tag={name}" for name in tag_names
+        ] if page else [],
+        'feed': [reverse('feed')],
+        'static': [reverse(name) for name in STATIC_PAGES],
+    }
+
+    return {name: urls for name, urls in ret.items() if urls}
+
+
+def percentile(values, percent):
+    """
+    Nearest rank percentile of (sorted) values.
+    """
+    if not values:
+        return None
+
+    rank = math.ceil(percent / 100 * len(values))
+
+    return values[max(rank, 1) - 1]
+
+
+def rounded(value):
+    return None if value is None else round(value, 2)
+
+
+class InProcessClient:
+    """
+    Requests pages with django test client, counting SQL queries.
+    """
+
+    def __init__(self):
+        # test client's default 'testserver' is allowed only in tests
+        self._client = Client(HTTP_HOST=default_host())
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self._client.get(url)
+
+        return response.status_code, len(queries)
+
+    def close(self):
+        # every worker thread has its own database connection
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+
+
+class HttpClient:
+    """
+    Requests pages from a running server (number of queries is unknown).
+    """
+
+    def __init__(self, base_url):
+        self._base_url = base_url.rstrip('/')
+        self._session = requests.Session()
+
+    def get(self, url):
+        response = self._session.get(
+            f"{self._base_url}{url}",
+            timeout=HTTP_TIMEOUT,
+            allow_redirects=False
+        )
+
+        return response.status_code, None
+
+    def close(self):
+        self._session.close()
+
+
+def run(urls, total, concurrency=1, base_url=None):
+    """
+    Requests urls (round robin) total times, from concurrency threads.
+    Returns a dictionary with throughput, latency percentiles (ms) and
+    queries per request. A request which raises is counted as an error.
+    """
+    numbers = count()
+    lock = threading.Lock()
+    latencies = []
+    queries = []
+    statuses = {}
+
+    def worker():
+        client = HttpClient(base_url) if base_url else InProcessClient()
+        try:
+            while True:
+                with lock:
+                    number = next(numbers)
+                if number >= total:
+                    return
+                started = time.perf_counter()
+                try:
+                    status, num_queries = client.get(
+                        urls[number % len(urls)]
+                    )
+                except Exception as error:
+                    # counted as an error, so a thread does not stop early
+                    # and results cover all requests
+                    logger.warning(f"Request failed: {error!r}")
+                    status, num_queries = 'error', None
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if num_queries is not None:
+                        queries.append(num_queries)
+        finally:
+            client.close()
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker()
+    else:
+        threads = [
+            threading.Thread(target=worker) for _ in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(
+        number for status, number in statuses.items()
+        if status == 'error' or status >= 400
+    )
+
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'errors': errors,
+        'statuses': {str(status): n for status, n in statuses.items()},
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(len(latencies) / duration, 2)
+        if duration else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2)
+            if latencies else None,
+            'p50': rounded(percentile(latencies, 50)),
+            'p95': rounded(percentile(latencies, 95)),
+            'p99': rounded(percentile(latencies, 99)),
+            'max': rounded(latencies[-1] if latencies else None),
+        },
+        'queries_per_request': {
+            'mean': round(sum(queries) / len(queries), 2),
+            'max': max(queries),
+        } if queries else None,
+    }
@@ -0,0 +1,377 @@
+"""
+Caches of rendered/computed lesson content.
+
+All entries live in Django's default cache, so they are shared between
+gunicorn workers. Each cache counts its hits and misses (see stats),
+which is the way to check if caching is effective at all.
+"""
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import metrics
+from .models import FREE, PRO, Course, Lesson, LessonTag
+from .utils import incr_counter
+
+STATS_KEY = 'lessons:stats:{name}:{what}'
+HIT = 'hits'
+MISS = 'misses'
+
+LESSON_BODY = 'lesson_body'
+HIGHLIGHT = 'highlight'
+LESSON_BODY_KEY = 'lessons:body:{id}:{variant}:{version}'
+# entries are versioned, old ones are just left to expire
+LESSON_BODY_TIMEOUT = 7 * 24 * 3600
+
+LESSON_SEQUENCE = 'lesson_sequence'
+LESSON_SEQUENCE_KEY = 'lessons:sequence'
+
+LESSON_CARD = 'lesson_card'
+LESSON_CARD_KEY = 'lessons:card:{id}'
+
+COURSE_NAV = 'course_nav'
+COURSE_NAV_KEY = 'lessons:course_nav'
+
+TAG_CLOUD = 'tag_cloud'
+TAG_CLOUD_KEY = 'lessons:tag_cloud'
+
+# Names of caches reported by stats()
+CACHE_NAMES = [
+    LESSON_BODY,
+    HIGHLIGHT,
+    LESSON_SEQUENCE,
+    LESSON_CARD,
+    COURSE_NAV,
+    TAG_CLOUD,
+]
+
+# Neighbor (next/previous) lesson as displayed on lesson page; html is
+# the rendered lesson card
+LessonCard = namedtuple('LessonCard', ['id', 'title', 'url', 'html'])
+
+
+def hit(name):
+    incr_counter(STATS_KEY.format(name=name, what=HIT))
+    metrics.cache_hit()
+
+
+def miss(name):
+    incr_counter(STATS_KEY.format(name=name, what=MISS))
+    metrics.cache_miss()
+
+
+def stats():
+    """
+    Returns a dictionary cache name => {'hits': ..., 'misses': ...}
+    """
+    ret = {}
+    for name in CACHE_NAMES:
+        ret[name] = {
+            HIT: cache.get(STATS_KEY.format(name=name, what=HIT), 0),
+            MISS: cache.get(STATS_KEY.format(name=name, what=MISS), 0),
+        }
+
+    return ret
+
+
+def reset_stats():
+    cache.delete_many([
+        STATS_KEY.format(name=name, what=what)
+        for name in CACHE_NAMES
+        for what in (HIT, MISS)
+    ])
+
+
+def is_pro_block(block):
+    return block.block_type.startswith('pro_')
+
+
+def lesson_body_key(lesson, variant):
+    version = lesson.latest_revision_created_at
+
+    if version:
+        version = version.timestamp()
+
+    return LESSON_BODY_KEY.format(
+        id=lesson.id,
+        variant=variant,
+        version=version
+    )
+
+
+def render_lesson_body(lesson, variant):
+    """
+    Renders lesson.content StreamField. FREE variant (for non PRO users)
+    leaves out all pro_* blocks (pro_paragraph, pro_code etc).
+    """
+    blocks = [
+        block for block in lesson.content
+        if variant == PRO or not is_pro_block(block)
+    ]
+
+    return render_to_string(
+        'lessons/includes/_lesson_body.html',
+        {'blocks': blocks}
+    )
+
+
+def lesson_body(lesson, variant):
+    """
+    Rendered lesson.content for given variant (FREE or PRO), from cache
+    if possible.
+    """
+    key = lesson_body_key(lesson, variant)
+    html = cache.get(key)
+
+    if html is not None:
+        hit(LESSON_BODY)
+        return mark_safe(html)
+
+    miss(LESSON_BODY)
+    html = render_lesson_body(lesson, variant)
+    cache.set(key, html, LESSON_BODY_TIMEOUT)
+
+    return html
+
+
+def invalidate_lesson_body(lesson):
+    cache.delete_many([
+        lesson_body_key(lesson, variant)
+        for variant in (FREE, PRO)
+    ])
+
+
+def warm_lesson_body(lesson):
+    """
+    Renders (and caches) all variants of lesson content. Called when
+    lesson is published, so that the expensive part of rendering (e.g. code
+    highlighting) happens at publish time and not on first lesson view.
+    """
+    for variant in (FREE, PRO):
+        lesson_body(lesson, variant)
+
+
+def build_lesson_sequence():
+    """
+    (orders, ids) of all live lessons, sorted by order.
+    """
+    rows = Lesson.objects.filter(live=True).order_by(
+        'order'
+    ).values_list('order', 'id')
+
+    return (
+        [order for order, _ in rows],
+        [lesson_id for _, lesson_id in rows],
+    )
+
+
+def rebuild_lesson_sequence():
+    sequence = build_lesson_sequence()
+    cache.set(LESSON_SEQUENCE_KEY, sequence, None)
+
+    return sequence
+
+
+def lesson_sequence():
+    sequence = cache.get(LESSON_SEQUENCE_KEY)
+
+    if sequence is not None:
+        hit(LESSON_SEQUENCE)
+        return sequence
+
+    miss(LESSON_SEQUENCE)
+    return rebuild_lesson_sequence()
+
+
+def lesson_neighbor_ids(lesson):
+    """
+    Returns (prev_id, next_id) of live lessons just before and just after
+    given lesson (by order). Missing neighbor is None.
+    """
+    orders, ids = lesson_sequence()
+    prev_index = bisect_left(orders, lesson.order) - 1
+    next_index = bisect_right(orders, lesson.order)
+
+    prev_id = ids[prev_index] if prev_index >= 0 else None
+    next_id = ids[next_index] if next_index < len(ids) else None
+
+    return prev_id, next_id
+
+
+def lesson_card_key(lesson_id):
+    return LESSON_CARD_KEY.format(id=lesson_id)
+
+
+def render_lesson_card(lesson):
+    """
+    LessonCard of a lesson loaded with Lesson.objects.for_listing().
+    """
+    return LessonCard(
+        id=lesson.id,
+        title=lesson.title,
+        url=lesson.get_absolute_url(),
+        html=render_to_string(
+            'lessons/includes/_lesson.html',
+            {'lesson': lesson}
+        )
+    )
+
+
+def lesson_cards(ids):
+    """
+    Dictionary id => LessonCard of given lessons. Cards missing in cache
+    are rendered (one query for all of them) and cached.
+    """
+    keys = {lesson_card_key(_id): _id for _id in ids}
+    cards = {
+        keys[key]: card._replace(html=mark_safe(card.html))
+        for key, card in cache.get_many(keys).items()
+    }
+    for _ in cards:
+        hit(LESSON_CARD)
+
+    missing = [_id for _id in ids if _id not in cards]
+    if missing:
+        for lesson in Lesson.objects.for_listing().filter(id__in=missing):
+            miss(LESSON_CARD)
+            cards[lesson.id] = render_lesson_card(lesson)
+        cache.set_many({
+            lesson_card_key(_id): cards[_id]
+            for _id in missing if _id in cards
+        }, None)
+
+    return cards
+
+
+def invalidate_lesson_card(lesson):
+    """
+    Card shows title, description, image and tags of the lesson, all of
+    which change only with a new published revision.
+    """
+    cache.delete(lesson_card_key(lesson.id))
+
+
+def lesson_neighbors(lesson):
+    """
+    Returns (prev, next) LessonCard of live lessons just before and just
+    after given lesson. Both come from cache (no query) once cached.
+    """
+    prev_id, next_id = lesson_neighbor_ids(lesson)
+    ids = [_id for _id in (prev_id, next_id) if _id]
+
+    if not ids:
+        return None, None
+
+    cards = lesson_cards(ids)
+
+    return cards.get(prev_id), cards.get(next_id)
+
+
+def lesson_group_neighbors(lesson_group, lesson_groups):
+    """
+    Returns (prev, next) lesson groups of lesson_group within
+    lesson_groups - ordered lesson groups of the same course.
+    """
+    ids = [item.id for item in lesson_groups]
+
+    try:
+        index = ids.index(lesson_group.id)
+    except ValueError:
+        return None, None
+
+    prev_item = lesson_groups[index - 1] if index > 0 else None
+    next_item = lesson_groups[index + 1] if index + 1 < len(ids) else None
+
+    return prev_item, next_item
+
+
+def build_course_nav():
+    courses = Course.objects.filter(live=True).order_by(
+        '-first_published_at'
+    )
+
+    return [
+        {
+            'id': course.id,
+            'title': course.title,
+            'slug': course.slug,
+            'url': course.get_url(),
+        }
+        for course in courses
+    ]
+
+
+def course_nav():
+    """
+    Live courses as a list of dictionaries with id, title, slug and url
+    keys, newest first. Used by navigation menu on every page.
+    """
+    nav = cache.get(COURSE_NAV_KEY)
+
+    if nav is not None:
+        hit(COURSE_NAV)
+        return nav
+
+    miss(COURSE_NAV)
+    nav = build_course_nav()
+    cache.set(COURSE_NAV_KEY, nav, None)
+
+    return nav
+
+
+def invalidate_course_nav():
+    cache.delete(COURSE_NAV_KEY)
+
+
+def build_tag_cloud():
+    rows = LessonTag.objects.filter(
+        content_object__live=True
+    ).values(
+        'tag__name',
+        'tag__slug'
+    ).annotate(
+        count=Count('id')
+    ).order_by('tag__name')
+
+    return [
+        {
+            'name': row['tag__name'],
+            'slug': row['tag__slug'],
+            'count': row['count'],
+        }
+        for row in rows
+    ]
+
+
+def tag_cloud():
+    """
+    Tags of live lessons as a list of dictionaries with name, slug and
+    count (of live lessons) keys, sorted by name. Used by the sidebar of
+    lesson listings.
+    """
+    cloud = cache.get(TAG_CLOUD_KEY)
+
+    if cloud is not None:
+        hit(TAG_CLOUD)
+        return cloud
+
+    miss(TAG_CLOUD)
+    cloud = build_tag_cloud()
+    cache.set(TAG_CLOUD_KEY, cloud, None)
+
+    return cloud
+
+
+def popular_tags():
+    """
+    Same as tag_cloud, most used tags first.
+    """
+    return sorted(tag_cloud(), key=lambda tag: (-tag['count'], tag['name']))
+
+
+def invalidate_tag_cloud():
+    cache.delete(TAG_CLOUD_KEY)
@@ -0,0 +1,87 @@
+"""
+Conditional GET (ETag / Last-Modified) for lesson and course views (feeds
+have validators of their cached documents, see lessons.feed).
+
+Validators are computed before the view runs, from publication time of
+the displayed page and the time lessons content changed last (any publish
+or unpublish, see page_cache.content_changed_at - a lesson page displays
+its neighbors, every page displays courses). Unchanged pages are answered
+with 304 without rendering anything.
+
+ETag includes the audience (anonymous, user without PRO, PRO user), so a
+PRO variant of a lesson is never validated for a user who lost PRO access.
+Last-Modified cannot tell variants apart and is sent to anonymous
+visitors only.
+"""
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.views.decorators.http import condition
+
+from . import page_cache
+
+ANONYMOUS = 'anonymous'
+
+
+def variant(request):
+    if not request.user.is_authenticated:
+        return ANONYMOUS
+
+    is_pro = request.entitlement.is_pro
+
+    # navigation displays user's name
+    return f"user-{request.user.id}-{'pro' if is_pro else 'free'}"
+
+
+def compute_validators(request, name, published_at):
+    """
+    Returns (etag, last_modified) of resource called name, last published
+    at published_at (None if it does not matter).
+    """
+    changed_at = page_cache.content_changed_at()
+    audience = variant(request)
+    version = ":".join([
+        name,
+        str(published_at.timestamp() if published_at else None),
+        str(changed_at.timestamp()),
+        audience
+    ])
+    etag = hashlib.sha1(version.encode('utf-8')).hexdigest()
+
+    last_modified = None
+    if audience == ANONYMOUS:
+        last_modified = max(
+            moment for moment in (published_at, changed_at) if moment
+        )
+
+    return f'"{etag}"', last_modified
+
+
+def conditional(resource):
+    """
+    Decorator of views which supports conditional GET.
+
+    resource(request, *args, **kwargs) returns (name, published_at) of
+    displayed page, or None (no validators, e.g. page does not exist).
+    """
+    def validators(request, *args, **kwargs):
+        # both etag and last modified functions need them
+        if not hasattr(request, 'validators'):
+            request.validators = (None, None)
+            # pending messages would not be displayed
+            if request.method in ('GET', 'HEAD') and not len(
+                get_messages(request)
+            ):
+                ret = resource(request, *args, **kwargs)
+                if ret is not None:
+                    request.validators = compute_validators(request, *ret)
+
+        return request.validators
+
+    def etag(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
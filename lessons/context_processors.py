@@ -1,11 +1,7 @@
-from .models import Course
+from .caching import course_nav
 
 
 def courses(request):
-    all_courses = Course.objects.order_by(
-        '-first_published_at'
-    )
-
     return {
-        'courses': all_courses,
+        'courses': course_nav(),
     }
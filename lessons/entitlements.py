@@ -0,0 +1,119 @@
+"""
+What current user is entitled to (PRO lessons, discount).
+
+EntitlementMiddleware attaches an Entitlement snapshot to each request as
+request.entitlement. Snapshot is computed once per request (and only if
+used); profile dates it is computed from are cached per user for a short
+time, so most requests don't query UserProfile at all.
+"""
+import datetime
+
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .models import UserProfile
+
+ENTITLEMENT_KEY = 'lessons:entitlement:{user_id}'
+ENTITLEMENT_TIMEOUT = 300
+
+
+class Entitlement:
+    """
+    Same rules as UserProfile.is_pro_user and UserProfile.discount.
+    """
+
+    def __init__(
+        self,
+        is_authenticated=False,
+        pro_enddate=None,
+        discount_enddate=None,
+        today=None
+    ):
+        _today = today or datetime.date.today()
+
+        self.is_authenticated = is_authenticated
+        self.pro_enddate = pro_enddate
+        self.discount_enddate = discount_enddate
+
+        self.has_discount = bool(
+            isinstance(discount_enddate, datetime.date) and
+            _today < discount_enddate
+        )
+        self.is_pro = self.has_discount or bool(
+            pro_enddate and _today < pro_enddate
+        )
+
+    @property
+    def expires(self):
+        """
+        Date when PRO access ends (None if user is not a PRO).
+        """
+        if not self.is_pro:
+            return None
+
+        dates = [
+            some_date
+            for some_date in (self.pro_enddate, self.discount_enddate)
+            if some_date
+        ]
+
+        return max(dates)
+
+    def __str__(self):
+        return f"Entitlement(is_pro={self.is_pro}, expires={self.expires})"
+
+    def __repr__(self):
+        return str(self)
+
+
+def entitlement_key(user_id):
+    return ENTITLEMENT_KEY.format(user_id=user_id)
+
+
+def profile_dates(user):
+    """
+    Returns a dictionary with pro_enddate and discount_enddate of user's
+    profile (from cache if possible).
+    """
+    key = entitlement_key(user.id)
+    dates = cache.get(key)
+
+    if dates is not None:
+        return dates
+
+    profile = UserProfile.objects.filter(user_id=user.id).values(
+        'pro_enddate',
+        'discount_enddate'
+    ).first()
+
+    dates = profile or {'pro_enddate': None, 'discount_enddate': None}
+    cache.set(key, dates, ENTITLEMENT_TIMEOUT)
+
+    return dates
+
+
+def get_entitlement(user):
+    if not user.is_authenticated:
+        return Entitlement()
+
+    return Entitlement(is_authenticated=True, **profile_dates(user))
+
+
+def invalidate_entitlement(user_id):
+    cache.delete(entitlement_key(user_id))
+
+
+class EntitlementMiddleware:
+    """
+    Must be placed after django's AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.entitlement = SimpleLazyObject(
+            lambda: get_entitlement(request.user)
+        )
+
+        return self.get_response(request)
@@ -1,5 +1,60 @@
+"""
+RSS and Atom feeds of latest lessons, lessons of a tag and lessons of a
+course.
+
+Feed documents are built once and kept in Django's default cache. They
+are keyed by the time lessons content changed last (see
+page_cache.content_changed_at), so publish/unpublish of a lesson makes
+all of them stale; feeds the lesson belongs to are built again right
+after (see signals), other feeds on their first poll. A poll reads one
+cache entry and is answered with 304 if feed reader has current document
+(ETag / Last-Modified of the document).
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
 from django.contrib.syndication.views import Feed
-from .models import Lesson
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.http import http_date, urlencode
+from taggit.models import Tag
+
+from . import page_cache
+from .models import Course, Lesson, LessonTagIndex
+from .utils import default_host
+
+logger = logging.getLogger(__name__)
+
+DJANGO_LESSONS_FEED_ITEMS = 'DJANGO_LESSONS_FEED_ITEMS'
+FEED_ITEMS = 20
+
+FEED_KEY = 'lessons:feed:{version}:{kind}:{slug}:{feed_format}'
+# feeds are rebuilt on publish anyway; timeout only limits garbage
+FEED_TIMEOUT = 7 * 24 * 3600
+
+LATEST = 'latest'
+TAG = 'tag'
+COURSE = 'course'
+
+RSS = 'rss'
+ATOM = 'atom'
+FEED_TYPES = {
+    RSS: Rss201rev2Feed,
+    ATOM: Atom1Feed,
+}
+
+# stored for unknown tags/courses, so that they do not query either
+MISSING = 'missing'
+
+
+def feed_items():
+    return getattr(settings, DJANGO_LESSONS_FEED_ITEMS, FEED_ITEMS)
 
 
 class LatestLessonsFeed(Feed):
@@ -7,13 +62,181 @@ class LatestLessonsFeed(Feed):
     link = "/latest/"
     description = "Keep track of latest Lessons."
 
-    def items(self):
-        return Lesson.objects.filter(live=True).order_by(
+    def get_object_by_slug(self, slug):
+        return None
+
+    def lessons(self, obj):
+        return Lesson.objects.for_listing().filter(live=True)
+
+    def items(self, obj):
+        return self.lessons(obj).order_by(
             '-first_published_at'
-        )[:5]
+        )[:feed_items()]
 
     def item_title(self, item):
         return item.title
 
     def item_description(self, item):
         return item.short_description
+
+    def item_pubdate(self, item):
+        return item.first_published_at
+
+    def item_updateddate(self, item):
+        return item.last_published_at
+
+
+class TagLessonsFeed(LatestLessonsFeed):
+
+    def get_object_by_slug(self, slug):
+        return Tag.objects.filter(slug=slug).first()
+
+    def title(self, obj):
+        return f"Django Lessons: {obj.name}"
+
+    def description(self, obj):
+        return f"Keep track of latest Lessons about {obj.name}."
+
+    def link(self, obj):
+        page = LessonTagIndex.objects.live().first()
+
+        if page is None:
+            return "/"
+
+        return f"{page.url}?{urlencode({'tag': obj.name})}"
+
+    def lessons(self, obj):
+        return super().lessons(obj).filter(tags__slug=obj.slug)
+
+
+class CourseLessonsFeed(LatestLessonsFeed):
+
+    def get_object_by_slug(self, slug):
+        return Course.objects.live().filter(slug=slug).first()
+
+    def title(self, obj):
+        return f"Django Lessons: {obj.title}"
+
+    def description(self, obj):
+        return f"Lessons of {obj.title} course."
+
+    def link(self, obj):
+        return obj.url
+
+    def lessons(self, obj):
+        return super().lessons(obj).filter(lesson_groups__course=obj)
+
+
+FEEDS = {
+    LATEST: LatestLessonsFeed,
+    TAG: TagLessonsFeed,
+    COURSE: CourseLessonsFeed,
+}
+
+
+def feed_key(kind, slug, feed_format):
+    return FEED_KEY.format(
+        version=page_cache.content_changed_at().timestamp(),
+        kind=kind,
+        slug=slug,
+        feed_format=feed_format
+    )
+
+
+def build(kind, slug=None, feed_format=RSS):
+    """
+    Builds feed document and stores it in cache. Returns the document (a
+    dictionary) or MISSING.
+    """
+    key = feed_key(kind, slug, feed_format)
+    feed = FEEDS[kind]()
+    feed.feed_type = FEED_TYPES[feed_format]
+    obj = feed.get_object_by_slug(slug)
+
+    if kind != LATEST and obj is None:
+        cache.set(key, MISSING, FEED_TIMEOUT)
+        return MISSING
+
+    # links are absolute, built from the current site (django.contrib.sites)
+    request = RequestFactory().get('/', HTTP_HOST=default_host())
+    generator = feed.get_feed(obj, request)
+    content = generator.writeString('utf-8').encode('utf-8')
+    document = {
+        'content': content,
+        'content_type': generator.content_type,
+        'etag': f'"{hashlib.sha1(content).hexdigest()}"',
+        'built_at': int(time.time()),
+    }
+    cache.set(key, document, FEED_TIMEOUT)
+    logger.debug(f"Built {feed_format} feed {kind} {slug or ''}")
+
+    return document
+
+
+def document(kind, slug=None, feed_format=RSS):
+    """
+    Feed document from cache (built if it is not there yet).
+    """
+    ret = cache.get(feed_key(kind, slug, feed_format))
+
+    if ret is None:
+        ret = build(kind, slug, feed_format)
+
+    return ret
+
+
+def warm(lesson_id):
+    """
+    Builds feeds lesson is listed in: latest, feeds of its tags and its
+    courses.
+    """
+    lesson = Lesson.objects.filter(id=lesson_id).first()
+    feeds = [(LATEST, None)]
+
+    if lesson is not None:
+        feeds += [(TAG, tag.slug) for tag in lesson.tags.all()]
+        feeds += [
+            (COURSE, course.slug)
+            for course in Course.objects.live().filter(
+                lesson_groups__lesson=lesson
+            ).distinct()
+        ]
+
+    for kind, slug in feeds:
+        for feed_format in FEED_TYPES:
+            build(kind, slug, feed_format)
+
+
+def rebuild(lesson):
+    """
+    Called on lesson publish/unpublish: builds feeds of the lesson once
+    the transaction commits (and page cache purge set new content
+    version).
+    """
+    lesson_id = lesson.id
+    transaction.on_commit(lambda: warm(lesson_id))
+
+
+def feed_view(request, kind=LATEST, slug=None, feed_format=RSS):
+    ret = document(kind, slug, feed_format)
+
+    if ret == MISSING:
+        raise Http404("Feed not found")
+
+    response = get_conditional_response(
+        request,
+        etag=ret['etag'],
+        last_modified=ret['built_at']
+    )
+
+    if response is None:
+        response = HttpResponse(
+            ret['content'],
+            content_type=ret['content_type']
+        )
+
+    response['ETag'] = ret['etag']
+    response['Last-Modified'] = http_date(ret['built_at'])
+    page_cache.set_headers(response, [page_cache.LESSON_LIST], csrf=False)
+
+    return response
@@ -0,0 +1,71 @@
+"""
+Server side syntax highlighting of CodeBlock snippets (with Pygments).
+
+Highlighted html is cached by snippet content, so that a code snippet is
+tokenized once - when lesson is published (see caching.warm_lesson_body)
+- and not on each lesson view.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+
+from . import caching
+
+HIGHLIGHT_KEY = 'lessons:highlight:{digest}'
+# CodeBlock.lang => pygments lexer name
+LEXERS = {
+    'python': 'python',
+    'bash': 'bash',
+    'javascript': 'javascript',
+    'json': 'json',
+    'jinja': 'html+django',
+}
+DEFAULT_LEXER = 'text'
+# css classes are prefixed with this one, see
+# static/lessons/css/pygments.css
+CSS_CLASS = 'highlight'
+
+formatter = HtmlFormatter(nowrap=True)
+
+
+def highlight_code(code, lang):
+    """
+    Returns html of highlighted code (without cache).
+    """
+    lexer = get_lexer_by_name(
+        LEXERS.get(lang, DEFAULT_LEXER),
+        stripnl=False
+    )
+
+    return mark_safe(highlight(code, lexer, formatter))
+
+
+def highlight_key(code, lang):
+    digest = hashlib.sha1(
+        f"{lang}:{code}".encode('utf-8')
+    ).hexdigest()
+
+    return HIGHLIGHT_KEY.format(digest=digest)
+
+
+def cached_highlight_code(code, lang):
+    key = highlight_key(code, lang)
+    html = cache.get(key)
+
+    if html is not None:
+        caching.hit(caching.HIGHLIGHT)
+        return mark_safe(html)
+
+    caching.miss(caching.HIGHLIGHT)
+    html = highlight_code(code, lang)
+    cache.set(key, html, caching.LESSON_BODY_TIMEOUT)
+
+    return html
+
+
+def style_defs():
+    return formatter.get_style_defs(f".{CSS_CLASS}")
@@ -0,0 +1,119 @@
+import json
+import timeit
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+from lessons import caching
+from lessons.highlight import highlight_key
+from lessons.models import FREE, Lesson
+
+SNIPPET = '''
+from django.db import models
+from django.urls import reverse
+
+
+class Lesson(models.Model):
+    """
+    Lesson number {number}
+    """
+    title = models.CharField(max_length=128)
+    order = models.IntegerField(blank=True, default=0)
+
+    def get_absolute_url(self):
+        return reverse(
+            'lesson', kwargs={{'order': self.order, 'slug': self.slug}}
+        )
+
+    def __str__(self):
+        return f"#{{self.order}} {{self.title}}"
+'''
+
+# how code blocks were rendered before server side highlighting
+# (browser did the highlighting with highlight.js)
+PLAIN_CODE_BLOCK = Template("""
+{% for block in blocks %}
+<section class="block-{{ block.block_type }}">
+<pre>
+    <code class="{{block.value.lang}}">
+{{ block.value.code }}
+    </code>
+</pre>
+</section>
+{% endfor %}
+""")
+
+
+class Command(BaseCommand):
+
+    help = """
+    Compares rendering time of a code heavy lesson: plain code blocks
+    (highlighted in browser), server side highlighting without cache
+    and cached lesson body (what lesson view does after publish).
+"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--blocks',
+            '-b',
+            type=int,
+            default=30,
+            help="Number of code blocks in lesson"
+        )
+        parser.add_argument(
+            '--repeat',
+            '-r',
+            type=int,
+            default=20,
+            help="Number of renders per measurement"
+        )
+
+    def lesson(self, count):
+        content = [
+            {
+                'type': 'code',
+                'value': {
+                    'code': SNIPPET.format(number=number),
+                    'lang': 'python'
+                }
+            }
+            for number in range(count)
+        ]
+        # Lesson instance is never saved
+        return Lesson(
+            id=0,
+            title="Benchmark",
+            content=json.dumps(content)
+        )
+
+    def measure(self, title, func, repeat):
+        total = timeit.timeit(func, number=repeat)
+        self.stdout.write(
+            f"{title:<32} {total / repeat * 1000:8.2f} ms/render"
+        )
+
+    def handle(self, *args, **options):
+        lesson = self.lesson(options['blocks'])
+        repeat = options['repeat']
+        snippets_keys = [
+            highlight_key(block.value['code'], block.value['lang'])
+            for block in lesson.content
+        ]
+
+        def plain():
+            PLAIN_CODE_BLOCK.render(Context({'blocks': lesson.content}))
+
+        def highlighted():
+            cache.delete_many(snippets_keys)
+            caching.render_lesson_body(lesson, FREE)
+
+        def cached():
+            caching.lesson_body(lesson, FREE)
+
+        self.measure("plain (before)", plain, repeat)
+        self.measure("highlighted, not cached", highlighted, repeat)
+        caching.lesson_body(lesson, FREE)
+        self.measure("highlighted, cached (after)", cached, repeat)
+
+        caching.invalidate_lesson_body(lesson)
+        cache.delete_many(snippets_keys)
@@ -0,0 +1,116 @@
+import time
+
+from django.core.management.base import BaseCommand
+from lessons import bench, search
+from lessons.models import Lesson
+from lessons.views import ITEMS_PER_PAGE
+
+QUERIES = [
+    "django",
+    "queryset migration",
+    "postgres docker nginx",
+    # code block identifiers
+    "Model7x1",
+    # no match
+    "flask",
+]
+
+
+class Command(BaseCommand):
+
+    help = """
+    Measures full text search latency (first page of results with
+    snippets, as index view shows it) on a large number of lessons,
+    compared with wagtail's database search backend. Benchmark lessons
+    (see bench_site) are created first, unless they already exist.
+"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lessons',
+            '-n',
+            type=int,
+            default=10000,
+            help="Number of benchmark lessons"
+        )
+        parser.add_argument(
+            '--repeat',
+            '-r',
+            type=int,
+            default=20,
+            help="Number of searches per query"
+        )
+        parser.add_argument(
+            '--seed',
+            '-s',
+            type=int,
+            default=0,
+            help="Random seed of benchmark lessons"
+        )
+        parser.add_argument(
+            '--no-baseline',
+            action='store_true',
+            help="Do not measure wagtail search (slow on many lessons)"
+        )
+
+    def measure(self, title, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+
+        self.stdout.write(
+            f"{title:<44} p50={bench.percentile(timings, 50):8.2f} ms"
+            f" p95={bench.percentile(timings, 95):8.2f} ms"
+        )
+
+    def handle(self, *args, **options):
+        created = bench.seed(
+            lessons=options['lessons'],
+            courses=0,
+            random_seed=options['seed']
+        )
+        self.stdout.write(f"created={created} lessons")
+
+        started = time.perf_counter()
+        indexed = search.rebuild()
+        self.stdout.write(
+            f"indexed={indexed} lessons in"
+            f" {time.perf_counter() - started:.2f} s"
+        )
+
+        repeat = options['repeat']
+        for query in QUERIES:
+            def ranked():
+                search.search(query)
+
+            def full_text():
+                ids = search.search(query)
+                search.results(query, ids[:ITEMS_PER_PAGE])
+
+            def wagtail():
+                list(
+                    Lesson.objects.for_listing().live().search(
+                        query
+                    )[:ITEMS_PER_PAGE]
+                )
+
+            self.stdout.write(
+                f"'{query}': {len(search.search(query))} hits"
+            )
+            self.measure("  index: ranked ids", ranked, repeat)
+            self.measure(
+                "  index: first page with snippets",
+                full_text,
+                repeat
+            )
+            if not options['no_baseline']:
+                # wagtail's database backend searches titles only
+                hits = Lesson.objects.live().search(query).count()
+                self.measure(
+                    f"  wagtail: first page ({hits} hits)",
+                    wagtail,
+                    repeat
+                )
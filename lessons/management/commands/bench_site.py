@@ -0,0 +1,117 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from lessons import bench
+
+
+class Command(BaseCommand):
+
+    help = """
+    Benchmarks public pages (index with search/filter/pagination, lesson
+    in both views, courses, tag index, feed and static pages) at given
+    concurrency. Reports throughput, p50/p95/p99 latency and SQL queries
+    per request (in process only). Use --seed on a development database
+    only.
+"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            '-s',
+            type=int,
+            default=0,
+            help="Create this many benchmark lessons (if there are fewer)"
+        )
+        parser.add_argument(
+            '--courses',
+            type=int,
+            default=10,
+            help="Number of benchmark courses created by --seed"
+        )
+        parser.add_argument(
+            '--requests',
+            '-n',
+            type=int,
+            default=200,
+            help="Number of requests per scenario"
+        )
+        parser.add_argument(
+            '--concurrency',
+            '-c',
+            type=int,
+            default=4,
+            help="Number of concurrent clients"
+        )
+        parser.add_argument(
+            '--url',
+            '-u',
+            help="Base URL of a running server, e.g. http://localhost:8000;"
+            " by default pages are requested in process"
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            help="Run only given scenario (can be repeated)"
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=1,
+            help="Requests per URL made before measuring"
+        )
+        parser.add_argument(
+            '--output',
+            '-o',
+            help="Write results as JSON to this file ('-' for stdout)"
+        )
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            created = bench.seed(
+                lessons=options['seed'],
+                courses=options['courses']
+            )
+            self.stderr.write(f"seeded lessons={created}")
+
+        scenarios = bench.scenarios()
+        names = options['scenario'] or list(scenarios)
+        unknown = set(names) - set(scenarios)
+        if unknown:
+            raise CommandError(
+                f"Unknown (or empty) scenarios: {', '.join(sorted(unknown))}"
+            )
+
+        results = {}
+        for name in names:
+            urls = scenarios[name]
+            if options['warmup']:
+                bench.run(
+                    urls,
+                    len(urls) * options['warmup'],
+                    base_url=options['url']
+                )
+            results[name] = bench.run(
+                urls,
+                options['requests'],
+                concurrency=options['concurrency'],
+                base_url=options['url']
+            )
+            self.report(name, results[name])
+
+        output = options['output']
+        if output == '-':
+            self.stdout.write(json.dumps(results, indent=2))
+        elif output:
+            with open(output, 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def report(self, name, result):
+        latency = result['latency_ms']
+        queries = result['queries_per_request'] or {}
+        self.stderr.write(
+            f"{name:<20} {result['throughput_rps']:>8} req/s"
+            f" p50={latency['p50']}ms p95={latency['p95']}ms"
+            f" p99={latency['p99']}ms"
+            f" queries={queries.get('mean', '-')}"
+            f" errors={result['errors']}"
+        )
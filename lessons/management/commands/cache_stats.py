@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from lessons import caching
+
+
+class Command(BaseCommand):
+
+    help = """
+    Displays hits/misses of lessons caches
+"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            '-r',
+            action='store_true',
+            help="Reset counters (after displaying them)"
+        )
+
+    def handle(self, *args, **options):
+        for name, counters in caching.stats().items():
+            hits = counters[caching.HIT]
+            misses = counters[caching.MISS]
+            total = hits + misses
+            ratio = hits / total * 100 if total else 0
+            self.stdout.write(
+                f"{name}: hits={hits} misses={misses} ratio={ratio:.1f}%"
+            )
+
+        if options.get('reset'):
+            caching.reset_stats()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from lessons.payments import metrics
+# clients register their operations on import
+from lessons.payments.clients import paypal, stripe  # noqa
+
+
+class Command(BaseCommand):
+
+    help = """
+    Displays number of calls, errors and average latency of payment
+    providers' API calls
+"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            '-r',
+            action='store_true',
+            help="Reset counters (after displaying them)"
+        )
+
+    def handle(self, *args, **options):
+        for name, counters in metrics.stats().items():
+            self.stdout.write(
+                f"{name}: calls={counters[metrics.CALLS]}"
+                f" errors={counters[metrics.ERRORS]}"
+                f" avg={counters['avg_ms']:.1f}ms"
+            )
+
+        if options.get('reset'):
+            metrics.reset_stats()
@@ -0,0 +1,93 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from lessons.payments.mock_server import Latency, MockServer
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+
+    help = """
+    Runs local stand-in for Stripe and PayPal APIs (see
+    lessons.payments.mock_server). Start the site with
+    STRIPE_API_BASE and PAYPAL_API_ENDPOINT set to its url.
+"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            default='127.0.0.1',
+            help="Address to listen on"
+        )
+        parser.add_argument(
+            '--port',
+            '-p',
+            type=int,
+            default=12111,
+            help="Port to listen on"
+        )
+        parser.add_argument(
+            '--latency',
+            '-l',
+            type=Latency,
+            default=Latency('fixed:0'),
+            help="Response time in ms, e.g. fixed:50, uniform:20:80,"
+            " normal:50:10, lognormal:50:0.5"
+        )
+        parser.add_argument(
+            '--error-rate',
+            '-e',
+            type=float,
+            default=0,
+            help="Fraction of requests answered with HTTP 500 (0 - 1)"
+        )
+        parser.add_argument(
+            '--3ds-rate',
+            dest='three_d_secure_rate',
+            type=float,
+            default=0,
+            help="Fraction of card payments requiring 3D Secure (0 - 1)"
+        )
+        parser.add_argument(
+            '--webhook-url',
+            '-w',
+            help="Stripe webhook url, e.g."
+            " http://127.0.0.1:8000/stripe-webhooks"
+        )
+        parser.add_argument(
+            '--webhook-delay',
+            type=Latency,
+            default=Latency('fixed:100'),
+            help="Delay of webhooks after payment, in ms (same format"
+            " as --latency)"
+        )
+
+    def handle(self, *args, **options):
+        server = MockServer(
+            (options['host'], options['port']),
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+            three_d_secure_rate=options['three_d_secure_rate'],
+            webhook_url=options['webhook_url'],
+            webhook_delay=options['webhook_delay'],
+            stripe_signing_key=getattr(
+                settings,
+                'STRIPE_WEBHOOK_SIGNING_KEY',
+                ''
+            ) or '',
+        )
+        self.stdout.write(
+            f"Payments mock server on {server.url}"
+            f" latency={options['latency']}"
+            f" error rate={options['error_rate']}"
+        )
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"{server.stats()}")
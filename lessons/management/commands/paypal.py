@@ -1,10 +1,9 @@
 import logging
 import os
 
-import paypalrestsdk
 import yaml
-from django.conf import settings
 from django.core.management.base import BaseCommand
+from lessons.payments.clients.paypal import get_api
 from lessons.payments.paypal import mode
 
 PRODUCT = "product"
@@ -30,13 +29,6 @@ PLAN_A_CONF_PATH = os.path.join(
 
 logger = logging.getLogger(__name__)
 
-myapi = paypalrestsdk.Api({
-    "mode": mode(),  # noqa "sandbox" or "live"
-    "client_id": settings.PAYPAL_CLIENT_ID,
-    "client_secret": settings.PAYPAL_CLIENT_SECRET
-})
-
-
 class Command(BaseCommand):
 
     help = """
@@ -60,7 +52,7 @@ class Command(BaseCommand):
     def create_product(self):
         with open(PRODUCT_CONF_PATH, "r") as f:
             data = yaml.load(f, Loader=yaml.FullLoader)
-            ret = myapi.post("v1/catalogs/products", data)
+            ret = get_api(mode()).post("v1/catalogs/products", data)
             logger.debug(ret)
 
     def create_plan(self, what_plan):
@@ -70,15 +62,15 @@ class Command(BaseCommand):
         }
         with open(plans[what_plan], "r") as f:
             data = yaml.load(f, Loader=yaml.FullLoader)
-            ret = myapi.post("v1/billing/plans", data)
+            ret = get_api(mode()).post("v1/billing/plans", data)
             logger.debug(ret)
 
     def list_product(self):
-        ret = myapi.get("v1/catalogs/products")
+        ret = get_api(mode()).get("v1/catalogs/products")
         logger.info(ret)
 
     def list_plan(self):
-        ret = myapi.get("v1/billing/plans")
+        ret = get_api(mode()).get("v1/billing/plans")
         logger.info(ret)
 
     def create(self, what):
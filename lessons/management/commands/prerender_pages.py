@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from lessons import prerender
+
+
+class Command(BaseCommand):
+
+    help = """
+    Renders static pages (about, privacy, ...) into
+    DJANGO_LESSONS_PRERENDER_ROOT. Run it on every deploy.
+"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names',
+            nargs='*',
+            help="Render only these pages (all by default)"
+        )
+
+    def handle(self, *args, **options):
+        if not prerender.root():
+            raise CommandError(
+                f"{prerender.DJANGO_LESSONS_PRERENDER_ROOT} is not set"
+            )
+
+        unknown = set(options['names']) - set(prerender.STATIC_PAGES)
+        if unknown:
+            raise CommandError(
+                f"Unknown pages: {', '.join(sorted(unknown))}"
+            )
+
+        manifest = prerender.build(options['names'] or None)
+        self.stdout.write(f"prerendered={' '.join(manifest)}")
@@ -0,0 +1,74 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from lessons.webhooks import events
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+
+    help = """
+    Processes stored payment webhook events (runs as a background worker)
+"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Process all due events and exit"
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help="Display queue depth and processing time of events"
+        )
+        parser.add_argument(
+            '--batch-size',
+            '-b',
+            type=int,
+            default=events.BATCH_SIZE,
+            help="Number of events processed between log messages"
+        )
+        parser.add_argument(
+            '--interval',
+            '-i',
+            type=float,
+            default=1,
+            help="Seconds to wait when there is nothing to process"
+        )
+
+    def drain(self, batch_size):
+        total = 0
+        while True:
+            processed = events.process_batch(batch_size=batch_size)
+            if not processed:
+                return total
+            total += processed
+
+    def handle(self, *args, **options):
+        batch_size = options.get('batch_size')
+
+        if options.get('status'):
+            stats = events.latency_stats()
+            self.stdout.write(
+                f"queue depth={events.queue_depth()}"
+                f" avg={stats['avg'] or 0:.2f}ms"
+                f" max={stats['max'] or 0:.2f}ms"
+            )
+            return
+
+        if options.get('once'):
+            processed = self.drain(batch_size)
+            self.stdout.write(f"processed={processed}")
+            return
+
+        while True:
+            processed = self.drain(batch_size)
+            if processed:
+                logger.info(
+                    f"processed={processed}"
+                    f" queue depth={events.queue_depth()}"
+                )
+            time.sleep(options.get('interval'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from lessons import page_cache
+
+
+class Command(BaseCommand):
+
+    help = """
+    Makes all pages in anonymous full page cache stale (e.g. after deploy
+    of new templates)
+"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'keys',
+            nargs='*',
+            help="Purge only pages with these surrogate keys"
+            " (e.g. lesson-12 lesson-list)"
+        )
+
+    def handle(self, *args, **options):
+        keys = options.get('keys') or [page_cache.SITE]
+        page_cache.purge(*keys)
+        self.stdout.write(f"purged={' '.join(keys)}")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from lessons import search
+
+
+class Command(BaseCommand):
+
+    help = """
+    Rebuilds full text search index of all published lessons (run once
+    after the migration which creates the index; afterwards lessons are
+    indexed on publish)
+"""
+
+    def handle(self, *args, **options):
+        if not search.available():
+            self.stderr.write("Database backend has no full text index")
+            return
+
+        indexed = search.rebuild()
+        self.stdout.write(f"indexed={indexed}")
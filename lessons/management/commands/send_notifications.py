@@ -0,0 +1,73 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from lessons import notifications
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+
+    help = """
+    Sends notification emails from outbox (runs as a background worker)
+"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Send all due notifications and exit"
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help="Display queue depth (number of pending notifications)"
+            " and number of events waiting for digest"
+        )
+        parser.add_argument(
+            '--batch-size',
+            '-b',
+            type=int,
+            default=notifications.BATCH_SIZE,
+            help="Number of emails sent over one connection"
+        )
+        parser.add_argument(
+            '--interval',
+            '-i',
+            type=float,
+            default=5,
+            help="Seconds to wait when there is nothing to send"
+        )
+
+    def drain(self, batch_size):
+        notifications.flush_digests()
+        total = 0
+        while True:
+            sent = notifications.send_batch(batch_size=batch_size)
+            if not sent:
+                return total
+            total += sent
+
+    def handle(self, *args, **options):
+        batch_size = options.get('batch_size')
+
+        if options.get('status'):
+            self.stdout.write(
+                f"queue depth={notifications.queue_depth()}"
+                f" digest events={notifications.digest_depth()}"
+            )
+            return
+
+        if options.get('once'):
+            sent = self.drain(batch_size)
+            self.stdout.write(f"sent={sent}")
+            return
+
+        while True:
+            sent = self.drain(batch_size)
+            if sent:
+                logger.info(
+                    f"sent={sent} queue depth={notifications.queue_depth()}"
+                )
+            time.sleep(options.get('interval'))
@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from lessons.models import Contact, Counter, Subscription
+
+TOTALS = [
+    (Counter.USERS, User),
+    (Counter.SUBSCRIPTIONS, Subscription),
+    (Counter.CONTACTS, Contact),
+]
+
+
+class Command(BaseCommand):
+
+    help = """
+    Recalculates totals counters (users, subscriptions, contacts) with
+    COUNT(*). Needed only if rows were added/removed bypassing signals
+    (e.g. bulk_create or raw SQL).
+"""
+
+    def handle(self, *args, **options):
+        for name, model in TOTALS:
+            value = model.objects.count()
+            Counter.objects.update_or_create(
+                name=name,
+                defaults={'value': value}
+            )
+            self.stdout.write(f"{name}={value}")
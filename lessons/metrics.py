@@ -0,0 +1,453 @@
+"""
+Per view request metrics, exposed in Prometheus text format.
+
+MetricsMiddleware records, per resolved view name (index, lesson, card,
+stripe_webhooks, wagtail_serve, ...), request latency histogram, number
+and time of SQL queries, hits/misses of lessons caches and template
+render time.
+
+Numbers are first added up in process (dictionary updates, no I/O) and
+every DJANGO_LESSONS_METRICS_FLUSH_SECONDS they are added to counters in
+Django's default cache, so numbers from all gunicorn workers add up (like
+lessons.caching stats). metrics view renders those counters; Prometheus
+computes rates from them.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.template.backends.django import DjangoTemplates
+from django.utils.crypto import constant_time_compare
+
+from .utils import incr_counter
+
+DJANGO_LESSONS_METRICS_FLUSH_SECONDS = 'DJANGO_LESSONS_METRICS_FLUSH_SECONDS'
+# bearer token Prometheus must send; without it metrics are served
+# only in DEBUG mode
+DJANGO_LESSONS_METRICS_TOKEN = 'DJANGO_LESSONS_METRICS_TOKEN'
+FLUSH_SECONDS = 10
+
+METRIC_KEY = 'lessons:metrics:{view}:{what}'
+# names of views with recorded requests (from all workers)
+VIEWS_KEY = 'lessons:metrics:views'
+
+# upper bounds of latency histogram buckets, in seconds
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUESTS = 'requests'
+# times are kept in microseconds (cache.incr works with integers)
+DURATION = 'duration_us'
+QUERIES = 'queries'
+QUERY_DURATION = 'query_us'
+CACHE_HITS = 'cache_hits'
+CACHE_MISSES = 'cache_misses'
+TEMPLATE_DURATION = 'template_us'
+STATUS_CLASSES = ('2xx', '3xx', '4xx', '5xx')
+
+UNRESOLVED = 'unresolved'
+
+PREFIX = 'django_lessons'
+
+_local = threading.local()
+_lock = threading.Lock()
+# view => what => value, not yet flushed to cache
+_pending = defaultdict(lambda: defaultdict(int))
+_known_views = set()
+_last_flush = time.monotonic()
+
+
+def bucket_name(upper_bound):
+    return f"le_{upper_bound}"
+
+
+def status_name(status_code):
+    return f"status_{status_code // 100}xx"
+
+
+def flush_seconds():
+    return getattr(
+        settings,
+        DJANGO_LESSONS_METRICS_FLUSH_SECONDS,
+        FLUSH_SECONDS
+    )
+
+
+class RequestMetrics:
+    """
+    Numbers of one request.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_seconds = 0
+        # nested templates (e.g. render_to_string called while rendering
+        # a page) are part of outermost template time
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+def current():
+    """
+    Metrics of request being processed by this thread (or None).
+    """
+    return getattr(_local, 'metrics', None)
+
+
+def cache_hit():
+    metrics = current()
+    if metrics is not None:
+        metrics.cache_hits += 1
+
+
+def cache_miss():
+    metrics = current()
+    if metrics is not None:
+        metrics.cache_misses += 1
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+
+    if match is None:
+        return UNRESOLVED
+
+    return match.view_name
+
+
+def record(view, status_code, seconds, metrics):
+    values = {
+        REQUESTS: 1,
+        DURATION: int(seconds * 1000000),
+        status_name(status_code): 1,
+        QUERIES: metrics.queries,
+        QUERY_DURATION: int(metrics.query_seconds * 1000000),
+        CACHE_HITS: metrics.cache_hits,
+        CACHE_MISSES: metrics.cache_misses,
+        TEMPLATE_DURATION: int(metrics.template_seconds * 1000000),
+    }
+    for upper_bound in BUCKETS:
+        if seconds <= upper_bound:
+            values[bucket_name(upper_bound)] = 1
+            break
+
+    with _lock:
+        pending = _pending[view]
+        for what, value in values.items():
+            pending[what] += value
+
+
+def flush():
+    """
+    Adds numbers recorded in this process to the shared counters.
+    """
+    global _last_flush
+
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+
+    for view, values in pending.items():
+        for what, value in values.items():
+            if value:
+                incr_counter(
+                    METRIC_KEY.format(view=view, what=what),
+                    value
+                )
+
+    _known_views.update(pending)
+    if _known_views:
+        # checked on every flush: a name lost by concurrent updates
+        # (get + set is not atomic) is added back next time
+        views = set(cache.get(VIEWS_KEY) or [])
+        if not _known_views <= views:
+            cache.set(VIEWS_KEY, sorted(views | _known_views), None)
+
+
+def flush_if_due():
+    if time.monotonic() - _last_flush >= flush_seconds():
+        flush()
+
+
+def counters():
+    """
+    Returns a dictionary view => what => value of shared counters.
+    """
+    views = cache.get(VIEWS_KEY) or []
+    whats = [
+        REQUESTS, DURATION, QUERIES, QUERY_DURATION, CACHE_HITS,
+        CACHE_MISSES, TEMPLATE_DURATION
+    ] + [
+        bucket_name(upper_bound) for upper_bound in BUCKETS
+    ] + [
+        f"status_{status_class}" for status_class in STATUS_CLASSES
+    ]
+    values = cache.get_many([
+        METRIC_KEY.format(view=view, what=what)
+        for view in views
+        for what in whats
+    ])
+
+    return {
+        view: {
+            what: values.get(METRIC_KEY.format(view=view, what=what), 0)
+            for what in whats
+        }
+        for view in views
+    }
+
+
+def reset():
+    cache.delete_many([
+        METRIC_KEY.format(view=view, what=what)
+        for view, values in counters().items()
+        for what in values
+    ] + [VIEWS_KEY])
+    with _lock:
+        _pending.clear()
+    _known_views.clear()
+
+
+def authorized(request):
+    token = getattr(settings, DJANGO_LESSONS_METRICS_TOKEN, None)
+
+    if not token:
+        return settings.DEBUG
+
+    return constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''),
+        f"Bearer {token}"
+    )
+
+
+def label(value):
+    value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+    return value.replace('\n', '\\n')
+
+
+def seconds(microseconds):
+    return f"{microseconds / 1000000:.6f}"
+
+
+def exposition():
+    """
+    All metrics in Prometheus text format (version 0.0.4).
+    """
+    # imported here: caching imports this module
+    from .caching import HIT, MISS
+    from .caching import stats as cache_stats
+    from .payments.metrics import CALLS, ERRORS
+    from .payments.metrics import stats as payment_stats
+
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+        for suffix, labels, value in samples:
+            labels_text = ",".join(
+                f'{key}="{label(label_value)}"'
+                for key, label_value in labels
+            )
+            lines.append(f"{PREFIX}_{name}{suffix}{{{labels_text}}} {value}")
+
+    views = counters()
+
+    histogram = []
+    for view, values in views.items():
+        cumulative = 0
+        for upper_bound in BUCKETS:
+            cumulative += values[bucket_name(upper_bound)]
+            histogram.append((
+                '_bucket',
+                [('view', view), ('le', upper_bound)],
+                cumulative
+            ))
+        histogram.append((
+            '_bucket', [('view', view), ('le', '+Inf')], values[REQUESTS]
+        ))
+        histogram.append(('_sum', [('view', view)], seconds(values[DURATION])))
+        histogram.append(('_count', [('view', view)], values[REQUESTS]))
+    metric(
+        'request_duration_seconds',
+        'histogram',
+        "Request latency by view.",
+        histogram
+    )
+
+    metric(
+        'responses_total',
+        'counter',
+        "Responses by view and status class.",
+        [
+            (
+                '',
+                [('view', view), ('status', status_class)],
+                values[f"status_{status_class}"]
+            )
+            for view, values in views.items()
+            for status_class in STATUS_CLASSES
+        ]
+    )
+
+    for name, what, help_text, as_seconds in (
+        ('db_queries_total', QUERIES, "SQL queries by view.", False),
+        (
+            'db_query_seconds_total',
+            QUERY_DURATION,
+            "Time spent in SQL queries by view.",
+            True
+        ),
+        (
+            'cache_hits_total',
+            CACHE_HITS,
+            "Hits of lessons caches by view.",
+            False
+        ),
+        (
+            'cache_misses_total',
+            CACHE_MISSES,
+            "Misses of lessons caches by view.",
+            False
+        ),
+        (
+            'template_render_seconds_total',
+            TEMPLATE_DURATION,
+            "Time spent rendering templates by view.",
+            True
+        ),
+    ):
+        metric(name, 'counter', help_text, [
+            (
+                '',
+                [('view', view)],
+                seconds(values[what]) if as_seconds else values[what]
+            )
+            for view, values in views.items()
+        ])
+
+    caches = cache_stats()
+    metric('named_cache_hits_total', 'counter', "Hits by lessons cache.", [
+        ('', [('cache', name)], values[HIT])
+        for name, values in caches.items()
+    ])
+    metric(
+        'named_cache_misses_total',
+        'counter',
+        "Misses by lessons cache.",
+        [
+            ('', [('cache', name)], values[MISS])
+            for name, values in caches.items()
+        ]
+    )
+
+    payments = payment_stats()
+    calls = []
+    errors = []
+    for name, values in payments.items():
+        provider, operation = name.split('.', 1)
+        labels = [('provider', provider), ('operation', operation)]
+        calls.append(('', labels, values[CALLS]))
+        errors.append(('', labels, values[ERRORS]))
+    metric(
+        'payment_calls_total',
+        'counter',
+        "Calls of payment providers' APIs.",
+        calls
+    )
+    metric(
+        'payment_errors_total',
+        'counter',
+        "Failed calls of payment providers' APIs.",
+        errors
+    )
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Should be the first middleware, so that its numbers include all other
+    middlewares.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        _local.metrics = metrics
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+
+        record(
+            view_name(request),
+            response.status_code,
+            time.perf_counter() - started,
+            metrics
+        )
+        flush_if_due()
+
+        return response
+
+
+class TimedTemplate:
+    """
+    Wraps template of django backend, adding render time to request
+    metrics.
+    """
+
+    def __init__(self, template):
+        self._wrapped = template
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def render(self, context=None, request=None):
+        metrics = current()
+
+        if metrics is None:
+            return self._wrapped.render(context, request)
+
+        started = time.perf_counter()
+        metrics.template_depth += 1
+        try:
+            return self._wrapped.render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend which measures render time (set as BACKEND in
+    TEMPLATES setting).
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
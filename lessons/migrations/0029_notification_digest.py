@@ -0,0 +1,50 @@
+# Generated by Django 3.0.14 on 2026-10-18 07:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+TOTALS = [
+    ('users', 'auth', 'User'),
+    ('subscriptions', 'lessons', 'Subscription'),
+    ('contacts', 'lessons', 'Contact'),
+]
+
+
+def seed_counters(apps, schema_editor):
+    Counter = apps.get_model('lessons', 'Counter')
+
+    for name, app_label, model_name in TOTALS:
+        model = apps.get_model(app_label, model_name)
+        Counter.objects.update_or_create(
+            name=name,
+            defaults={'value': model.objects.count()}
+        )
+
+
+def remove_counters(apps, schema_editor):
+    Counter = apps.get_model('lessons', 'Counter')
+    Counter.objects.filter(name__in=[name for name, _, _ in TOTALS]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('lessons', '0028_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationDigest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_start', models.DateTimeField()),
+                ('title', models.CharField(max_length=256)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('window_start', 'title')},
+            },
+        ),
+        migrations.RunPython(seed_counters, remove_counters),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 3.0.14 on 2026-10-18 07:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# full text index is specific to database backend, see lessons.search
+POSTGRES_INDEX = [
+    "ALTER TABLE lessons_searchdocument ADD COLUMN vector tsvector",
+    "CREATE INDEX lessons_searchdocument_vector "
+    "ON lessons_searchdocument USING GIN (vector)",
+]
+POSTGRES_DROP_INDEX = [
+    "DROP INDEX IF EXISTS lessons_searchdocument_vector",
+    "ALTER TABLE lessons_searchdocument DROP COLUMN IF EXISTS vector",
+]
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE lessons_searchdocument_fts USING fts5("
+    "title, description, body, private_body, "
+    "content='lessons_searchdocument', content_rowid='lesson_id', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+]
+SQLITE_DROP_INDEX = [
+    "DROP TABLE IF EXISTS lessons_searchdocument_fts",
+]
+
+
+def execute(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        execute(schema_editor, POSTGRES_INDEX)
+    elif vendor == 'sqlite':
+        execute(schema_editor, SQLITE_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        execute(schema_editor, POSTGRES_DROP_INDEX)
+    elif vendor == 'sqlite':
+        execute(schema_editor, SQLITE_DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0030_payment_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('lesson', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='lessons.Lesson')),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('body', models.TextField(blank=True)),
+                ('private_body', models.TextField(blank=True)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,19 +1,26 @@
 import datetime
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Max
 from django.urls import reverse
+from django.utils import timezone
 from modelcluster.contrib.taggit import ClusterTaggableManager
 # tag related
 from modelcluster.fields import ParentalKey
-from taggit.models import Tag, TaggedItemBase
+from taggit.models import TaggedItemBase
 from wagtail.admin.edit_handlers import (FieldPanel, InlinePanel,
                                          StreamFieldPanel)
 from wagtail.core import blocks
 from wagtail.core.fields import RichTextField, StreamField
-from wagtail.core.models import Orderable, Page
+from wagtail.core.models import Orderable, Page, PageManager
+from wagtail.core.query import PageQuerySet
 from wagtail.embeds.blocks import EmbedBlock
 from wagtail.images.blocks import ImageChooserBlock
+from wagtail.search import index
+
+from . import page_cache
+from .conditional import conditional
 
 FREE = 'free'  # it is always better to use constants instead of strings
 PRO = 'pro'
@@ -124,6 +131,27 @@ class UserProfile(models.Model):
             return True
 
 
+class LessonQuerySet(PageQuerySet):
+
+    def for_listing(self):
+        """
+        Lessons as rendered by lessons/includes/_lesson.html (index,
+        tag index, feed). Tags are prefetched through tagged_items
+        (ClusterTaggableManager reads tags from there) and heavy StreamField
+        /rich text columns, which a lesson card never displays, are
+        not loaded at all.
+        """
+        return self.defer(
+            'content',
+            'script',
+        ).prefetch_related(
+            'tagged_items__tag'
+        )
+
+
+LessonManager = PageManager.from_queryset(LessonQuerySet)
+
+
 class LessonsIndex(Page):
     """ Lessons index """
     pass
@@ -167,17 +195,20 @@ class CodeBlock(blocks.StructBlock):
 
 class LessonTagIndex(Page):
     def get_context(self, request):
+        # caching imports models
+        from .caching import tag_cloud
 
         # Filter by tag
         tag = request.GET.get('tag')
-        lessons = Lesson.objects.filter(live=True).filter(
+        lessons = Lesson.objects.for_listing().filter(live=True).filter(
             tags__name=tag
         ).order_by('-last_published_at')
+        page_cache.add_keys(request, page_cache.LESSON_LIST)
 
         # Update template context
         context = super().get_context(request)
         context['lessons'] = lessons
-        context['tags'] = Tag.objects.order_by('name')
+        context['tags'] = tag_cloud()
         context['current_tag_name'] = tag
 
         return context
@@ -251,6 +282,12 @@ class Lesson(Page):
         ('note', NoteBlock())
     ], blank=True)
 
+    objects = LessonManager()
+
+    search_fields = Page.search_fields + [
+        index.FilterField('lesson_type'),
+    ]
+
     content_panels = Page.content_panels + [
         FieldPanel('order'),
         FieldPanel('lesson_type'),
@@ -282,28 +319,42 @@ class Lesson(Page):
             )
 
     def get_next_lesson_obj(self):
-        current_order = self.order
+        """
+        Views use lessons.caching.lesson_neighbors instead, which
+        does not need a query per neighbor.
+        """
         ret = Lesson.objects.filter(live=True).filter(
-            order=current_order + 1
-        ).first()
+            order__gt=self.order
+        ).order_by('order').first()
         return ret
 
     def get_prev_lesson_obj(self):
-        current_order = self.order
         ret = Lesson.objects.filter(live=True).filter(
-            order=current_order - 1
-        ).first()
+            order__lt=self.order
+        ).order_by('-order').first()
         return ret
 
+    @staticmethod
     def next_order():
-        lessons = [
-            obj.order for obj in Lesson.objects.all()
-        ]
-
-        if len(lessons) == 0:
-            return 1
+        """
+        Allocates order number for a new lesson.
+
+        Lesson orders are taken from a counter row locked with
+        SELECT ... FOR UPDATE, so that two lessons created at the same time
+        won't get same order. Counter never goes below the highest
+        existing order (which editors can set manually).
+        """
+        with transaction.atomic():
+            counter, _ = Counter.objects.select_for_update().get_or_create(
+                name=Counter.LESSON_ORDER
+            )
+            max_order = Lesson.objects.aggregate(
+                max_order=Max('order')
+            )['max_order'] or 0
+            counter.value = max(counter.value, max_order) + 1
+            counter.save(update_fields=['value'])
 
-        return max(lessons) + 1
+        return counter.value
 
 
 class Course(Page):
@@ -323,11 +374,30 @@ class Course(Page):
     def __str__(self):
         return self.title
 
+    def conditional_resource(self, request, *args, **kwargs):
+        return page_cache.course_key(self.id), self.last_published_at
+
+    def serve(self, request, *args, **kwargs):
+        # 304 for unchanged course page (see lessons.conditional)
+        serve = conditional(self.conditional_resource)(super().serve)
+
+        return serve(request, *args, **kwargs)
+
     def get_context(self, request):
 
-        lesson_groups = LessonGroup.objects.filter(
-            course=self
-        ).order_by('order')
+        lesson_groups = list(
+            LessonGroup.objects.filter(
+                course=self
+            ).order_by('order')
+        )
+        page_cache.add_keys(
+            request,
+            page_cache.course_key(self.id),
+            *[
+                page_cache.lesson_key(item.lesson_id)
+                for item in lesson_groups if item.lesson_id
+            ]
+        )
 
         # Update template context
         context = super().get_context(request)
@@ -358,23 +428,73 @@ class LessonGroup(models.Model):
     )
 
     def get_next_lesson_group_obj(self):
-        current_order = self.order
         ret = LessonGroup.objects.filter(
-            order=current_order + 1
-        ).first()
+            course=self.course_id,
+            order__gt=self.order
+        ).order_by('order').first()
         return ret
 
     def get_prev_lesson_group_obj(self):
-        current_order = self.order
         ret = LessonGroup.objects.filter(
-            order=current_order - 1
-        ).first()
+            course=self.course_id,
+            order__lt=self.order
+        ).order_by('-order').first()
         return ret
 
     def __str__(self):
         return self.title
 
 
+class Counter(models.Model):
+    """
+    Named integer counters (e.g. last allocated lesson order).
+
+    USERS, SUBSCRIPTIONS and CONTACTS are totals maintained by
+    post_save/post_delete signal handlers, so that notifications don't need
+    to run COUNT(*) on whole tables (sync_counters management command
+    recalculates them).
+    """
+    LESSON_ORDER = 'lesson_order'
+    USERS = 'users'
+    SUBSCRIPTIONS = 'subscriptions'
+    CONTACTS = 'contacts'
+
+    name = models.CharField(max_length=64, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
+
+    @staticmethod
+    def incr(name, delta=1):
+        """
+        Atomically adds delta to counter (single UPDATE).
+        """
+        updated = Counter.objects.filter(name=name).update(
+            value=F('value') + delta
+        )
+        if not updated:
+            Counter.objects.get_or_create(name=name)
+            Counter.objects.filter(name=name).update(
+                value=F('value') + delta
+            )
+
+    @staticmethod
+    def get_value(name):
+        return Counter.objects.filter(name=name).values_list(
+            'value', flat=True
+        ).first() or 0
+
+    @staticmethod
+    def get_values(*names):
+        values = dict(
+            Counter.objects.filter(name__in=names).values_list(
+                'name', 'value'
+            )
+        )
+        return {name: values.get(name, 0) for name in names}
+
+
 class Subscription(models.Model):
     email = models.EmailField(blank=False)
 
@@ -400,3 +520,127 @@ class Contact(models.Model):
 
     def __repr__(self):
         return f"{self.subject}"
+
+
+class Notification(models.Model):
+    """
+    Outbox of notification emails (sent to DJANGO_LESSONS_NOTIFY_EMAIL).
+
+    Request/signal handlers only insert rows here, emails are sent
+    by send_notifications management command.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    title = models.CharField(max_length=256)
+    text = models.TextField(blank=True)
+
+    status = models.CharField(
+        choices=[(PENDING, 'Pending'), (SENT, 'Sent'), (FAILED, 'Failed')],
+        default=PENDING,
+        max_length=16,
+    )
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.status})"
+
+
+class NotificationDigest(models.Model):
+    """
+    Number of coalesced notification events (by title) within a time
+    window. Flushed into one Notification per window by
+    lessons.notifications.flush_digests.
+    """
+    window_start = models.DateTimeField()
+    title = models.CharField(max_length=256)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [('window_start', 'title')]
+
+    def __str__(self):
+        return f"{self.title} x {self.count} ({self.window_start})"
+
+
+class PaymentEvent(models.Model):
+    """
+    Webhook event received from payment provider (stored by the webhook
+    view, processed by process_payment_events management command).
+
+    Provider may deliver same event more than once; (provider, event_id)
+    is unique, so each event is stored and processed only once.
+    """
+    STRIPE = 'stripe'
+
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    provider = models.CharField(
+        choices=[(STRIPE, 'Stripe')],
+        max_length=16,
+    )
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=128)
+    payload = models.TextField()
+
+    status = models.CharField(
+        choices=[(PENDING, 'Pending'), (DONE, 'Done'), (FAILED, 'Failed')],
+        default=PENDING,
+        max_length=16,
+    )
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # milliseconds spent by the worker on (last attempt of) this event
+    processing_time = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        unique_together = [('provider', 'event_id')]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.event_type} {self.event_id}"
+
+
+class SearchDocument(models.Model):
+    """
+    Searchable text of a published lesson (maintained by lessons.search on
+    publish/unpublish). Full text index over it is specific to database
+    backend: a tsvector column with GIN index on PostgreSQL, an FTS5 table
+    on SQLite (both created by migration 0031).
+
+    private_body (PRO blocks and script) is searched, but never displayed
+    in result snippets.
+    """
+    lesson = models.OneToOneField(
+        Lesson,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+    private_body = models.TextField(blank=True)
+    indexed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title
@@ -0,0 +1,280 @@
+"""
+Notification emails to site owner (new sign ups, payments etc).
+
+notify() only stores the notification in outbox (Notification model) - a
+single INSERT; send_notifications management command sends them in
+batches (one SMTP connection per batch) and retries failed ones with
+exponential backoff.
+
+High volume events (sign ups, social logins, new subscribers) go through
+notify_event(). With DJANGO_LESSONS_NOTIFY_DIGEST_MINUTES set, these are
+only counted per time window (one UPDATE) and flush_digests() turns each
+finished window into a single digest notification.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Counter, Notification, NotificationDigest
+
+logger = logging.getLogger(__name__)
+
+DJANGO_LESSONS_NOTIFY_EMAIL = 'DJANGO_LESSONS_NOTIFY_EMAIL'
+# 0 (default) - every event is sent as a separate notification
+DJANGO_LESSONS_NOTIFY_DIGEST_MINUTES = 'DJANGO_LESSONS_NOTIFY_DIGEST_MINUTES'
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+# seconds; doubled with each failed attempt, but not more than MAX_BACKOFF
+BASE_BACKOFF = 30
+MAX_BACKOFF = 3600
+
+
+def notify(title, text):
+
+    if not hasattr(settings, DJANGO_LESSONS_NOTIFY_EMAIL):
+        logger.error(f"{DJANGO_LESSONS_NOTIFY_EMAIL} not defined")
+        return None
+
+    return Notification.objects.create(
+        title=title,
+        text=text
+    )
+
+
+def digest_minutes():
+    return getattr(settings, DJANGO_LESSONS_NOTIFY_DIGEST_MINUTES, 0) or 0
+
+
+def window_start(now, minutes):
+    """
+    Beginning of the digest window now falls into.
+    """
+    window = timedelta(minutes=minutes)
+    epoch = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return epoch + ((now - epoch) // window) * window
+
+
+def record_event(title, now=None):
+    start = window_start(now or timezone.now(), digest_minutes())
+    digests = NotificationDigest.objects.filter(
+        window_start=start,
+        title=title
+    )
+
+    if digests.update(count=F('count') + 1):
+        return
+
+    try:
+        with transaction.atomic():
+            NotificationDigest.objects.create(
+                window_start=start,
+                title=title,
+                count=1
+            )
+    except IntegrityError:
+        # created meanwhile by another process
+        digests.update(count=F('count') + 1)
+
+
+def notify_event(title, text):
+    """
+    Same as notify(), but in digest mode event is only counted.
+    """
+    if not digest_minutes():
+        return notify(title=title, text=text)
+
+    return record_event(title)
+
+
+def digest_text(counts, totals):
+    lines = [f"{title}: {count}" for title, count in sorted(counts.items())]
+    lines.append("")
+    lines.extend(
+        f"Total {name} count={value}" for name, value in totals.items()
+    )
+
+    return "\n".join(lines)
+
+
+def flush_digests(now=None):
+    """
+    Creates one notification per finished digest window.
+    Returns number of created notifications.
+    """
+    now = now or timezone.now()
+    # when digest mode is turned off, whatever was counted is flushed
+    cutoff = now - timedelta(minutes=digest_minutes())
+
+    with transaction.atomic():
+        digests = list(
+            NotificationDigest.objects.select_for_update(
+                skip_locked=True
+            ).filter(
+                window_start__lte=cutoff
+            ).order_by('window_start')
+        )
+
+        if not digests:
+            return 0
+
+        windows = {}
+        for digest in digests:
+            counts = windows.setdefault(digest.window_start, {})
+            counts[digest.title] = digest.count
+
+        totals = Counter.get_values(
+            Counter.USERS,
+            Counter.SUBSCRIPTIONS,
+            Counter.CONTACTS
+        )
+
+        for start, counts in windows.items():
+            notify(
+                title=f"Digest: {sum(counts.values())} events since "
+                f"{start:%Y-%m-%d %H:%M}",
+                text=digest_text(counts, totals)
+            )
+
+        NotificationDigest.objects.filter(
+            id__in=[digest.id for digest in digests]
+        ).delete()
+
+    return len(windows)
+
+
+def queue_depth():
+    """
+    Number of notifications waiting to be sent.
+    """
+    return Notification.objects.filter(
+        status=Notification.PENDING
+    ).count()
+
+
+def digest_depth():
+    """
+    Number of events counted in not yet flushed digests.
+    """
+    return NotificationDigest.objects.aggregate(
+        total=Sum('count')
+    )['total'] or 0
+
+
+def backoff(attempts):
+    return timedelta(
+        seconds=min(BASE_BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF)
+    )
+
+
+def to_message(notification, connection):
+    return EmailMessage(
+        subject=notification.title,
+        body=notification.text,
+        from_email=settings.DJANGO_LESSONS_NOTIFY_EMAIL,
+        to=[settings.DJANGO_LESSONS_NOTIFY_EMAIL],
+        connection=connection,
+    )
+
+
+def mark_failed(notifications, error):
+    now = timezone.now()
+
+    for notification in notifications:
+        notification.attempts += 1
+        notification.last_error = str(error)
+        if notification.attempts >= MAX_ATTEMPTS:
+            notification.status = Notification.FAILED
+            logger.error(
+                f"Giving up on notification id={notification.id}: {error}"
+            )
+        else:
+            notification.next_attempt_at = now + backoff(
+                notification.attempts
+            )
+
+    Notification.objects.bulk_update(
+        notifications,
+        ['attempts', 'last_error', 'status', 'next_attempt_at']
+    )
+
+
+def mark_sent(notifications):
+    now = timezone.now()
+
+    for notification in notifications:
+        notification.attempts += 1
+        notification.status = Notification.SENT
+        notification.sent_at = now
+
+    Notification.objects.bulk_update(
+        notifications,
+        ['attempts', 'status', 'sent_at']
+    )
+
+
+def send_batch(batch_size=BATCH_SIZE):
+    """
+    Sends one batch of due notifications over a single mail connection.
+    Returns number of notifications sent. Each notification is marked
+    sent or failed on its own.
+
+    Rows are locked (and locked ones skipped), so several workers can run
+    at the same time.
+    """
+    with transaction.atomic():
+        notifications = list(
+            Notification.objects.select_for_update(
+                skip_locked=True
+            ).filter(
+                status=Notification.PENDING,
+                next_attempt_at__lte=timezone.now()
+            ).order_by('next_attempt_at')[:batch_size]
+        )
+
+        if not notifications:
+            return 0
+
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as error:
+            logger.warning(
+                f"Failed to send {len(notifications)} notifications: {error}"
+            )
+            mark_failed(notifications, error)
+            return 0
+
+        # one message at a time: if connection drops halfway through,
+        # only messages not delivered yet are retried (no duplicates)
+        sent = []
+        try:
+            for notification in notifications:
+                try:
+                    connection.send_messages(
+                        [to_message(notification, connection)]
+                    )
+                except Exception as error:
+                    logger.warning(
+                        f"Failed to send notification id={notification.id}:"
+                        f" {error}"
+                    )
+                    mark_failed([notification], error)
+                else:
+                    sent.append(notification)
+        finally:
+            try:
+                connection.close()
+            except Exception as error:
+                # messages were delivered already
+                logger.warning(f"Failed to close mail connection: {error}")
+
+        mark_sent(sent)
+
+    return len(sent)
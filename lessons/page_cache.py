@@ -0,0 +1,294 @@
+"""
+Full page cache for anonymous visitors.
+
+Views declare what content a page is built from with add_keys(request,
+*keys) - e.g. lesson_key(lesson.id), LESSON_LIST. PageCacheMiddleware
+stores only such responses, only for anonymous GET requests (which never
+get PRO content) and keeps with each page the version of every of its
+keys. purge(*keys) sets a new version of given keys (after the
+transaction commits), so all pages built from them become stale at once;
+purge_all() does the same for the whole site (SITE key is part of every
+page).
+
+Token of CSRF protected forms (e.g. newsletter form on index) is not
+stored: it is replaced with a placeholder and every visitor gets a token
+of their own when page is served.
+
+Responses get Surrogate-Key header (keys of the page) and Cache-Control
+header: pages without per visitor parts can be cached by a CDN for
+DJANGO_LESSONS_PAGE_CACHE_SECONDS, the others are private.
+"""
+import hashlib
+import logging
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import parse_http_date_safe
+
+logger = logging.getLogger(__name__)
+
+DJANGO_LESSONS_PAGE_CACHE_SECONDS = 'DJANGO_LESSONS_PAGE_CACHE_SECONDS'
+PAGE_CACHE_SECONDS = 600
+
+PAGE_KEY = 'lessons:page:{digest}'
+VERSION_KEY = 'lessons:page_version:{key}'
+# time of last purge (as timestamp), see content_changed_at
+CHANGED_AT_KEY = 'lessons:content_changed_at'
+
+# surrogate keys
+SITE = 'site'
+# listings of lessons: index, tag index, feed
+LESSON_LIST = 'lesson-list'
+
+CSRF_INPUT = re.compile(
+    r'(<input type="hidden" name="csrfmiddlewaretoken" value=")[^"]*(")'
+)
+CSRF_PLACEHOLDER = '__page_cache_csrf_token__'
+
+HIT = 'HIT'
+MISS = 'MISS'
+
+
+def lesson_key(lesson_id):
+    return f"lesson-{lesson_id}"
+
+
+def course_key(course_id):
+    return f"course-{course_id}"
+
+
+def timeout():
+    return getattr(
+        settings,
+        DJANGO_LESSONS_PAGE_CACHE_SECONDS,
+        PAGE_CACHE_SECONDS
+    )
+
+
+def versions(keys):
+    """
+    Current versions of surrogate keys (None for never purged ones).
+    """
+    values = cache.get_many([VERSION_KEY.format(key=key) for key in keys])
+
+    return {
+        key: values.get(VERSION_KEY.format(key=key))
+        for key in keys
+    }
+
+
+def add_keys(request, *keys):
+    """
+    Declares that response to request is built from content identified
+    by keys (only such responses are cached).
+
+    Versions are read right away, before the page is rendered: if content
+    changes while rendering, the stored page is already stale.
+    """
+    new_keys = [
+        key for key in keys
+        if key not in getattr(request, 'page_cache_keys', {})
+    ]
+
+    if not hasattr(request, 'page_cache_keys'):
+        request.page_cache_keys = versions([SITE])
+
+    request.page_cache_keys.update(versions(new_keys))
+
+
+def _purge(keys):
+    # a new random version: a lost (evicted) version never matches the
+    # version stored with a page again
+    version = uuid.uuid4().hex
+    values = {VERSION_KEY.format(key=key): version for key in keys}
+    values[CHANGED_AT_KEY] = time.time()
+    cache.set_many(values, None)
+    logger.debug(f"Purged pages of {', '.join(keys)}")
+
+
+def purge(*keys):
+    """
+    Makes all pages built from given keys stale. Within a transaction,
+    pages are purged once more after commit: until then, a concurrent
+    request still sees (and might cache) the old content.
+    """
+    keys = list(keys)
+    _purge(keys)
+
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _purge(keys))
+
+
+def purge_all():
+    purge(SITE)
+
+
+def content_changed_at():
+    """
+    When was content (of any page) changed last - when was the last
+    purge. If it is not known (e.g. cache was cleared), it is now.
+    """
+    timestamp = cache.get(CHANGED_AT_KEY)
+
+    if timestamp is None:
+        cache.add(CHANGED_AT_KEY, time.time(), None)
+        timestamp = cache.get(CHANGED_AT_KEY, time.time())
+
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def page_key(request):
+    query = sorted(
+        (name, value)
+        for name, values in request.GET.lists()
+        for value in values
+    )
+    digest = hashlib.sha1(
+        f"{request.path}?{query}".encode('utf-8')
+    ).hexdigest()
+
+    return PAGE_KEY.format(digest=digest)
+
+
+def is_cacheable_request(request):
+    if request.method != 'GET' or not timeout():
+        return False
+
+    if request.user.is_authenticated:
+        return False
+
+    # e.g. "thank you" message after newsletter subscription
+    return not len(get_messages(request))
+
+
+def is_cacheable_response(request, response):
+    if not getattr(request, 'page_cache_keys', None):
+        return False
+
+    if response.status_code != 200 or response.streaming:
+        return False
+
+    # view set a cookie or stored something in session
+    if response.cookies or request.session.modified:
+        return False
+
+    cache_control = response.get('Cache-Control', '')
+
+    return 'private' not in cache_control and 'no-' not in cache_control
+
+
+def set_headers(response, keys, csrf):
+    response['Surrogate-Key'] = ' '.join(sorted(keys))
+
+    if csrf:
+        # each visitor needs a CSRF token of their own
+        patch_cache_control(response, private=True, max_age=0)
+    else:
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=0,
+            s_maxage=timeout()
+        )
+
+
+def store(request, response):
+    csrf = bool(request.META.get('CSRF_COOKIE_USED'))
+    content = response.content.decode(response.charset)
+
+    if csrf:
+        content = CSRF_INPUT.sub(rf'\g<1>{CSRF_PLACEHOLDER}\g<2>', content)
+
+    cache.set(
+        page_key(request),
+        {
+            'content': content,
+            'content_type': response['Content-Type'],
+            'keys': request.page_cache_keys,
+            'csrf': csrf,
+            # validators of conditional GET, see lessons.conditional
+            'etag': response.get('ETag'),
+            'last_modified': response.get('Last-Modified'),
+        },
+        timeout()
+    )
+    set_headers(response, request.page_cache_keys, csrf)
+
+
+def lookup(request):
+    """
+    Returns cached response or None (also if the page is stale).
+    """
+    entry = cache.get(page_key(request))
+
+    if entry is None:
+        return None
+
+    if versions(entry['keys']) != entry['keys']:
+        return None
+
+    response = get_conditional_response(
+        request,
+        etag=entry.get('etag'),
+        last_modified=parse_http_date_safe(entry.get('last_modified'))
+        if entry.get('last_modified') else None
+    )
+
+    if response is None:
+        content = entry['content']
+        if entry['csrf']:
+            content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+        response = HttpResponse(content, content_type=entry['content_type'])
+
+    for header, name in (('ETag', 'etag'), ('Last-Modified', 'last_modified')):
+        if entry.get(name):
+            response[header] = entry[name]
+    set_headers(response, entry['keys'], entry['csrf'])
+
+    return response
+
+
+class PageCacheMiddleware:
+    """
+    Must be placed after AuthenticationMiddleware and MessageMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_cacheable_request(request):
+            response = self.get_response(request)
+            if getattr(request, 'page_cache_keys', None):
+                # e.g. CDN must not cache pages of a logged in user
+                patch_cache_control(response, private=True)
+            return response
+
+        response = lookup(request)
+
+        if response is not None:
+            try:
+                # view name for metrics and logs
+                request.resolver_match = resolve(request.path_info)
+            except Resolver404:
+                pass
+            response['X-Page-Cache'] = HIT
+            return response
+
+        response = self.get_response(request)
+
+        if is_cacheable_response(request, response):
+            store(request, response)
+            response['X-Page-Cache'] = MISS
+
+        return response
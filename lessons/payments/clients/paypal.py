@@ -1,9 +1,14 @@
+import hashlib
 import os
+import time
 
 import paypalrestsdk
+import requests
 import yaml
 from django.conf import settings
-from lessons.payments import plans
+from django.core.cache import cache
+from lessons.payments import metrics, plans
+from requests.adapters import HTTPAdapter
 
 BASE_DIR = os.path.join(
     "..",  # proj
@@ -14,6 +19,164 @@ BASE_DIR = os.path.join(
 ORDER_A_CONF_PATH = os.path.join("paypal", "order-annual.yml")
 ORDER_M_CONF_PATH = os.path.join("paypal", "order-monthly.yml")
 
+PROVIDER = 'paypal'
+TOKEN_PATH = '/v1/oauth2/token'
+TOKEN_KEY = 'lessons:paypal:token:{mode}:{client}'
+# access token is replaced this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 300
+# seconds
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+POOL_SIZE = 10
+
+
+class Api(paypalrestsdk.Api):
+    """
+    paypalrestsdk.Api which shares its access token with other workers
+    (through django cache) and sends all requests through one keep-alive
+    connection pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._token_hash = None
+        self.token_expires_at = None
+        super().__init__(*args, **kwargs)
+
+        self.session = requests.Session()
+        self.session.mount(
+            'https://',
+            HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        )
+
+    @property
+    def token_key(self):
+        client = hashlib.sha1(self.client_id.encode('utf-8')).hexdigest()
+
+        return TOKEN_KEY.format(mode=self.mode, client=client)
+
+    @property
+    def token_hash(self):
+        return self._token_hash
+
+    @token_hash.setter
+    def token_hash(self, value):
+        # SDK resets token_hash when token expired or was rejected (401);
+        # shared token is removed too, unless some other worker
+        # already replaced it
+        if value is None and self._token_hash is not None:
+            shared = cache.get(self.token_key)
+            if shared and shared['token_hash'] == self._token_hash:
+                cache.delete(self.token_key)
+            self.token_expires_at = None
+
+        self._token_hash = value
+
+    def validate_token_hash(self):
+        if self.token_expires_at is None:
+            return
+
+        if time.time() >= self.token_expires_at - TOKEN_REFRESH_MARGIN:
+            self.token_hash = None
+
+    def load_token(self):
+        shared = cache.get(self.token_key)
+
+        if shared and time.time() < (
+            shared['expires_at'] - TOKEN_REFRESH_MARGIN
+        ):
+            self._token_hash = shared['token_hash']
+            self.token_expires_at = shared['expires_at']
+
+    def store_token(self, token_hash):
+        expires_in = token_hash.get('expires_in') or 0
+        self.token_expires_at = time.time() + expires_in
+
+        if expires_in > TOKEN_REFRESH_MARGIN:
+            cache.set(
+                self.token_key,
+                {
+                    'token_hash': token_hash,
+                    'expires_at': self.token_expires_at
+                },
+                expires_in - TOKEN_REFRESH_MARGIN
+            )
+
+    def get_token_hash(
+        self,
+        authorization_code=None,
+        refresh_token=None,
+        headers=None
+    ):
+        if authorization_code is not None or refresh_token is not None:
+            return super().get_token_hash(
+                authorization_code,
+                refresh_token,
+                headers
+            )
+
+        self.validate_token_hash()
+        if self._token_hash is None:
+            self.load_token()
+
+        if self._token_hash is None:
+            self.store_token(
+                super().get_token_hash(headers=headers)
+            )
+
+        return self._token_hash
+
+    def http_call(self, url, method, **kwargs):
+        if url.endswith(TOKEN_PATH):
+            operation = 'oauth2_token'
+        else:
+            operation = 'api_call'
+
+        started = time.monotonic()
+        ok = False
+        try:
+            response = self.session.request(
+                method,
+                url,
+                proxies=self.proxies,
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                **kwargs
+            )
+            ret = self.handle_response(
+                response,
+                response.content.decode('utf-8')
+            )
+            ok = True
+            return ret
+        finally:
+            metrics.record(
+                PROVIDER,
+                operation,
+                time.monotonic() - started,
+                ok
+            )
+
+
+_apis = {}
+
+
+def get_api(mode):
+    """
+    One Api instance (connection pool, access token) per process.
+    """
+    if mode not in _apis:
+        options = {
+            "mode": mode,  # noqa
+            "client_id": settings.PAYPAL_CLIENT_ID,
+            "client_secret": settings.PAYPAL_CLIENT_SECRET
+        }
+        # e.g. local mock server (payments_mock_server command)
+        endpoint = getattr(settings, 'PAYPAL_API_ENDPOINT', None)
+        if endpoint:
+            options['endpoint'] = endpoint
+        _apis[mode] = Api(options)
+
+    return _apis[mode]
+
 
 class BaseClient:
     """
@@ -45,12 +208,9 @@ class BaseClient:
 class RealClient(BaseClient):
     def __init__(self, mode):
         self._mode = mode
-        self._api = paypalrestsdk.Api({
-            "mode": mode,  # noqa
-            "client_id": settings.PAYPAL_CLIENT_ID,
-            "client_secret": settings.PAYPAL_CLIENT_SECRET
-        })
+        self._api = get_api(mode)
 
+    @metrics.timed(PROVIDER)
     def create_subscription(self, lesson_plan):
         data = {
             'plan_id': lesson_plan.paypal_plan_id,
@@ -60,11 +220,13 @@ class RealClient(BaseClient):
             data
         )
 
+    @metrics.timed(PROVIDER)
     def get_subscription(self, billing_agreement_id):
         return self._api.get(
             f"v1/billing/subscriptions/{billing_agreement_id}"
         )
 
+    @metrics.timed(PROVIDER)
     def get_url(self, url):
         return self._api.get(
             url
@@ -85,6 +247,7 @@ class RealClient(BaseClient):
 
         return data
 
+    @metrics.timed(PROVIDER)
     def create_onetime_order(self, lesson_plan):
         order_dict = self.get_order(lesson_plan)
 
@@ -1,5 +1,36 @@
+import functools
+import time
+
+import requests
 import stripe as orig_stripe
 from django.conf import settings
+from lessons.payments import metrics
+from requests.adapters import HTTPAdapter
+from stripe.http_client import RequestsClient
+
+PROVIDER = 'stripe'
+# seconds
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+# retried requests are sent with the same Idempotency-Key (SDK adds one to
+# every POST), so a retry never creates a second charge
+MAX_NETWORK_RETRIES = 2
+POOL_SIZE = 10
+
+# BaseClient methods (calls to Stripe API) which are timed
+METHODS = [
+    'create_customer',
+    'retrieve_customer',
+    'retrieve_invoice',
+    'create_subscription',
+    'retrieve_subscription',
+    'retrieve_payment_intent',
+    'create_payment_intent',
+    'create_and_confirm_payment_intent',
+    'modify_payment_intent',
+    'confirm_payment_intent',
+    'cancel_subscription',
+]
 
 
 class Fake:
@@ -11,6 +42,10 @@ class Fake:
     def status(self):
         return "fake_status"
 
+    @property
+    def client_secret(self):
+        return "fake_secret"
+
 
 class FakeStatus(Fake):
     @property
@@ -22,12 +57,20 @@ class FakeCustomer(Fake):
     pass
 
 
-class FakeSubscription(Fake):
+class FakePaymentIntent(Fake):
     pass
 
 
-class FakePaymentIntent(Fake):
-    pass
+class FakeInvoice(Fake):
+    @property
+    def payment_intent(self):
+        return FakePaymentIntent()
+
+
+class FakeSubscription(Fake):
+    @property
+    def latest_invoice(self):
+        return FakeInvoice()
 
 
 class BaseClient:
@@ -39,6 +82,28 @@ class BaseClient:
     def __init__(self, api_key):
         self._api_key = api_key
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        # each API method of every client records duration and outcome
+        for name in METHODS:
+            if name in cls.__dict__:
+                setattr(cls, name, cls.timed(name, cls.__dict__[name]))
+
+    @staticmethod
+    def timed(name, method):
+
+        @metrics.timed(PROVIDER, name)
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            self.before_call(name)
+            return method(self, *args, **kwargs)
+
+        return wrapper
+
+    def before_call(self, name):
+        pass
+
     @property
     def api_key(self):
         return self._api_key
@@ -57,7 +122,7 @@ class BaseClient:
     def retrieve_invoice(self, invoice_id):
         pass
 
-    def create_subscription(self, customer, stripe_plan_id):
+    def create_subscription(self, customer_id, stripe_plan_id):
         pass
 
     def retrieve_subscription(self, subscription_id):
@@ -75,6 +140,15 @@ class BaseClient:
     ):
         pass
 
+    def create_and_confirm_payment_intent(
+        self,
+        amount,
+        currency,
+        receipt_email,
+        payment_method_id
+    ):
+        pass
+
     def modify_payment_intent(
         self,
         payment_intent_id,
@@ -99,6 +173,23 @@ class RealClient(BaseClient):
         self._api_key = api_key
         orig_stripe.api_key = self._api_key
 
+        # all calls go through one keep-alive connection pool
+        session = requests.Session()
+        session.mount(
+            'https://',
+            HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        )
+        orig_stripe.default_http_client = RequestsClient(
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            session=session
+        )
+        orig_stripe.max_network_retries = MAX_NETWORK_RETRIES
+
+        # e.g. local mock server (payments_mock_server command)
+        api_base = getattr(settings, 'STRIPE_API_BASE', None)
+        if api_base:
+            orig_stripe.api_base = api_base
+
     @property
     def api_key(self):
         return self._api_key
@@ -122,12 +213,9 @@ class RealClient(BaseClient):
         )
         return customer
 
-    def create_subscription(self, customer, stripe_plan_id):
-        """
-        customer = is orig_stripe.Customer instance
-        """
+    def create_subscription(self, customer_id, stripe_plan_id):
         subscription = orig_stripe.Subscription.create(
-            customer=customer.id,
+            customer=customer_id,
             items=[
                 {
                     'plan': stripe_plan_id
@@ -157,7 +245,8 @@ class RealClient(BaseClient):
 
     def retrieve_subscription(self, subscription_id):
         sub = orig_stripe.Subscription.retrieve(
-            subscription_id
+            subscription_id,
+            expand=['latest_invoice.payment_intent'],
         )
 
         return sub
@@ -183,6 +272,27 @@ class RealClient(BaseClient):
         )
         return pi
 
+    def create_and_confirm_payment_intent(
+        self,
+        amount,
+        currency,
+        receipt_email,
+        payment_method_id
+    ):
+        """
+        Creates payment intent with payment method attached and confirms
+        it - all in one request.
+        """
+        pi = orig_stripe.PaymentIntent.create(
+            amount=amount,
+            currency=currency,
+            receipt_email=receipt_email,
+            payment_method_types=['card'],
+            payment_method=payment_method_id,
+            confirm=True
+        )
+        return pi
+
     def modify_payment_intent(
         self,
         payment_intent_id,
@@ -204,8 +314,20 @@ class RealClient(BaseClient):
 
 
 class FakeClient(BaseClient):
-    def __init__(self, api_key):
+    def __init__(self, api_key, latency=0):
+        """
+        latency - seconds each API call takes (to simulate Stripe
+        round trips locally)
+        """
         self._api_key = api_key
+        self._latency = latency
+        # names of called methods, i.e. round trips to Stripe
+        self.calls = []
+
+    def before_call(self, name):
+        self.calls.append(name)
+        if self._latency:
+            time.sleep(self._latency)
 
     @property
     def api_key(self):
@@ -222,7 +344,7 @@ class FakeClient(BaseClient):
     def retrieve_customer(self, customer_id):
         return FakeCustomer()
 
-    def create_subscription(self, customer, stripe_plan_id):
+    def create_subscription(self, customer_id, stripe_plan_id):
         return FakeSubscription()
 
     def retrieve_subscription(self, subscription_id):
@@ -241,6 +363,15 @@ class FakeClient(BaseClient):
 
         return FakePaymentIntent()
 
+    def create_and_confirm_payment_intent(
+        self,
+        amount,
+        currency,
+        receipt_email,
+        payment_method_id
+    ):
+        return FakeStatus()
+
     def modify_payment_intent(
         self,
         payment_intent_id,
@@ -257,7 +388,10 @@ class FakeClient(BaseClient):
 
 def get_stripe_client():
     if hasattr(settings, 'TEST') and settings.TEST is True:
-        return FakeClient(api_key='blah')
+        return FakeClient(
+            api_key='blah',
+            latency=getattr(settings, 'STRIPE_FAKE_LATENCY', 0)
+        )
 
     return RealClient(api_key=settings.STRIPE_SECRET_KEY)
 
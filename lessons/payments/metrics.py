@@ -0,0 +1,111 @@
+"""
+Latency and outcome of calls to payment providers' APIs.
+
+Counters live in Django's default cache (like lessons.caching stats), so
+calls from all gunicorn workers add up. payment_stats management command
+displays them.
+"""
+import functools
+import logging
+import time
+
+from django.core.cache import cache
+from lessons.utils import incr_counter
+
+logger = logging.getLogger(__name__)
+
+CALL_KEY = 'lessons:payments:{provider}:{operation}:{what}'
+CALLS = 'calls'
+ERRORS = 'errors'
+# total time of all calls, in microseconds (cache.incr works with integers)
+MICROSECONDS = 'us'
+
+# (provider, operation) pairs reported by stats(); filled by register()
+OPERATIONS = []
+
+
+def register(provider, operation):
+    if (provider, operation) not in OPERATIONS:
+        OPERATIONS.append((provider, operation))
+
+
+def record(provider, operation, seconds, ok=True):
+    register(provider, operation)
+    logger.debug(
+        f"{provider}.{operation} {seconds * 1000:.1f}ms"
+        f" {'ok' if ok else 'error'}"
+    )
+    values = {CALLS: 1, MICROSECONDS: int(seconds * 1000000)}
+    if not ok:
+        values[ERRORS] = 1
+    for what, delta in values.items():
+        incr_counter(
+            CALL_KEY.format(provider=provider, operation=operation, what=what),
+            delta
+        )
+
+
+def timed(provider, operation=None):
+    """
+    Decorator recording duration and outcome (exception raised or not)
+    of each call.
+    """
+    def decorator(func):
+        name = operation or func.__name__
+        register(provider, name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            ok = False
+            try:
+                ret = func(*args, **kwargs)
+                ok = True
+                return ret
+            finally:
+                record(provider, name, time.monotonic() - started, ok)
+
+        return wrapper
+
+    return decorator
+
+
+def stats():
+    """
+    Returns a dictionary 'provider.operation' => {
+        'calls': ..., 'errors': ..., 'avg_ms': ...
+    }
+    """
+    ret = {}
+    for provider, operation in OPERATIONS:
+        values = cache.get_many([
+            CALL_KEY.format(provider=provider, operation=operation, what=what)
+            for what in (CALLS, ERRORS, MICROSECONDS)
+        ])
+
+        def value(what):
+            return values.get(
+                CALL_KEY.format(
+                    provider=provider,
+                    operation=operation,
+                    what=what
+                ),
+                0
+            )
+
+        calls = value(CALLS)
+        ret[f"{provider}.{operation}"] = {
+            CALLS: calls,
+            ERRORS: value(ERRORS),
+            'avg_ms': value(MICROSECONDS) / calls / 1000 if calls else 0,
+        }
+
+    return ret
+
+
+def reset_stats():
+    cache.delete_many([
+        CALL_KEY.format(provider=provider, operation=operation, what=what)
+        for provider, operation in OPERATIONS
+        for what in (CALLS, ERRORS, MICROSECONDS)
+    ])
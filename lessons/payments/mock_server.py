@@ -0,0 +1,678 @@
+"""
+Local stand-in for the subset of Stripe and PayPal REST APIs used by
+lessons.payments (run it with payments_mock_server management command).
+
+Site is pointed to it with STRIPE_API_BASE and PAYPAL_API_ENDPOINT
+settings; requests then go through the real SDKs, HTTP clients and
+serialization, only the provider is local. Knobs:
+
+    * latency - distribution of response times (see Latency)
+    * error_rate - fraction of requests answered with HTTP 500
+    * three_d_secure_rate - fraction of card payments requiring 3D Secure
+    * webhook_url - where Stripe events (charge.succeeded,
+      invoice.payment_succeeded) are posted, signed with
+      stripe_signing_key, after webhook_delay
+
+PayPal webhooks are not sent: PayPal certificates are only accepted
+from https urls on PayPal hosts (see lessons.webhooks.paypal_certs).
+
+GET /__mock__/stats returns number of requests/errors per route and of
+sent webhooks. Webhooks can be posted to /__mock__/webhooks (which only
+records them) to test without running the site.
+"""
+import copy
+import hashlib
+import hmac
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+STRIPE = 'stripe'
+PAYPAL = 'paypal'
+
+SUBSCRIPTION_PERIOD = 31 * 24 * 3600
+PAYPAL_TOKEN_EXPIRES_IN = 32400
+WEBHOOK_TIMEOUT = 10
+
+
+class Latency:
+    """
+    Latency distribution, in milliseconds, given as a string:
+
+        fixed:50
+        uniform:20:80 (min, max)
+        normal:50:10 (mean, standard deviation)
+        lognormal:50:0.5 (median, sigma) - long tail, like real APIs
+    """
+    ARGS = {
+        'fixed': 1,
+        'uniform': 2,
+        'normal': 2,
+        'lognormal': 2,
+    }
+
+    def __init__(self, spec='fixed:0'):
+        kind, *args = spec.split(':')
+
+        if self.ARGS.get(kind) != len(args):
+            raise ValueError(f"Invalid latency {spec}")
+
+        self.kind = kind
+        self.args = [float(arg) for arg in args]
+        self.spec = spec
+
+    def sample(self):
+        """
+        Returns latency in seconds.
+        """
+        if self.kind == 'fixed':
+            ms = self.args[0]
+        elif self.kind == 'uniform':
+            ms = random.uniform(*self.args)
+        elif self.kind == 'normal':
+            ms = random.gauss(*self.args)
+        else:
+            median, sigma = self.args
+            ms = median * math.exp(random.gauss(0, sigma))
+
+        return max(ms, 0) / 1000
+
+    def __str__(self):
+        return self.spec
+
+
+def new_id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def stripe_signature(payload, secret, timestamp=None):
+    """
+    Value of Stripe-Signature header for payload (str).
+    """
+    timestamp = timestamp or int(time.time())
+    digest = hmac.new(
+        secret.encode('utf-8'),
+        f"{timestamp}.{payload}".encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+
+    return f"t={timestamp},v1={digest}"
+
+
+def stripe_error(status, message, error_type='api_error'):
+    return status, {'error': {'type': error_type, 'message': message}}
+
+
+def paypal_error(status, name, message):
+    return status, {'name': name, 'message': message}
+
+
+class MockServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        latency=None,
+        error_rate=0,
+        three_d_secure_rate=0,
+        webhook_url=None,
+        webhook_delay=None,
+        stripe_signing_key='',
+    ):
+        super().__init__(address, Handler)
+        self.latency = latency or Latency()
+        self.error_rate = error_rate
+        self.three_d_secure_rate = three_d_secure_rate
+        self.webhook_url = webhook_url
+        self.webhook_delay = webhook_delay or Latency()
+        self.stripe_signing_key = stripe_signing_key
+
+        self.lock = threading.Lock()
+        # id => object, for both providers
+        self.objects = {}
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.webhooks = defaultdict(int)
+        # received on /__mock__/webhooks
+        self.received_webhooks = []
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+
+        return f"http://{host}:{port}"
+
+    def save(self, obj):
+        with self.lock:
+            self.objects[obj['id']] = obj
+
+        return obj
+
+    def get(self, obj_id):
+        with self.lock:
+            return copy.deepcopy(self.objects.get(obj_id))
+
+    def count(self, counter, name):
+        with self.lock:
+            counter[name] += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'errors': dict(self.errors),
+                'webhooks': dict(self.webhooks),
+            }
+
+    def three_d_secure(self):
+        return random.random() < self.three_d_secure_rate
+
+    # --- webhooks ---
+
+    def send_stripe_event(self, event_type, obj):
+        if not self.webhook_url:
+            return
+
+        event = {
+            'id': new_id('evt'),
+            'object': 'event',
+            'type': event_type,
+            'created': int(time.time()),
+            'data': {'object': obj},
+        }
+        threading.Thread(
+            target=self.deliver,
+            args=(json.dumps(event),),
+            daemon=True
+        ).start()
+
+    def deliver(self, payload):
+        time.sleep(self.webhook_delay.sample())
+
+        try:
+            response = requests.post(
+                self.webhook_url,
+                data=payload.encode('utf-8'),
+                headers={
+                    'Content-Type': 'application/json',
+                    'Stripe-Signature': stripe_signature(
+                        payload,
+                        self.stripe_signing_key
+                    ),
+                },
+                timeout=WEBHOOK_TIMEOUT
+            )
+            ok = response.status_code == 200
+        except requests.RequestException as error:
+            logger.warning(f"Webhook delivery failed: {error}")
+            ok = False
+
+        self.count(self.webhooks, 'sent' if ok else 'failed')
+
+    # --- Stripe ---
+
+    def expand(self, obj, paths):
+        for path in paths:
+            current = obj
+            for field in path.split('.'):
+                value = current.get(field)
+                if isinstance(value, str) and self.get(value):
+                    current[field] = self.get(value)
+                current = current.get(field)
+                if not isinstance(current, dict):
+                    break
+
+        return obj
+
+    def charge_succeeded(self, payment_intent):
+        self.send_stripe_event('charge.succeeded', {
+            'id': new_id('ch'),
+            'object': 'charge',
+            'amount': payment_intent['amount'],
+            'currency': payment_intent['currency'],
+            'receipt_email': payment_intent['receipt_email'],
+            'payment_intent': payment_intent['id'],
+        })
+
+    def confirm(self, payment_intent):
+        if self.three_d_secure():
+            payment_intent['status'] = 'requires_action'
+        else:
+            payment_intent['status'] = 'succeeded'
+
+        return payment_intent
+
+    def stripe_create_customer(self, params):
+        return 200, self.save({
+            'id': new_id('cus'),
+            'object': 'customer',
+            'email': params.get('email'),
+            'invoice_settings': {
+                'default_payment_method': params.get(
+                    'invoice_settings[default_payment_method]'
+                )
+            },
+        })
+
+    def stripe_retrieve(self, params, obj_id):
+        obj = self.get(obj_id)
+
+        if obj is None:
+            return stripe_error(
+                404,
+                f"No such object: {obj_id}",
+                'invalid_request_error'
+            )
+
+        return 200, self.expand(obj, expand_paths(params))
+
+    def stripe_create_payment_intent(self, params):
+        payment_intent = {
+            'id': new_id('pi'),
+            'object': 'payment_intent',
+            'amount': int(params.get('amount', 0)),
+            'currency': params.get('currency', 'usd'),
+            'receipt_email': params.get('receipt_email'),
+            'payment_method': params.get('payment_method'),
+            'status': 'requires_payment_method',
+        }
+        payment_intent['client_secret'] = (
+            f"{payment_intent['id']}_secret_{uuid.uuid4().hex[:12]}"
+        )
+
+        if payment_intent['payment_method']:
+            payment_intent['status'] = 'requires_confirmation'
+
+        # SDK sends booleans as True/False
+        if str(params.get('confirm')).lower() == 'true':
+            self.confirm(payment_intent)
+
+        self.save(payment_intent)
+        if payment_intent['status'] == 'succeeded':
+            self.charge_succeeded(payment_intent)
+
+        return 200, payment_intent
+
+    def stripe_modify_payment_intent(self, params, obj_id):
+        payment_intent = self.get(obj_id)
+
+        if payment_intent is None:
+            return self.stripe_retrieve(params, obj_id)
+
+        if params.get('payment_method'):
+            payment_intent['payment_method'] = params['payment_method']
+            payment_intent['status'] = 'requires_confirmation'
+
+        return 200, self.save(payment_intent)
+
+    def stripe_confirm_payment_intent(self, params, obj_id):
+        payment_intent = self.get(obj_id)
+
+        if payment_intent is None:
+            return self.stripe_retrieve(params, obj_id)
+
+        self.save(self.confirm(payment_intent))
+        if payment_intent['status'] == 'succeeded':
+            self.charge_succeeded(payment_intent)
+
+        return 200, payment_intent
+
+    def stripe_create_subscription(self, params):
+        customer = self.get(params.get('customer'))
+
+        if customer is None:
+            return stripe_error(
+                404,
+                f"No such customer: {params.get('customer')}",
+                'invalid_request_error'
+            )
+
+        now = int(time.time())
+        subscription_id = new_id('sub')
+        payment_intent = self.confirm({
+            'id': new_id('pi'),
+            'object': 'payment_intent',
+            'amount': 0,
+            'currency': 'usd',
+            'receipt_email': customer['email'],
+            'payment_method': customer['invoice_settings'][
+                'default_payment_method'
+            ],
+        })
+        payment_intent['client_secret'] = (
+            f"{payment_intent['id']}_secret_{uuid.uuid4().hex[:12]}"
+        )
+        paid = payment_intent['status'] == 'succeeded'
+        invoice = {
+            'id': new_id('in'),
+            'object': 'invoice',
+            'customer': customer['id'],
+            'customer_email': customer['email'],
+            'subscription': subscription_id,
+            'paid': paid,
+            'payment_intent': payment_intent['id'],
+            'lines': {
+                'object': 'list',
+                'data': [{
+                    'type': 'subscription',
+                    'plan': {'id': params.get('items[0][plan]')},
+                    'period': {
+                        'start': now,
+                        'end': now + SUBSCRIPTION_PERIOD
+                    },
+                }],
+            },
+        }
+        subscription = {
+            'id': subscription_id,
+            'object': 'subscription',
+            'customer': customer['id'],
+            'status': 'active' if paid else 'incomplete',
+            'current_period_end': now + SUBSCRIPTION_PERIOD,
+            'latest_invoice': invoice['id'],
+        }
+        self.save(payment_intent)
+        self.save(invoice)
+        self.save(subscription)
+
+        if paid:
+            self.send_stripe_event('invoice.payment_succeeded', invoice)
+
+        return 200, self.expand(subscription, expand_paths(params))
+
+    def stripe_delete_subscription(self, params, obj_id):
+        subscription = self.get(obj_id)
+
+        if subscription is None:
+            return self.stripe_retrieve(params, obj_id)
+
+        subscription['status'] = 'canceled'
+
+        return 200, self.save(subscription)
+
+    # --- PayPal ---
+
+    def paypal_token(self, params):
+        return 200, {
+            'access_token': new_id('A21AA'),
+            'token_type': 'Bearer',
+            'app_id': 'APP-MOCK',
+            'expires_in': PAYPAL_TOKEN_EXPIRES_IN,
+        }
+
+    def paypal_links(self, path, obj_id):
+        return [
+            {
+                'rel': 'approve',
+                'href': f"{self.url}/mock-approve?token={obj_id}",
+                'method': 'GET',
+            },
+            {
+                'rel': 'self',
+                'href': f"{self.url}/{path}/{obj_id}",
+                'method': 'GET',
+            },
+        ]
+
+    def paypal_create_subscription(self, params):
+        obj_id = f"I-{uuid.uuid4().hex[:12].upper()}"
+
+        return 201, self.save({
+            'id': obj_id,
+            'plan_id': params.get('plan_id'),
+            'status': 'APPROVAL_PENDING',
+            'links': self.paypal_links('v1/billing/subscriptions', obj_id),
+        })
+
+    def paypal_create_order(self, params):
+        obj_id = uuid.uuid4().hex[:17].upper()
+
+        return 201, self.save({
+            'id': obj_id,
+            'intent': params.get('intent'),
+            'purchase_units': params.get('purchase_units', []),
+            'status': 'CREATED',
+            'links': self.paypal_links('v2/checkout/orders', obj_id),
+        })
+
+    def paypal_create(self, params, kind):
+        return 201, self.save(
+            dict(params, id=new_id(kind.upper()), status='ACTIVE')
+        )
+
+    def paypal_list(self, params, kind):
+        with self.lock:
+            items = [
+                obj for obj in self.objects.values()
+                if obj['id'].startswith(kind.upper())
+            ]
+
+        return 200, {kind + 's': items}
+
+    def paypal_retrieve(self, params, obj_id):
+        obj = self.get(obj_id)
+
+        if obj is None:
+            return paypal_error(
+                404,
+                'RESOURCE_NOT_FOUND',
+                f"{obj_id} not found"
+            )
+
+        # approval happens in user's browser, which is skipped here
+        if obj.get('status') == 'APPROVAL_PENDING':
+            obj['status'] = 'ACTIVE'
+        if obj.get('status') == 'CREATED':
+            obj['status'] = 'APPROVED'
+
+        return 200, obj
+
+    # --- mock's own ---
+
+    def mock_stats(self, params):
+        return 200, self.stats()
+
+    def record_webhook(self, payload, signature):
+        with self.lock:
+            self.received_webhooks.append((payload, signature))
+
+        return 200, {}
+
+
+def expand_paths(params):
+    return [
+        value for key, value in params.items()
+        if key == 'expand' or key.startswith('expand[')
+    ]
+
+
+# (method, path regex, provider, MockServer method name)
+ROUTES = [
+    ('POST', r'/v1/customers', STRIPE, 'stripe_create_customer'),
+    ('GET', r'/v1/customers/(?P<obj_id>[\w-]+)', STRIPE, 'stripe_retrieve'),
+    ('POST', r'/v1/payment_intents', STRIPE, 'stripe_create_payment_intent'),
+    (
+        'GET',
+        r'/v1/payment_intents/(?P<obj_id>[\w-]+)',
+        STRIPE,
+        'stripe_retrieve'
+    ),
+    (
+        'POST',
+        r'/v1/payment_intents/(?P<obj_id>[\w-]+)/confirm',
+        STRIPE,
+        'stripe_confirm_payment_intent'
+    ),
+    (
+        'POST',
+        r'/v1/payment_intents/(?P<obj_id>[\w-]+)',
+        STRIPE,
+        'stripe_modify_payment_intent'
+    ),
+    ('POST', r'/v1/subscriptions', STRIPE, 'stripe_create_subscription'),
+    (
+        'GET',
+        r'/v1/subscriptions/(?P<obj_id>[\w-]+)',
+        STRIPE,
+        'stripe_retrieve'
+    ),
+    (
+        'DELETE',
+        r'/v1/subscriptions/(?P<obj_id>[\w-]+)',
+        STRIPE,
+        'stripe_delete_subscription'
+    ),
+    ('GET', r'/v1/invoices/(?P<obj_id>[\w-]+)', STRIPE, 'stripe_retrieve'),
+    ('POST', r'/v1/oauth2/token', PAYPAL, 'paypal_token'),
+    (
+        'POST',
+        r'/v1/billing/subscriptions',
+        PAYPAL,
+        'paypal_create_subscription'
+    ),
+    (
+        'GET',
+        r'/v1/billing/subscriptions/(?P<obj_id>[\w-]+)',
+        PAYPAL,
+        'paypal_retrieve'
+    ),
+    ('POST', r'/v2/checkout/orders', PAYPAL, 'paypal_create_order'),
+    (
+        'GET',
+        r'/v2/checkout/orders/(?P<obj_id>[\w-]+)',
+        PAYPAL,
+        'paypal_retrieve'
+    ),
+    (
+        'POST',
+        r'/v1/catalogs/(?P<kind>product)s',
+        PAYPAL,
+        'paypal_create'
+    ),
+    ('GET', r'/v1/catalogs/(?P<kind>product)s', PAYPAL, 'paypal_list'),
+    ('POST', r'/v1/billing/(?P<kind>plan)s', PAYPAL, 'paypal_create'),
+    ('GET', r'/v1/billing/(?P<kind>plan)s', PAYPAL, 'paypal_list'),
+    ('GET', r'/__mock__/stats', None, 'mock_stats'),
+    ('POST', r'/__mock__/webhooks', None, 'record_webhook'),
+]
+
+COMPILED_ROUTES = [
+    (method, re.compile(f"^{pattern}/?$"), provider, name)
+    for method, pattern, provider, name in ROUTES
+]
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    # keep-alive, so that pooled connections of clients are reused
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def params(self, url):
+        params = {
+            key: values[0]
+            for key, values in parse_qs(url.query).items()
+        }
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        self.body = body
+
+        if not body:
+            return params
+
+        if self.headers.get('Content-Type', '').startswith(
+            'application/json'
+        ):
+            data = json.loads(body)
+            if isinstance(data, dict):
+                params.update(data)
+        else:
+            params.update({
+                key: values[0]
+                for key, values in parse_qs(body).items()
+            })
+
+        return params
+
+    def route(self, method, path):
+        for route_method, pattern, provider, name in COMPILED_ROUTES:
+            match = pattern.match(path)
+            if route_method == method and match:
+                return provider, name, match.groupdict()
+
+        return None, None, {}
+
+    def dispatch(self, method):
+        server = self.server
+        url = urlparse(self.path)
+        params = self.params(url)
+        provider, name, kwargs = self.route(method, url.path)
+
+        if name is None:
+            status, data = stripe_error(
+                404,
+                f"Unrecognized request URL ({method}: {url.path})",
+                'invalid_request_error'
+            )
+            return self.respond(status, data)
+
+        if provider is not None:
+            server.count(server.requests, name)
+            time.sleep(server.latency.sample())
+
+            if random.random() < server.error_rate:
+                server.count(server.errors, name)
+                if provider == STRIPE:
+                    status, data = stripe_error(500, "Injected error")
+                else:
+                    status, data = paypal_error(
+                        500,
+                        'INTERNAL_SERVER_ERROR',
+                        "Injected error"
+                    )
+                return self.respond(status, data)
+
+        if name == 'record_webhook':
+            status, data = server.record_webhook(
+                self.body,
+                self.headers.get('Stripe-Signature')
+            )
+        else:
+            status, data = getattr(server, name)(params, **kwargs)
+
+        self.respond(status, data)
+
+    def respond(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Request-Id', new_id('req'))
+        self.end_headers()
+        self.wfile.write(body)
@@ -10,7 +10,7 @@ from lessons.signals import (checkout_complete_error,
                              checkout_webhook_in_progress)
 
 from .plans import ANNUAL_AMOUNT, MONTHLY_AMOUNT
-from .utils import PLUS_ONE_MONTH, PLUS_ONE_YEAR, create_or_update_user_profile
+from .utils import create_or_update_user_profile, plus_days
 
 API_KEY = settings.STRIPE_SECRET_KEY
 PLAN_DICT = {
@@ -24,6 +24,7 @@ SUBSCRIPTION_ACTIVE = 'active'
 SUBSCRIPTION_INACTIVE = 'inactive'
 SUBSCRIPTION_INCOMPLETE = 'incomplete'
 PAYMENT_SUCCEEDED = 'succeeded'
+PAYMENT_REQUIRES_CONFIRMATION = 'requires_confirmation'
 
 
 class PaymentStatus:
@@ -133,6 +134,7 @@ class OneTimePayment(Payment):
         )
         self._payment_method_id = payment_method_id
         self._lesson_plan_id = lesson_plan_id
+        self._payment_intent = None
 
     @property
     def payment_method_id(self):
@@ -146,27 +148,23 @@ class OneTimePayment(Payment):
         lesson_plan = plans.LessonsPlan(
             plan_id=self.lesson_plan_id
         )
-        payment_intent = self.client.create_payment_intent(
+        # one round trip to Stripe: intent is created with payment
+        # method attached and confirmed right away
+        payment_intent = self.client.create_and_confirm_payment_intent(
             amount=lesson_plan.amount,
             currency=lesson_plan.currency,
             receipt_email=self.user.email,
-            payment_method_types=['card']
-        )
-        self.client.modify_payment_intent(
-            payment_intent.id,
             payment_method_id=self.payment_method_id
         )
-        ret = self.client.confirm_payment_intent(
-            payment_intent.id
-        )
+        self._payment_intent = payment_intent
 
-        if ret.status == PAYMENT_SUCCEEDED:
+        if payment_intent.status == PAYMENT_SUCCEEDED:
             self.status.set_status(
                 PaymentStatus.SUCCESS
             )
             return payment_intent
 
-        if ret.status == PaymentStatus.REQUIRES_ACTION:
+        if payment_intent.status == PaymentStatus.REQUIRES_ACTION:
             self.status.set_status(
                 PaymentStatus.REQUIRES_ACTION
             )
@@ -175,9 +173,12 @@ class OneTimePayment(Payment):
         return False
 
     def get_3ds_context(self, payment_intent_id):
-        pi = self.client.retrieve_payment_intent(
-            payment_intent=payment_intent_id
-        )
+        # client secret of the intent confirmed by pay() is already known
+        pi = self._payment_intent
+        if pi is None or pi.id != payment_intent_id:
+            pi = self.client.retrieve_payment_intent(
+                payment_intent=payment_intent_id
+            )
         context = {}
         context['payment_intent_secret'] = pi.client_secret
         context['STRIPE_PUBLISHABLE_KEY'] = settings.STRIPE_PUBLISHABLE_KEY
@@ -218,9 +219,12 @@ class RecurringPayment(Payment):
         return self.user.profile.stripe_subscription_id
 
     def get_3ds_context(self, latest_invoice):
-        pi = self.client.retrieve_payment_intent(
-            payment_intent=latest_invoice.payment_intent
-        )
+        pi = latest_invoice.payment_intent
+        # payment intent is expanded by create/retrieve subscription
+        if isinstance(pi, str):
+            pi = self.client.retrieve_payment_intent(
+                payment_intent=pi
+            )
         context = {}
         context['payment_intent_secret'] = pi.client_secret
         context['STRIPE_PUBLISHABLE_KEY'] = settings.STRIPE_PUBLISHABLE_KEY
@@ -234,11 +238,16 @@ class RecurringPayment(Payment):
         In case of 3D secure, from latest invoice instance, the
         confirmation view is generated.
         In case of failure returns False.
+
+        Customer and subscription ids are stored in user profile, so
+        usually only one or two calls to Stripe are needed:
+        create customer (first payment only) and create subscription
+        (which comes with latest invoice and its payment intent expanded).
         """
-        customer = self.get_or_create_customer()
+        customer_id = self.get_or_create_customer()
 
         subscription = self.get_or_create_subscription(
-            customer,
+            customer_id,
             self.stripe_plan_id
         )
 
@@ -255,14 +264,16 @@ class RecurringPayment(Payment):
             return subscription.latest_invoice
 
         if subscription.status == SUBSCRIPTION_INCOMPLETE:
-            latest_inv = self.client.retrieve_invoice(
-                subscription.latest_invoice
-            )
+            latest_inv = subscription.latest_invoice
+            pi = latest_inv.payment_intent
 
-            ret = self.client.confirm_payment_intent(
-                payment_intent=latest_inv.payment_intent
-            )
-            if ret.status == PaymentStatus.REQUIRES_ACTION:
+            if pi.status == PAYMENT_REQUIRES_CONFIRMATION:
+                pi = self.client.confirm_payment_intent(
+                    payment_intent=pi.id
+                )
+                latest_inv.payment_intent = pi
+
+            if pi.status == PaymentStatus.REQUIRES_ACTION:
                 self.status.set_status(
                     PaymentStatus.REQUIRES_ACTION
                 )
@@ -270,13 +281,13 @@ class RecurringPayment(Payment):
 
         return False
 
-    def get_or_create_subscription(self, customer, stripe_plan_id):
+    def get_or_create_subscription(self, customer_id, stripe_plan_id):
         """
-        customer is orig_stripe.Customer instance.
+        Returns subscription with latest_invoice.payment_intent expanded.
         """
         if not self.subscription_id:
             sub = self.client.create_subscription(
-                customer,
+                customer_id,
                 stripe_plan_id
             )
             self.save_subscription_id(sub.id)
@@ -288,7 +299,10 @@ class RecurringPayment(Payment):
         return sub
 
     def get_or_create_customer(self):
-
+        """
+        Returns Stripe customer id. Customer is created only once,
+        afterwards its id is taken from user profile.
+        """
         if not self.customer_id:
             customer = self.client.create_customer(
                 email=self.user.email,
@@ -298,12 +312,8 @@ class RecurringPayment(Payment):
                 }
             )
             self.save_customer_id(customer.id)
-        else:
-            customer = self.client.retrieve_customer(
-                customer_id=self.customer_id
-            )
 
-        return customer
+        return self.customer_id
 
     def save_subscription_id(self, subscription_id):
         self.user.profile.stripe_subscription_id = subscription_id
@@ -395,14 +405,19 @@ def upgrade_customer_from_charge(charge):
 
         return False
 
+    # computed here, not at import time: events are processed by a long
+    # running worker
     if charge.amount == MONTHLY_AMOUNT:
-        current_period_end = PLUS_ONE_MONTH
+        current_period_end = plus_days(count=31)
     elif charge.amount == ANNUAL_AMOUNT:
-        current_period_end = PLUS_ONE_YEAR
+        current_period_end = plus_days(count=366)
     else:
-        logger.error(
-            "Unrecognizable amount received"
+        _notify_error(
+            sender='charge',
+            email=email,
+            message=f"Unrecognizable amount {charge.amount} received"
         )
+        return False
 
     create_or_update_user_profile(user, current_period_end)
     _notify_success(
@@ -412,6 +427,25 @@ def upgrade_customer_from_charge(charge):
     )
 
 
+def invoice_period_end(invoice):
+    """
+    End of the subscription period paid by the invoice.
+
+    Invoice line of a subscription carries its period, so usually
+    there is no need to retrieve the subscription from Stripe API.
+    """
+    for line in invoice.get('lines', {}).get('data', []):
+        if line.get('type') == 'subscription' and line.get('period'):
+            return line['period']['end']
+
+    subscr = orig_stripe.Subscription.retrieve(
+        api_key=API_KEY,
+        id=invoice['subscription']
+    )
+
+    return subscr['current_period_end']
+
+
 def upgrade_customer_from_invoice(invoice):
     """
     invoice = is stripe.invoice object instance
@@ -437,15 +471,10 @@ def upgrade_customer_from_invoice(invoice):
         )
         return False
 
-    subscr = orig_stripe.Subscription.retrieve(
-        api_key=API_KEY,
-        id=invoice['subscription']
-    )
-
-    current_period_end = subscr['current_period_end']
+    current_period_end = invoice_period_end(invoice)
     logger.info(f"subscription_id={invoice['subscription']}")
     logger.info(f"invoice paid = {invoice['paid']}")
-    logger.info(f"pro_enddate= {subscr['current_period_end']}")
+    logger.info(f"pro_enddate= {current_period_end}")
 
     if invoice['paid']:
         create_or_update_user_profile(user, current_period_end)
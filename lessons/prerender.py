@@ -0,0 +1,247 @@
+"""
+Prerendered static pages (PageView routes: about, privacy, ...).
+
+build() renders every static page once, as an anonymous visitor sees it,
+and writes it (plain and gzip compressed) together with a manifest into
+DJANGO_LESSONS_PRERENDER_ROOT directory - shared by all gunicorn workers.
+Each worker keeps files in memory and reloads them when manifest changes.
+
+Pages depend only on templates and courses (navigation menu): run
+prerender_pages management command on deploy; courses changes rebuild
+pages automatically (see signals). Without the setting, or while pages
+are not built, PageView renders pages as usual.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages import get_messages
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from . import page_cache
+from .entitlements import Entitlement
+from .utils import default_host
+
+logger = logging.getLogger(__name__)
+
+DJANGO_LESSONS_PRERENDER_ROOT = 'DJANGO_LESSONS_PRERENDER_ROOT'
+MANIFEST = 'manifest.json'
+CONTENT_TYPE = 'text/html; charset=utf-8'
+
+# names of static pages (url name is also template name)
+STATIC_PAGES = [
+    'privacy',
+    'impressum',
+    'about',
+    'cookies',
+    'services',
+    'prices',
+    'mission',
+    'terms'
+]
+
+_lock = threading.Lock()
+# pages loaded by this process: manifest mtime and name => page
+_loaded = {'mtime': None, 'pages': {}}
+
+
+class PrerenderedPage:
+
+    def __init__(self, content, compressed, etag, built_at):
+        self.content = content
+        self.compressed = compressed
+        self.etag = etag
+        self.built_at = built_at
+
+
+def root():
+    return getattr(settings, DJANGO_LESSONS_PRERENDER_ROOT, None)
+
+
+def render(name):
+    """
+    Renders static page (as bytes) as an anonymous visitor sees it.
+    """
+    path = reverse(name)
+    request = RequestFactory().get(path, HTTP_HOST=default_host())
+    request.user = AnonymousUser()
+    request.entitlement = Entitlement()
+    request.resolver_match = resolve(path)
+    # tells PageView not to serve prerendered page
+    request.prerendering = True
+
+    response = request.resolver_match.func(request)
+    response.render()
+
+    return response.content
+
+
+def write(path, content):
+    # write + rename: other workers never read half written file
+    directory = os.path.dirname(path)
+    handle, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(handle, 'wb') as tmp_file:
+        tmp_file.write(content)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def build(names=None):
+    """
+    Renders static pages into DJANGO_LESSONS_PRERENDER_ROOT. Returns
+    manifest (name => etag and build time).
+    """
+    directory = root()
+    os.makedirs(directory, exist_ok=True)
+    built_at = int(time.time())
+    manifest = {}
+
+    if names:
+        # other pages stay as they are
+        try:
+            with open(os.path.join(directory, MANIFEST)) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    for name in names or STATIC_PAGES:
+        content = render(name)
+        write(os.path.join(directory, f"{name}.html"), content)
+        write(
+            os.path.join(directory, f"{name}.html.gz"),
+            gzip.compress(content, compresslevel=9, mtime=0)
+        )
+        manifest[name] = {
+            'etag': hashlib.sha1(content).hexdigest(),
+            'built_at': built_at,
+        }
+
+    write(
+        os.path.join(directory, MANIFEST),
+        json.dumps(manifest).encode('utf-8')
+    )
+    logger.info(f"Prerendered {', '.join(names or STATIC_PAGES)}")
+
+    return manifest
+
+
+def invalidate():
+    """
+    Pages are rendered as usual until next build.
+    """
+    try:
+        os.remove(os.path.join(root(), MANIFEST))
+    except FileNotFoundError:
+        pass
+
+
+def rebuild():
+    """
+    Rebuilds pages after content (courses) changed. Until the transaction
+    commits, pages are rendered as usual.
+    """
+    if not root():
+        return
+
+    invalidate()
+    transaction.on_commit(build)
+
+
+def load():
+    """
+    Returns pages (name => PrerenderedPage), reloaded if manifest changed.
+    """
+    path = os.path.join(root(), MANIFEST)
+
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    if _loaded['mtime'] == mtime:
+        return _loaded['pages']
+
+    with _lock:
+        try:
+            with open(path) as manifest_file:
+                manifest = json.load(manifest_file)
+            pages = {}
+            for name, info in manifest.items():
+                base = os.path.join(root(), f"{name}.html")
+                with open(base, 'rb') as page_file:
+                    content = page_file.read()
+                with open(f"{base}.gz", 'rb') as page_file:
+                    compressed = page_file.read()
+                pages[name] = PrerenderedPage(
+                    content,
+                    compressed,
+                    # weak: plain and compressed bodies differ
+                    f'W/"{info["etag"]}"',
+                    info['built_at']
+                )
+        except (FileNotFoundError, ValueError) as error:
+            # e.g. build in progress
+            logger.warning(f"Prerendered pages not loaded: {error}")
+            return {}
+
+        _loaded['mtime'] = mtime
+        _loaded['pages'] = pages
+
+    return pages
+
+
+def accepts_gzip(request):
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+
+def serve(request, name):
+    """
+    Prerendered page as response, or None if it cannot be served.
+    """
+    if not root() or getattr(request, 'prerendering', False):
+        return None
+
+    if request.user.is_authenticated or len(get_messages(request)):
+        return None
+
+    page = load().get(name)
+
+    if page is None:
+        return None
+
+    response = get_conditional_response(
+        request,
+        etag=page.etag,
+        last_modified=page.built_at
+    )
+
+    if response is None:
+        if accepts_gzip(request):
+            response = HttpResponse(
+                page.compressed,
+                content_type=CONTENT_TYPE
+            )
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(page.content, content_type=CONTENT_TYPE)
+        response['Content-Length'] = len(response.content)
+
+    response['ETag'] = page.etag
+    response['Last-Modified'] = http_date(page.built_at)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    # same headers as pages in full page cache
+    page_cache.set_headers(response, [page_cache.SITE], csrf=False)
+
+    return response
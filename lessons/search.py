@@ -0,0 +1,419 @@
+"""
+Full text search of lessons.
+
+Text of every published lesson (title, short description, content blocks
+and script) is kept in SearchDocument table, updated on publish/unpublish
+(see signals). Full text index over it depends on database backend:
+
+    * PostgreSQL: weighted tsvector column with GIN index, ranked by
+      ts_rank, snippets by ts_headline
+    * SQLite: FTS5 table (external content of SearchDocument table),
+      ranked by bm25, snippets by snippet()
+
+Title matches rank higher than description matches, description higher
+than content. PRO blocks, content of PRO lessons and the script are
+searched, but snippets are made from free content only (an anonymous
+visitor must not read PRO content in search results).
+
+Other backends have no index; views use wagtail search instead (see
+available()). rebuild() (search_index management command) indexes all
+lessons at once, e.g. after the migration which creates the index.
+"""
+import html
+import logging
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .caching import is_pro_block
+from .models import PRO, Lesson, SearchDocument
+
+logger = logging.getLogger(__name__)
+
+# text search configuration (language) of PostgreSQL index
+DJANGO_LESSONS_SEARCH_CONFIG = 'DJANGO_LESSONS_SEARCH_CONFIG'
+SEARCH_CONFIG = 'english'
+
+# search results are paginated; nobody reads further
+MAX_RESULTS = 500
+SNIPPET_WORDS = 24
+CHUNK_SIZE = 500
+
+# marks matched words in snippets (private use characters, they never
+# appear in lesson text)
+START = '\ue000'
+STOP = '\ue001'
+ELLIPSIS = '…'
+
+TAG = re.compile(r'<[^>]*>')
+TERM = re.compile(r'\w+')
+
+FTS_TABLE = 'lessons_searchdocument_fts'
+# columns of FTS_TABLE and their bm25 weights
+COLUMNS = ('title', 'description', 'body', 'private_body')
+WEIGHTS = (10.0, 4.0, 1.0, 1.0)
+
+
+def search_config():
+    return getattr(settings, DJANGO_LESSONS_SEARCH_CONFIG, SEARCH_CONFIG)
+
+
+def plain_text(value):
+    """
+    Text of a HTML fragment, with normalized white space.
+    """
+    # tags are replaced by spaces: "<p>one</p><p>two</p>" has two words
+    return " ".join(html.unescape(TAG.sub(' ', value or '')).split())
+
+
+def block_text(block):
+    value = block.value
+
+    if block.block_type in ('paragraph', 'pro_paragraph'):
+        return plain_text(value.source)
+
+    if block.block_type in ('code', 'pro_code'):
+        return value.get('code') or ''
+
+    if block.block_type == 'note':
+        return value.get('text') or ''
+
+    # images and embeds have no text
+    return ''
+
+
+def document_fields(lesson):
+    body = []
+    private_body = [plain_text(lesson.script)]
+    # whole content of a PRO lesson is for PRO users only
+    is_pro_lesson = lesson.lesson_type == PRO
+
+    for block in lesson.content:
+        if is_pro_lesson or is_pro_block(block):
+            private_body.append(block_text(block))
+        else:
+            body.append(block_text(block))
+
+    return {
+        'title': lesson.title,
+        'description': plain_text(lesson.short_description),
+        'body': "\n".join(text for text in body if text),
+        'private_body': "\n".join(text for text in private_body if text),
+    }
+
+
+def terms(query):
+    """
+    Words of user's query. Anything else (quotes, operators) is left out:
+    query is never passed to database's query parser as it is.
+    """
+    return TERM.findall(query or '')
+
+
+def placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def highlighted(snippet):
+    return mark_safe(
+        escape(snippet).replace(START, '<mark>').replace(STOP, '</mark>')
+    )
+
+
+class PostgresIndex:
+
+    # tsvector weights of SearchDocument columns
+    WEIGHTS = {
+        'title': 'A',
+        'description': 'B',
+        'body': 'C',
+        'private_body': 'C',
+    }
+
+    def index(self, lesson_ids):
+        vector = " || ".join(
+            f"setweight(to_tsvector(%s::regconfig, {column}), '{weight}')"
+            for column, weight in self.WEIGHTS.items()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {SearchDocument._meta.db_table}
+                SET vector = {vector}
+                WHERE lesson_id IN ({placeholders(lesson_ids)})
+                """,
+                [search_config()] * len(self.WEIGHTS) + list(lesson_ids)
+            )
+
+    def unindex(self, lesson_ids):
+        # index is a column of removed rows
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, words, lesson_type, limit):
+        filters = ""
+        params = [search_config(), " ".join(words)]
+
+        if lesson_type:
+            filters = "AND lesson.lesson_type = %s"
+            params.append(lesson_type)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT document.lesson_id
+                FROM {SearchDocument._meta.db_table} document
+                JOIN {Lesson._meta.db_table} lesson
+                    ON lesson.page_ptr_id = document.lesson_id,
+                    plainto_tsquery(%s::regconfig, %s) query
+                WHERE document.vector @@ query {filters}
+                ORDER BY ts_rank(document.vector, query) DESC,
+                    document.lesson_id DESC
+                LIMIT %s
+                """,
+                params + [limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def snippets(self, words, lesson_ids):
+        options = (
+            f'StartSel="{START}", StopSel="{STOP}", '
+            f'MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}, '
+            f'MaxFragments=2, FragmentDelimiter="{ELLIPSIS}"'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT document.lesson_id,
+                    ts_headline(
+                        %s::regconfig, document.body, query, %s
+                    ),
+                    ts_headline(
+                        %s::regconfig, document.description, query, %s
+                    )
+                FROM {SearchDocument._meta.db_table} document,
+                    plainto_tsquery(%s::regconfig, %s) query
+                WHERE document.lesson_id IN ({placeholders(lesson_ids)})
+                """,
+                [
+                    search_config(), options, search_config(), options,
+                    search_config(), " ".join(words)
+                ] + list(lesson_ids)
+            )
+            return cursor.fetchall()
+
+
+class SqliteIndex:
+
+    def execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def index(self, lesson_ids):
+        columns = ", ".join(COLUMNS)
+        self.execute(
+            f"""
+            INSERT INTO {FTS_TABLE} (rowid, {columns})
+            SELECT lesson_id, {columns}
+            FROM {SearchDocument._meta.db_table}
+            WHERE lesson_id IN ({placeholders(lesson_ids)})
+            """,
+            list(lesson_ids)
+        )
+
+    def unindex(self, lesson_ids):
+        # external content index: removed entry must be given with the
+        # very same text it was indexed with (still in SearchDocument)
+        columns = ", ".join(COLUMNS)
+        self.execute(
+            f"""
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {columns})
+            SELECT 'delete', lesson_id, {columns}
+            FROM {SearchDocument._meta.db_table}
+            WHERE lesson_id IN ({placeholders(lesson_ids)})
+            """,
+            list(lesson_ids)
+        )
+
+    def clear(self):
+        self.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('delete-all')"
+        )
+
+    def match(self, words):
+        # every word is quoted: it is a string, never an FTS5 operator
+        return " ".join(f'"{word}"' for word in words)
+
+    def search(self, words, lesson_type, limit):
+        join = filters = ""
+        params = [self.match(words)]
+
+        if lesson_type:
+            join = (
+                f"JOIN {Lesson._meta.db_table} lesson "
+                f"ON lesson.page_ptr_id = {FTS_TABLE}.rowid"
+            )
+            filters = "AND lesson.lesson_type = %s"
+            params.append(lesson_type)
+
+        weights = ", ".join(str(weight) for weight in WEIGHTS)
+        rows = self.execute(
+            f"""
+            SELECT {FTS_TABLE}.rowid
+            FROM {FTS_TABLE} {join}
+            WHERE {FTS_TABLE} MATCH %s {filters}
+            ORDER BY bm25({FTS_TABLE}, {weights}), {FTS_TABLE}.rowid DESC
+            LIMIT %s
+            """,
+            params + [limit]
+        )
+
+        return [row[0] for row in rows]
+
+    def snippets(self, words, lesson_ids):
+        body = COLUMNS.index('body')
+        description = COLUMNS.index('description')
+        snippet = f"'{START}', '{STOP}', '{ELLIPSIS}', {SNIPPET_WORDS}"
+
+        return self.execute(
+            f"""
+            SELECT rowid,
+                snippet({FTS_TABLE}, {body}, {snippet}),
+                snippet({FTS_TABLE}, {description}, {snippet})
+            FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH %s
+                AND rowid IN ({placeholders(lesson_ids)})
+            """,
+            [self.match(words)] + list(lesson_ids)
+        )
+
+
+INDEXES = {
+    'postgresql': PostgresIndex,
+    'sqlite': SqliteIndex,
+}
+
+
+def available():
+    return connection.vendor in INDEXES
+
+
+def backend():
+    return INDEXES[connection.vendor]()
+
+
+def remove(lesson_id):
+    """
+    Removes lesson from the index (unpublished or deleted lesson).
+    """
+    if not available():
+        return
+
+    backend().unindex([lesson_id])
+    SearchDocument.objects.filter(lesson_id=lesson_id).delete()
+
+
+def update(lesson):
+    """
+    Indexes (new text of) published lesson.
+    """
+    if not available():
+        return
+
+    if not lesson.live:
+        remove(lesson.id)
+        return
+
+    backend().unindex([lesson.id])
+    SearchDocument.objects.update_or_create(
+        lesson_id=lesson.id,
+        defaults=document_fields(lesson)
+    )
+    backend().index([lesson.id])
+
+
+def rebuild():
+    """
+    Indexes all published lessons from scratch. Returns number of indexed
+    lessons.
+    """
+    if not available():
+        return 0
+
+    index = backend()
+    index.clear()
+    SearchDocument.objects.all().delete()
+
+    lesson_ids = list(
+        Lesson.objects.live().order_by('id').values_list('id', flat=True)
+    )
+    for start in range(0, len(lesson_ids), CHUNK_SIZE):
+        chunk = lesson_ids[start:start + CHUNK_SIZE]
+        SearchDocument.objects.bulk_create([
+            SearchDocument(lesson_id=lesson.id, **document_fields(lesson))
+            for lesson in Lesson.objects.filter(id__in=chunk)
+        ])
+        index.index(chunk)
+
+    logger.info(f"Indexed {len(lesson_ids)} lessons")
+
+    return len(lesson_ids)
+
+
+def search(query, lesson_type=None, limit=MAX_RESULTS):
+    """
+    Returns ids of published lessons matching all words of query, best
+    matches first.
+    """
+    words = terms(query)
+
+    if not words:
+        return []
+
+    return backend().search(words, lesson_type, limit)
+
+
+def snippets(query, lesson_ids):
+    """
+    Returns lesson id => snippet (safe HTML, matched words in <mark>) of
+    given lessons: a matching part of free content, or of description.
+    """
+    words = terms(query)
+
+    if not words or not lesson_ids:
+        return {}
+
+    ret = {}
+    for lesson_id, body, description in backend().snippets(
+        words, lesson_ids
+    ):
+        if START in (body or '') or not description:
+            ret[lesson_id] = highlighted(body or '')
+        else:
+            ret[lesson_id] = highlighted(description)
+
+    return ret
+
+
+def results(query, lesson_ids):
+    """
+    Lessons (as for listing) in order of lesson_ids, with search_snippet
+    attribute.
+    """
+    lessons = Lesson.objects.for_listing().in_bulk(lesson_ids)
+    lesson_snippets = snippets(query, list(lessons))
+
+    ret = []
+    for lesson_id in lesson_ids:
+        if lesson_id in lessons:
+            lesson = lessons[lesson_id]
+            lesson.search_snippet = lesson_snippets.get(lesson_id)
+            ret.append(lesson)
+
+    return ret
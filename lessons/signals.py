@@ -2,13 +2,22 @@ import logging
 
 from allauth.account import signals as allauth_signals
 from allauth.socialaccount import signals as allauth_social_signals
-from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import Signal, receiver
-
-from .models import Contact, Subscription, UserProfile
+from taggit.models import Tag
+from wagtail.core.models import Page
+from wagtail.core.signals import page_published, page_unpublished
+
+from . import feed, page_cache, prerender, search
+from .caching import (invalidate_course_nav, invalidate_lesson_body,
+                      invalidate_lesson_card, invalidate_tag_cloud,
+                      lesson_neighbor_ids, rebuild_lesson_sequence,
+                      warm_lesson_body)
+from .entitlements import invalidate_entitlement
+from .models import (Contact, Counter, Course, Lesson, LessonGroup,
+                     Subscription, UserProfile)
+from .notifications import notify, notify_event
 from .payments.plans import ANNUAL_AMOUNT, MONTHLY_AMOUNT
 
 checkout_open = Signal()
@@ -21,22 +30,6 @@ new_contact_message = Signal()
 
 logger = logging.getLogger(__name__)
 
-DJANGO_LESSONS_NOTIFY_EMAIL = 'DJANGO_LESSONS_NOTIFY_EMAIL'
-
-
-def notify(title, text):
-
-    if not hasattr(settings, DJANGO_LESSONS_NOTIFY_EMAIL):
-        logger.error(f"{DJANGO_LESSONS_NOTIFY_EMAIL} not defined")
-    else:
-        send_mail(
-            title,
-            text,
-            settings.DJANGO_LESSONS_NOTIFY_EMAIL,
-            [settings.DJANGO_LESSONS_NOTIFY_EMAIL],
-            fail_silently=True,
-        )
-
 
 @receiver(post_save, sender=User)
 def update_user_profile(sender, instance, created, **kwargs):
@@ -47,6 +40,117 @@ def update_user_profile(sender, instance, created, **kwargs):
         )
 
 
+TOTALS = {
+    User: Counter.USERS,
+    Subscription: Counter.SUBSCRIPTIONS,
+    Contact: Counter.CONTACTS,
+}
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Contact)
+def total_added_handler(sender, instance, created, **kwargs):
+    if created:
+        Counter.incr(TOTALS[sender])
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Contact)
+def total_deleted_handler(sender, instance, **kwargs):
+    Counter.incr(TOTALS[sender], -1)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def user_profile_changed_handler(sender, instance, **kwargs):
+    # e.g. pro_enddate or discount_enddate changed
+    invalidate_entitlement(instance.user_id)
+
+
+@receiver(page_published, sender=Lesson)
+def lesson_published_handler(sender, instance, **kwargs):
+    invalidate_lesson_body(instance)
+    warm_lesson_body(instance)
+    invalidate_lesson_card(instance)
+    rebuild_lesson_sequence()
+    # tags of the lesson might have changed
+    invalidate_tag_cloud()
+    # pages of old neighbors carry key of this lesson, pages of new
+    # neighbors (if lesson moved or is new) are purged by their own keys
+    page_cache.purge(
+        page_cache.LESSON_LIST,
+        page_cache.lesson_key(instance.id),
+        *[
+            page_cache.lesson_key(lesson_id)
+            for lesson_id in lesson_neighbor_ids(instance) if lesson_id
+        ]
+    )
+    feed.rebuild(instance)
+    search.update(instance)
+
+
+@receiver(page_unpublished, sender=Lesson)
+def lesson_unpublished_handler(sender, instance, **kwargs):
+    invalidate_lesson_body(instance)
+    invalidate_lesson_card(instance)
+    rebuild_lesson_sequence()
+    invalidate_tag_cloud()
+    page_cache.purge(
+        page_cache.LESSON_LIST,
+        page_cache.lesson_key(instance.id)
+    )
+    feed.rebuild(instance)
+    search.remove(instance.id)
+
+
+@receiver(pre_delete, sender=Lesson)
+def lesson_deleting_handler(sender, instance, **kwargs):
+    # before the search document is deleted (cascade): SQLite index needs
+    # its text to remove the lesson
+    search.remove(instance.id)
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_deleted_handler(sender, instance, **kwargs):
+    invalidate_lesson_card(instance)
+    rebuild_lesson_sequence()
+    invalidate_tag_cloud()
+    page_cache.purge(
+        page_cache.LESSON_LIST,
+        page_cache.lesson_key(instance.id)
+    )
+    feed.rebuild(instance)
+
+
+# publish and unpublish of a course save it; Page.move saves a plain
+# Page instance (of course itself or of one of its ancestors)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Page)
+def course_changed_handler(sender, instance, **kwargs):
+    invalidate_course_nav()
+    # courses are in navigation menu of every page
+    page_cache.purge_all()
+    prerender.rebuild()
+
+
+@receiver(post_save, sender=LessonGroup)
+@receiver(post_delete, sender=LessonGroup)
+def lesson_group_changed_handler(sender, instance, **kwargs):
+    # course page and lessons displayed within the course
+    page_cache.purge(page_cache.course_key(instance.course_id))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed_handler(sender, instance, **kwargs):
+    # tags are listed next to lesson listings
+    invalidate_tag_cloud()
+    page_cache.purge(page_cache.LESSON_LIST)
+
+
 @receiver(checkout_open)
 def checkout_open_handler(sender, **kwargs):
     """
@@ -196,7 +300,7 @@ def new_subscriber_handler(sender, **kwargs):
     title = "New Subscriber"
     email = kwargs.get('email', False)
     text = f" sender={sender},"
-    count = Subscription.objects.count()
+    count = Counter.get_value(Counter.SUBSCRIPTIONS)
 
     if email:
         text += f" email={email}"
@@ -205,7 +309,7 @@ def new_subscriber_handler(sender, **kwargs):
 
     text += f" Total subscriptions count={count}"
 
-    notify(
+    notify_event(
         title=title,
         text=text
     )
@@ -217,7 +321,7 @@ def new_contact_message_handler(sender, **kwargs):
     email = kwargs.get('email', False)
     subject = kwargs.get('subject', False)
     text = f" sender={sender},"
-    count = Contact.objects.count()
+    count = Counter.get_value(Counter.CONTACTS)
 
     if email:
         text += f" email={email},"
@@ -242,10 +346,10 @@ def user_signed_up_handler(sender, **kwargs):
 
     email = kwargs.get('email', False)
     text = f" email={email}, "
-    count = User.objects.count()
+    count = Counter.get_value(Counter.USERS)
     text += f" Total User count={count}"
 
-    notify(
+    notify_event(
         title="New Sign Up",
         text=text
     )
@@ -279,10 +383,10 @@ def password_changed_handler(sender, **kwargs):
 def pre_social_login_handler(sender, **kwargs):
 
     text = " "
-    count = User.objects.count()
+    count = Counter.get_value(Counter.USERS)
     text += f" Total User count={count}"
 
-    notify(
+    notify_event(
         title="New Social account activity",
         text=text
     )
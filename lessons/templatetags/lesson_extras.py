@@ -1,9 +1,20 @@
+import logging
+
 from django import template
+from django.core.cache import cache
 from django.utils.http import urlencode
+from easy_thumbnails.files import get_thumbnailer
+from wagtail.core.templatetags.wagtailcore_tags import slugurl
+
+from lessons.highlight import cached_highlight_code
 
+logger = logging.getLogger(__name__)
 
 register = template.Library()
 
+TAGS_INDEX_SLUG = 'tags'
+THUMBNAIL_URL_KEY = 'lessons:thumbnail_url:{name}:{size}'
+
 
 @register.inclusion_tag("lessons/includes/userline.html")
 def django_lessons_userline(user):
@@ -106,3 +117,62 @@ def note_css_class(note_type):
     }
 
     return css_class_map.get(note_type, 'info')
+
+
+@register.simple_tag
+def highlight_code(code, lang):
+    """
+    CodeBlock snippet as html highlighted on server side.
+    """
+    return cached_highlight_code(code, lang)
+
+
+@register.simple_tag(takes_context=True)
+def tags_url(context):
+    """
+    Same as {% slugurl 'tags' %}, but the page lookup is done only once per
+    request. Lesson cards need this url for every tag of every lesson.
+    """
+    request = context.get('request')
+
+    if request is None:
+        return slugurl(context, TAGS_INDEX_SLUG)
+
+    if not hasattr(request, '_lessons_tags_url'):
+        request._lessons_tags_url = slugurl(context, TAGS_INDEX_SLUG)
+
+    return request._lessons_tags_url
+
+
+@register.simple_tag
+def thumbnail_url(source, size):
+    """
+    Url of cropped thumbnail of given size (e.g. '280x160') for an image field.
+
+    Equivalent of {% thumbnail source size crop %}, except that url is
+    cached, so that easy-thumbnails does not look up source and thumbnail
+    records (plus storage) on each rendered lesson card.
+    """
+    if not source:
+        return ''
+
+    key = THUMBNAIL_URL_KEY.format(name=source.name, size=size)
+    url = cache.get(key)
+
+    if url is not None:
+        return url
+
+    width, height = size.split('x')
+    try:
+        url = get_thumbnailer(source).get_thumbnail({
+            'size': (int(width), int(height)),
+            'crop': True
+        }).url
+    except Exception:
+        logger.warning(f"Failed to generate thumbnail for {source.name}")
+        # same as easy-thumbnails's {% thumbnail %} tag on failure
+        return ''
+
+    cache.set(key, url, None)
+
+    return url
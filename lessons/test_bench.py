@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from . import bench
+from .models import Course, Lesson
+
+
+class SiteBenchTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        bench.seed(lessons=6, courses=2, tags=4)
+
+    def test_seed_is_idempotent(self):
+        self.assertEquals(bench.seed(lessons=6, courses=2, tags=4), 0)
+        self.assertEquals(
+            Lesson.objects.filter(slug__startswith=bench.SLUG_PREFIX).count(),
+            6
+        )
+        self.assertEquals(
+            Course.objects.filter(slug__startswith=bench.SLUG_PREFIX).count(),
+            2
+        )
+
+    def test_all_scenarios_respond(self):
+        scenarios = bench.scenarios()
+
+        self.assertEquals(
+            set(scenarios),
+            {
+                'index', 'index_search', 'index_ltype', 'typeahead',
+                'lesson', 'lesson_course_view', 'course', 'tag_index',
+                'feed', 'static'
+            }
+        )
+        for name, urls in scenarios.items():
+            result = bench.run(urls, len(urls))
+            self.assertEquals(result['requests'], len(urls), name)
+            self.assertEquals(result['errors'], 0, name)
+            self.assertGreater(
+                result['queries_per_request']['max'], 0, name
+            )
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEquals(bench.percentile(values, 50), 50)
+        self.assertEquals(bench.percentile(values, 99), 99)
+        self.assertEquals(bench.percentile([7], 95), 7)
+        self.assertIsNone(bench.percentile([], 50))
+
+    def test_failing_requests_are_counted(self):
+        def get(client, url):
+            if url == "/broken/":
+                raise ValueError("template error")
+            return 200, 1
+
+        with mock.patch.object(bench.InProcessClient, 'get', get):
+            result = bench.run(["/", "/broken/"], 10, concurrency=2)
+
+        self.assertEquals(result['requests'], 10)
+        self.assertEquals(result['errors'], 5)
+        self.assertEquals(result['statuses'], {'200': 5, 'error': 5})
@@ -0,0 +1,244 @@
+import json
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from taggit.models import Tag
+from wagtail.core.models import Page
+
+from . import caching
+from .context_processors import courses
+from .models import FREE, PRO, Course, Lesson
+from .test_views import create_live_lesson
+
+
+def create_lesson_with_content(parent, content):
+    lesson = Lesson(
+        title="Hello world",
+        slug='hello-world',
+        content=json.dumps(content),
+        short_description="This is about hello and it is about world."
+    )
+    parent.add_child(instance=lesson)
+    lesson.save_revision().publish()
+
+    return Lesson.objects.get(id=lesson.id)
+
+
+class LessonBodyCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.homepage = Page.objects.get(url_path='/home/')
+        self.lesson = create_lesson_with_content(
+            self.homepage,
+            [
+                {'type': 'paragraph', 'value': '<p>free part</p>'},
+                {'type': 'pro_paragraph', 'value': '<p>pro part</p>'},
+            ]
+        )
+
+    def test_variants(self):
+        free_body = caching.lesson_body(self.lesson, FREE)
+        pro_body = caching.lesson_body(self.lesson, PRO)
+
+        self.assertIn("free part", free_body)
+        self.assertNotIn("pro part", free_body)
+        self.assertIn("free part", pro_body)
+        self.assertIn("pro part", pro_body)
+
+    def test_hits_and_misses(self):
+        # drop what was cached on publish
+        cache.clear()
+        caching.lesson_body(self.lesson, FREE)
+        caching.lesson_body(self.lesson, FREE)
+        caching.lesson_body(self.lesson, PRO)
+
+        self.assertEquals(
+            caching.stats()[caching.LESSON_BODY],
+            {caching.HIT: 1, caching.MISS: 2}
+        )
+
+    def test_publish_invalidates_body(self):
+        first_revision = self.lesson.get_latest_revision()
+        self.assertIn(
+            "free part", caching.lesson_body(self.lesson, FREE)
+        )
+
+        self.lesson.content = json.dumps([
+            {'type': 'paragraph', 'value': '<p>updated part</p>'},
+        ])
+        self.lesson.save_revision().publish()
+        lesson = Lesson.objects.get(id=self.lesson.id)
+        self.assertIn(
+            "updated part", caching.lesson_body(lesson, FREE)
+        )
+
+        # roll back to first revision
+        first_revision.publish()
+        lesson = Lesson.objects.get(id=self.lesson.id)
+        self.assertIn(
+            "free part", caching.lesson_body(lesson, FREE)
+        )
+
+
+class CodeHighlightTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.homepage = Page.objects.get(url_path='/home/')
+
+    def test_code_block_is_highlighted(self):
+        lesson = create_lesson_with_content(
+            self.homepage,
+            [{
+                'type': 'code',
+                'value': {'code': 'import os', 'lang': 'python'}
+            }]
+        )
+        body = caching.lesson_body(lesson, FREE)
+
+        self.assertIn('<pre class="highlight">', body)
+        # 'import' keyword is highlighted as namespace keyword
+        self.assertIn('<span class="kn">import</span>', body)
+
+    def test_code_is_highlighted_on_publish(self):
+        lesson = create_lesson_with_content(
+            self.homepage,
+            [{
+                'type': 'pro_code',
+                'value': {'code': 'ls -la', 'lang': 'bash'}
+            }]
+        )
+        caching.reset_stats()
+
+        caching.lesson_body(lesson, FREE)
+        caching.lesson_body(lesson, PRO)
+
+        stats = caching.stats()
+        self.assertEquals(
+            stats[caching.LESSON_BODY],
+            {caching.HIT: 2, caching.MISS: 0}
+        )
+        self.assertEquals(
+            stats[caching.HIGHLIGHT],
+            {caching.HIT: 0, caching.MISS: 0}
+        )
+
+
+class CourseNavTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.homepage = Page.objects.get(url_path='/home/')
+        self.course = Course(
+            title="Deployment",
+            slug="deployment",
+            short_description="Deployment from zero to hero"
+        )
+        self.homepage.add_child(instance=self.course)
+        self.course.save_revision().publish()
+
+    def test_courses_without_queries(self):
+        courses(None)
+
+        with self.assertNumQueries(0):
+            nav = courses(None)['courses']
+
+        self.assertEquals(
+            nav,
+            [{
+                'id': self.course.id,
+                'title': "Deployment",
+                'slug': "deployment",
+                'url': self.course.get_url(),
+            }]
+        )
+
+    def test_unpublish_and_publish(self):
+        courses(None)
+        self.course.unpublish()
+        self.assertEquals(courses(None)['courses'], [])
+
+        self.course.save_revision().publish()
+        self.assertEquals(len(courses(None)['courses']), 1)
+
+    def test_move(self):
+        courses(None)
+        parent = Page(title="Courses", slug="courses")
+        self.homepage.add_child(instance=parent)
+        self.course.move(parent, pos='last-child')
+
+        self.assertIn(
+            '/courses/deployment/', courses(None)['courses'][0]['url']
+        )
+
+
+class TagCloudTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.homepage = Page.objects.get(url_path='/home/')
+        # tags: django, tag-1 and django, tag-2
+        self.first = create_live_lesson(self.homepage, 1, order=1)
+        self.second = create_live_lesson(self.homepage, 2, order=2)
+        # not used by any lesson
+        Tag.objects.create(name="unused", slug="unused")
+
+    def test_counts_without_queries(self):
+        with self.assertNumQueries(1):
+            caching.tag_cloud()
+
+        with self.assertNumQueries(0):
+            cloud = caching.tag_cloud()
+
+        self.assertEquals(
+            cloud,
+            [
+                {'name': "django", 'slug': "django", 'count': 2},
+                {'name': "tag-1", 'slug': "tag-1", 'count': 1},
+                {'name': "tag-2", 'slug': "tag-2", 'count': 1},
+            ]
+        )
+
+    def test_popular_tags(self):
+        self.assertEquals(
+            [tag['name'] for tag in caching.popular_tags()],
+            ["django", "tag-1", "tag-2"]
+        )
+
+    def test_unpublish_and_publish(self):
+        caching.tag_cloud()
+        self.second.unpublish()
+
+        self.assertEquals(
+            [tag['name'] for tag in caching.tag_cloud()],
+            ["django", "tag-1"]
+        )
+
+        self.second.tags.add("python")
+        self.second.save_revision().publish()
+
+        self.assertIn(
+            {'name': "python", 'slug': "python", 'count': 1},
+            caching.tag_cloud()
+        )
+
+    def test_tag_renamed(self):
+        caching.tag_cloud()
+        tag = Tag.objects.get(name="tag-1")
+        tag.name = "wagtail"
+        tag.save()
+
+        self.assertIn("wagtail", [tag['name'] for tag in caching.tag_cloud()])
+
+    def test_views(self):
+        client = Client()
+
+        ret = client.get(reverse('index'))
+        self.assertEquals(ret.context['tags'], caching.tag_cloud())
+        self.assertNotContains(ret, "unused")
+
+        ret = client.get(reverse('popular_tags'))
+        self.assertEquals(ret.status_code, 200)
+        self.assertContains(ret, "2 lessons")
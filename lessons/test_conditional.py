@@ -0,0 +1,131 @@
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from wagtail.core.models import Page
+
+from . import page_cache
+from .models import PRO, Course, UserProfile
+from .test_views import (JOHN, MARRY, PASS, create_live_lesson,
+                         create_pro_user, create_user)
+
+
+class ConditionalGetTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.homepage = Page.objects.get(url_path='/home/')
+        self.lesson = create_live_lesson(self.homepage, 1, order=1)
+        self.url = self.lesson.get_absolute_url()
+
+    def revalidate(self, url, ret, **headers):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=ret['ETag'], **headers)
+
+    def test_lesson_not_modified(self):
+        ret = self.client.get(self.url)
+        self.assertEquals(ret.status_code, 200)
+        self.assertIn('Last-Modified', ret)
+
+        # site lookup and lesson's publication time; nothing is rendered
+        with self.assertNumQueries(2):
+            not_modified = self.revalidate(self.url, ret)
+        self.assertEquals(not_modified.status_code, 304)
+        self.assertEquals(not_modified.content, b'')
+
+        not_modified = self.client.get(
+            self.url,
+            HTTP_IF_MODIFIED_SINCE=ret['Last-Modified']
+        )
+        self.assertEquals(not_modified.status_code, 304)
+
+    def test_publish_changes_validators(self):
+        ret = self.client.get(self.url)
+
+        self.lesson.title = "Updated"
+        self.lesson.save_revision().publish()
+
+        self.assertEquals(self.revalidate(self.url, ret).status_code, 200)
+
+    def test_neighbor_publish_changes_validators(self):
+        ret = self.client.get(self.url)
+
+        create_live_lesson(self.homepage, 2, order=2)
+
+        self.assertEquals(self.revalidate(self.url, ret).status_code, 200)
+
+    def test_pro_and_non_pro_variants(self):
+        create_user(username=JOHN, password=PASS)
+        marry = create_pro_user(username=MARRY, password=PASS)
+        pro_lesson = create_live_lesson(
+            self.homepage, 2, order=2, lesson_type=PRO
+        )
+        url = pro_lesson.get_absolute_url()
+
+        self.client.login(username=MARRY, password=PASS)
+        ret = self.client.get(url)
+        self.assertEquals(ret.status_code, 200)
+        # variants differ, only ETag is correct for all of them
+        self.assertNotIn('Last-Modified', ret)
+        self.assertEquals(self.revalidate(url, ret).status_code, 304)
+
+        # PRO access ended
+        profile = UserProfile.objects.get(user=marry)
+        profile.pro_enddate = date.today() - timedelta(days=1)
+        profile.save()
+        self.assertEquals(self.revalidate(url, ret).status_code, 302)
+
+        self.client.login(username=JOHN, password=PASS)
+        self.assertEquals(self.revalidate(url, ret).status_code, 302)
+
+    def test_feed(self):
+        ret = self.client.get(reverse('feed'))
+
+        # only wagtail's site lookup
+        with self.assertNumQueries(1):
+            not_modified = self.revalidate(reverse('feed'), ret)
+        self.assertEquals(not_modified.status_code, 304)
+
+        self.lesson.unpublish()
+
+        self.assertEquals(
+            self.revalidate(reverse('feed'), ret).status_code,
+            200
+        )
+
+    def test_course(self):
+        course = Course(
+            title="Course 1",
+            slug="course-1",
+            short_description="Course"
+        )
+        self.homepage.add_child(instance=course)
+        course.save_revision().publish()
+
+        ret = self.client.get(course.url)
+        self.assertEquals(ret.status_code, 200)
+        self.assertEquals(self.revalidate(course.url, ret).status_code, 304)
+
+        course.title = "Updated course"
+        course.save_revision().publish()
+
+        self.assertEquals(self.revalidate(course.url, ret).status_code, 200)
+
+    def test_lost_content_change_time(self):
+        ret = self.client.get(self.url)
+
+        cache.delete(page_cache.CHANGED_AT_KEY)
+
+        self.assertEquals(self.revalidate(self.url, ret).status_code, 200)
+
+    @override_settings(DJANGO_LESSONS_PAGE_CACHE_SECONDS=600)
+    def test_page_cache_hit_not_modified(self):
+        ret = self.client.get(self.url)
+        ret = self.client.get(self.url)
+        self.assertEquals(ret['X-Page-Cache'], page_cache.HIT)
+
+        not_modified = self.revalidate(self.url, ret)
+
+        self.assertEquals(not_modified.status_code, 304)
+        self.assertEquals(not_modified['ETag'], ret['ETag'])
@@ -0,0 +1,118 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from wagtail.core.models import Page
+
+from . import feed
+from .models import Course, LessonGroup
+from .test_views import create_live_lesson
+
+
+class FeedTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.homepage = Page.objects.get(url_path='/home/')
+        self.first = create_live_lesson(self.homepage, 1, order=1)
+        self.second = create_live_lesson(self.homepage, 2, order=2)
+
+    def create_course(self, lessons):
+        course = Course(
+            title="Course 1",
+            slug="course-1",
+            short_description="Course"
+        )
+        self.homepage.add_child(instance=course)
+        course.save_revision().publish()
+        for order, lesson in enumerate(lessons, start=1):
+            LessonGroup.objects.create(
+                title=f"Part {order}",
+                short_description="Part",
+                order=order,
+                lesson=lesson,
+                course=course
+            )
+
+        return course
+
+    def test_poll_reads_cache(self):
+        ret = self.client.get(reverse('feed'))
+        self.assertEquals(ret.status_code, 200)
+        self.assertIn(b"Lesson 1", ret.content)
+        self.assertIn(b"Lesson 2", ret.content)
+
+        # only wagtail's site lookup
+        with self.assertNumQueries(1):
+            again = self.client.get(reverse('feed'))
+        self.assertEquals(again.content, ret.content)
+        self.assertEquals(again['ETag'], ret['ETag'])
+
+        not_modified = self.client.get(
+            reverse('feed'),
+            HTTP_IF_NONE_MATCH=ret['ETag']
+        )
+        self.assertEquals(not_modified.status_code, 304)
+
+    def test_atom(self):
+        ret = self.client.get(reverse('feed_atom'))
+
+        self.assertEquals(ret.status_code, 200)
+        self.assertTrue(ret['Content-Type'].startswith('application/atom+xml'))
+
+    def test_tag_feed(self):
+        ret = self.client.get(
+            reverse('tag_feed', kwargs={'slug': 'tag-2'})
+        )
+
+        self.assertEquals(ret.status_code, 200)
+        self.assertIn(b"Lesson 2", ret.content)
+        self.assertNotIn(b"Lesson 1", ret.content)
+
+    def test_course_feed(self):
+        self.create_course([self.first])
+
+        ret = self.client.get(
+            reverse('course_feed_atom', kwargs={'slug': 'course-1'})
+        )
+
+        self.assertEquals(ret.status_code, 200)
+        self.assertIn(b"Lesson 1", ret.content)
+        self.assertNotIn(b"Lesson 2", ret.content)
+
+    def test_unknown_slug(self):
+        url = reverse('tag_feed', kwargs={'slug': 'unknown'})
+
+        self.assertEquals(self.client.get(url).status_code, 404)
+        # answer is cached too (404 page itself still queries courses)
+        with self.assertNumQueries(0):
+            self.assertEquals(
+                feed.document(feed.TAG, 'unknown'),
+                feed.MISSING
+            )
+
+    def test_publish_changes_feed(self):
+        ret = self.client.get(reverse('feed'))
+
+        self.second.unpublish()
+
+        changed = self.client.get(reverse('feed'))
+        self.assertNotEqual(changed['ETag'], ret['ETag'])
+        self.assertNotIn(b"Lesson 2", changed.content)
+
+        create_live_lesson(self.homepage, 3, order=3)
+
+        self.assertIn(b"Lesson 3", self.client.get(reverse('feed')).content)
+
+    def test_warm(self):
+        self.create_course([self.first])
+
+        feed.warm(self.first.id)
+
+        for url in (
+            reverse('feed_atom'),
+            reverse('tag_feed', kwargs={'slug': 'tag-1'}),
+            reverse('course_feed', kwargs={'slug': 'course-1'}),
+        ):
+            with self.assertNumQueries(1):
+                self.assertEquals(self.client.get(url).status_code, 200)
@@ -0,0 +1,96 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from wagtail.core.models import Page
+
+from . import metrics
+from .test_views import create_live_lesson
+
+TOKEN = 'secret'
+
+
+@override_settings(DJANGO_LESSONS_METRICS_TOKEN=TOKEN)
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.client = Client()
+        homepage = Page.objects.get(url_path='/home/')
+        self.lesson = create_live_lesson(homepage, 1)
+
+    def scrape(self):
+        ret = self.client.get(
+            reverse('metrics'),
+            HTTP_AUTHORIZATION=f"Bearer {TOKEN}"
+        )
+        self.assertEquals(ret.status_code, 200)
+
+        return ret.content.decode('utf-8')
+
+    def test_token_required(self):
+        ret = self.client.get(reverse('metrics'))
+        self.assertEquals(ret.status_code, 403)
+
+        ret = self.client.get(
+            reverse('metrics'),
+            HTTP_AUTHORIZATION="Bearer wrong"
+        )
+        self.assertEquals(ret.status_code, 403)
+
+    def test_per_view_numbers(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        self.client.get(self.lesson.get_absolute_url())
+        metrics.flush()
+
+        counters = metrics.counters()
+        self.assertEquals(counters['index'][metrics.REQUESTS], 2)
+        self.assertEquals(counters['index']['status_2xx'], 2)
+        self.assertGreater(counters['index'][metrics.QUERIES], 0)
+        self.assertGreater(counters['index'][metrics.TEMPLATE_DURATION], 0)
+        self.assertEquals(counters['lesson'][metrics.REQUESTS], 1)
+        # lesson body and course navigation
+        self.assertGreater(
+            counters['lesson'][metrics.CACHE_HITS] +
+            counters['lesson'][metrics.CACHE_MISSES],
+            0
+        )
+
+    def test_exposition(self):
+        self.client.get(reverse('index'))
+        self.client.get('/no-such-page-at-all')
+
+        text = self.scrape()
+
+        self.assertIn(
+            '# TYPE django_lessons_request_duration_seconds histogram',
+            text
+        )
+        self.assertIn(
+            'django_lessons_request_duration_seconds_bucket'
+            '{view="index",le="+Inf"} 1',
+            text
+        )
+        self.assertIn(
+            'django_lessons_request_duration_seconds_count{view="index"} 1',
+            text
+        )
+        self.assertIn(
+            'django_lessons_responses_total{view="unresolved",status="4xx"} 1',
+            text
+        )
+        self.assertIn('django_lessons_db_queries_total{view="index"}', text)
+        self.assertIn(
+            'django_lessons_named_cache_hits_total{cache="lesson_body"}',
+            text
+        )
+
+    def test_counters_add_up_between_flushes(self):
+        self.client.get(reverse('index'))
+        metrics.flush()
+        # another worker would add to the same counters
+        self.client.get(reverse('index'))
+        metrics.flush()
+
+        self.assertEquals(metrics.counters()['index'][metrics.REQUESTS], 2)
@@ -0,0 +1,153 @@
+import threading
+import time
+
+import stripe
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .payments import stripe as my_stripe
+from .payments.clients import stripe as stripe_clients
+from .payments.clients.paypal import Api
+from .payments.mock_server import Latency, MockServer
+from .utils import create_user
+
+SIGNING_KEY = 'whsec_mock'
+
+
+class MockServerTestCase(TestCase):
+
+    server_options = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = MockServer(('127.0.0.1', 0), **cls.server_options)
+        cls.thread = threading.Thread(
+            target=cls.server.serve_forever,
+            daemon=True
+        )
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        # RealClient configures stripe module globals
+        for name in ('api_base', 'default_http_client', 'max_network_retries'):
+            self.addCleanup(setattr, stripe, name, getattr(stripe, name))
+
+    def stripe_client(self):
+        with override_settings(STRIPE_API_BASE=self.server.url):
+            return stripe_clients.RealClient(api_key='sk_test_mock')
+
+
+class MockServerTest(MockServerTestCase):
+
+    server_options = {
+        'webhook_delay': Latency('fixed:0'),
+        'stripe_signing_key': SIGNING_KEY,
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user(username="john", password="test")
+        self.user.email = 'john@mail.com'
+        self.user.save()
+        self.server.webhook_url = f"{self.server.url}/__mock__/webhooks"
+
+    def wait_for_webhooks(self, count):
+        for attempt in range(100):
+            if len(self.server.received_webhooks) >= count:
+                break
+            time.sleep(0.01)
+
+        return self.server.received_webhooks[-count:]
+
+    def test_one_time_payment(self):
+        payment = my_stripe.OneTimePayment(
+            client=self.stripe_client(),
+            user=self.user,
+            payment_method_id='pm_card_visa',
+            lesson_plan_id='m'
+        )
+        payment_intent = payment.pay()
+
+        self.assertEquals(payment.status, my_stripe.PaymentStatus.SUCCESS)
+        self.assertTrue(payment_intent.client_secret)
+
+        payload, signature = self.wait_for_webhooks(1)[0]
+        event = stripe.Webhook.construct_event(
+            payload,
+            signature,
+            SIGNING_KEY
+        )
+        self.assertEquals(event.type, 'charge.succeeded')
+        self.assertEquals(event.data.object.receipt_email, self.user.email)
+
+    def test_recurring_payment(self):
+        payment = my_stripe.RecurringPayment(
+            client=self.stripe_client(),
+            user=self.user,
+            stripe_plan_id='plan_m',
+            payment_method_id='pm_card_visa'
+        )
+        latest_invoice = payment.create_subscription()
+
+        self.assertEquals(payment.status, my_stripe.PaymentStatus.SUCCESS)
+        self.assertTrue(latest_invoice.paid)
+        self.user.profile.refresh_from_db()
+        self.assertTrue(self.user.profile.stripe_subscription_id)
+
+    def test_paypal_subscription(self):
+        api = Api(
+            mode='sandbox',
+            client_id='client',
+            client_secret='secret',
+            endpoint=self.server.url
+        )
+
+        created = api.post('v1/billing/subscriptions', {'plan_id': 'P-1'})
+        retrieved = api.get(f"v1/billing/subscriptions/{created['id']}")
+
+        self.assertEquals(retrieved['status'], 'ACTIVE')
+        self.assertIn(
+            'approve',
+            [link['rel'] for link in created['links']]
+        )
+        self.assertEquals(
+            self.server.stats()['requests']['paypal_token'],
+            1
+        )
+
+
+class MockServerErrorsTest(MockServerTestCase):
+
+    server_options = {'error_rate': 1}
+
+    def test_injected_errors(self):
+        client = self.stripe_client()
+        stripe.max_network_retries = 0
+
+        with self.assertRaises(stripe.error.APIError):
+            client.retrieve_customer('cus_1')
+
+        self.assertEquals(
+            self.server.stats()['errors']['stripe_retrieve'],
+            1
+        )
+
+
+class LatencyTest(TestCase):
+
+    def test_distributions(self):
+        self.assertEquals(Latency('fixed:50').sample(), 0.05)
+        self.assertTrue(0.02 <= Latency('uniform:20:80').sample() <= 0.08)
+        self.assertGreaterEqual(Latency('normal:10:50').sample(), 0)
+        self.assertGreater(Latency('lognormal:50:0.5').sample(), 0)
+
+        with self.assertRaises(ValueError):
+            Latency('fixed')
@@ -0,0 +1,209 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import notifications
+from .models import Counter, Notification, NotificationDigest, Subscription
+from .signals import new_subscriber, user_signed_up_handler
+
+NOTIFY_EMAIL = 'owner@mail.com'
+
+
+class BrokenBackend:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def open(self):
+        raise ConnectionRefusedError("SMTP is down")
+
+    def __enter__(self):
+        self.open()
+
+    def __exit__(self, *args):
+        pass
+
+
+class DroppingBackend(locmem.EmailBackend):
+    """
+    Connection drops while sending "Title 1".
+    """
+
+    def send_messages(self, messages):
+        if any(message.subject == "Title 1" for message in messages):
+            raise ConnectionResetError("Connection dropped")
+
+        return super().send_messages(messages)
+
+
+@override_settings(DJANGO_LESSONS_NOTIFY_EMAIL=NOTIFY_EMAIL)
+class NotificationOutboxTest(TestCase):
+
+    def test_signal_handler_only_inserts(self):
+        with self.assertNumQueries(2):
+            # subscriptions counter + INSERT into outbox
+            new_subscriber.send('test', email='john@mail.com')
+
+        self.assertEquals(len(mail.outbox), 0)
+        self.assertEquals(notifications.queue_depth(), 1)
+
+    def test_send_batch(self):
+        for number in range(3):
+            notifications.notify(title=f"Title {number}", text="text")
+
+        self.assertEquals(notifications.send_batch(), 3)
+        self.assertEquals(len(mail.outbox), 3)
+        self.assertEquals(mail.outbox[0].to, [NOTIFY_EMAIL])
+        self.assertEquals(notifications.queue_depth(), 0)
+        # nothing left to send
+        self.assertEquals(notifications.send_batch(), 0)
+
+    def test_retry_with_backoff(self):
+        notification = notifications.notify(title="Title", text="text")
+
+        with override_settings(
+            EMAIL_BACKEND='lessons.test_notifications.BrokenBackend'
+        ):
+            self.assertEquals(notifications.send_batch(), 0)
+
+        notification.refresh_from_db()
+        self.assertEquals(notification.status, Notification.PENDING)
+        self.assertEquals(notification.attempts, 1)
+        self.assertIn("SMTP is down", notification.last_error)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        # not due yet
+        self.assertEquals(notifications.send_batch(), 0)
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEquals(notifications.send_batch(), 1)
+        notification.refresh_from_db()
+        self.assertEquals(notification.status, Notification.SENT)
+
+    def test_only_failed_messages_are_retried(self):
+        for number in range(3):
+            notifications.notify(title=f"Title {number}", text="text")
+
+        with override_settings(
+            EMAIL_BACKEND='lessons.test_notifications.DroppingBackend'
+        ):
+            self.assertEquals(notifications.send_batch(), 2)
+
+        self.assertEquals(
+            [message.subject for message in mail.outbox],
+            ["Title 0", "Title 2"]
+        )
+        failed = Notification.objects.get(title="Title 1")
+        self.assertEquals(failed.status, Notification.PENDING)
+        self.assertIn("Connection dropped", failed.last_error)
+        self.assertEquals(
+            Notification.objects.filter(status=Notification.SENT).count(),
+            2
+        )
+
+    def test_give_up_after_max_attempts(self):
+        notification = notifications.notify(title="Title", text="text")
+
+        with override_settings(
+            EMAIL_BACKEND='lessons.test_notifications.BrokenBackend'
+        ):
+            for attempt in range(notifications.MAX_ATTEMPTS):
+                Notification.objects.update(
+                    next_attempt_at=timezone.now() - timedelta(seconds=1)
+                )
+                notifications.send_batch()
+
+        notification.refresh_from_db()
+        self.assertEquals(notification.status, Notification.FAILED)
+        self.assertEquals(notifications.queue_depth(), 0)
+
+    def test_command_once(self):
+        notifications.notify(title="Title", text="text")
+
+        out = StringIO()
+        call_command('send_notifications', '--once', stdout=out)
+
+        self.assertEquals(len(mail.outbox), 1)
+        self.assertIn("sent=1", out.getvalue())
+
+
+@override_settings(
+    DJANGO_LESSONS_NOTIFY_EMAIL=NOTIFY_EMAIL,
+    DJANGO_LESSONS_NOTIFY_DIGEST_MINUTES=10
+)
+class NotificationDigestTest(TestCase):
+
+    def test_events_are_coalesced(self):
+        for number in range(5):
+            new_subscriber.send('test', email=f'john{number}@mail.com')
+        user_signed_up_handler('test', email='jane@mail.com')
+
+        self.assertEquals(notifications.queue_depth(), 0)
+        self.assertEquals(notifications.digest_depth(), 6)
+        self.assertEquals(NotificationDigest.objects.count(), 2)
+
+    def test_event_counted_with_single_update(self):
+        new_subscriber.send('test', email='john@mail.com')
+
+        with self.assertNumQueries(2):
+            # subscriptions counter + UPDATE of digest
+            new_subscriber.send('test', email='john@mail.com')
+
+    def test_flush_finished_window_only(self):
+        new_subscriber.send('test', email='john@mail.com')
+        new_subscriber.send('test', email='jane@mail.com')
+
+        # window not finished yet
+        self.assertEquals(notifications.flush_digests(), 0)
+
+        later = timezone.now() + timedelta(minutes=10)
+        self.assertEquals(notifications.flush_digests(now=later), 1)
+        self.assertEquals(notifications.digest_depth(), 0)
+
+        notification = Notification.objects.get()
+        self.assertIn("2 events", notification.title)
+        self.assertIn("New Subscriber: 2", notification.text)
+
+    def test_digest_turned_off(self):
+        new_subscriber.send('test', email='john@mail.com')
+
+        with override_settings(DJANGO_LESSONS_NOTIFY_DIGEST_MINUTES=0):
+            new_subscriber.send('test', email='jane@mail.com')
+            # leftovers are flushed
+            self.assertEquals(notifications.flush_digests(), 1)
+
+        self.assertEquals(notifications.queue_depth(), 2)
+
+
+class TotalsCounterTest(TestCase):
+
+    def test_counter_follows_inserts_and_deletes(self):
+        start = Counter.get_value(Counter.SUBSCRIPTIONS)
+        subscription = Subscription.objects.create(email='john@mail.com')
+        Subscription.objects.create(email='jane@mail.com')
+
+        self.assertEquals(
+            Counter.get_value(Counter.SUBSCRIPTIONS),
+            start + 2
+        )
+
+        subscription.delete()
+        self.assertEquals(
+            Counter.get_value(Counter.SUBSCRIPTIONS),
+            start + 1
+        )
+        self.assertEquals(
+            Counter.get_value(Counter.SUBSCRIPTIONS),
+            Subscription.objects.count()
+        )
+
+    def test_sync_counters(self):
+        Counter.objects.filter(name=Counter.SUBSCRIPTIONS).update(value=42)
+        Subscription.objects.create(email='john@mail.com')
+
+        call_command('sync_counters', stdout=StringIO())
+
+        self.assertEquals(Counter.get_value(Counter.SUBSCRIPTIONS), 1)
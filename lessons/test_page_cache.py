@@ -0,0 +1,157 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from wagtail.core.models import Page
+
+from . import page_cache
+from .models import PRO, Course, LessonGroup
+from .test_views import JOHN, PASS, create_live_lesson, create_user
+
+
+@override_settings(DJANGO_LESSONS_PAGE_CACHE_SECONDS=600)
+class PageCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.homepage = Page.objects.get(url_path='/home/')
+        self.first = create_live_lesson(self.homepage, 1, order=1)
+        self.second = create_live_lesson(self.homepage, 2, order=2)
+
+    def assertCached(self, url):
+        ret = self.client.get(url)
+        self.assertEquals(ret.status_code, 200)
+        self.assertEquals(ret['X-Page-Cache'], page_cache.MISS)
+
+        # only wagtail's SiteMiddleware site lookup
+        with self.assertNumQueries(1):
+            ret = self.client.get(url)
+        self.assertEquals(ret['X-Page-Cache'], page_cache.HIT)
+
+        return ret
+
+    def assertNotCached(self, url):
+        ret = self.client.get(url)
+        self.assertNotEqual(ret.get('X-Page-Cache'), page_cache.HIT)
+
+        return ret
+
+    def create_course(self, lessons):
+        course = Course(
+            title="Course 1",
+            slug="course-1",
+            short_description="Course"
+        )
+        self.homepage.add_child(instance=course)
+        course.save_revision().publish()
+        for order, lesson in enumerate(lessons, start=1):
+            LessonGroup.objects.create(
+                title=f"Part {order}",
+                short_description="Part",
+                order=order,
+                lesson=lesson,
+                course=course
+            )
+
+        return course
+
+    def test_index(self):
+        ret = self.assertCached(reverse('index'))
+
+        self.assertEquals(
+            ret['Surrogate-Key'],
+            f"{page_cache.LESSON_LIST} {page_cache.SITE}"
+        )
+        self.assertContains(ret, "Lesson 2")
+
+    def test_csrf_token_is_per_visitor(self):
+        self.assertCached(reverse('index'))
+
+        ret = Client().get(reverse('index'))
+        token = ret.cookies['csrftoken'].value
+
+        self.assertEquals(ret['X-Page-Cache'], page_cache.HIT)
+        self.assertNotContains(ret, page_cache.CSRF_PLACEHOLDER)
+        self.assertContains(ret, 'name="csrfmiddlewaretoken"')
+        self.assertIn('private', ret['Cache-Control'])
+        self.assertTrue(token)
+
+    def test_static_page_public_for_cdn(self):
+        ret = self.assertCached(reverse('about'))
+
+        self.assertEquals(ret['Surrogate-Key'], page_cache.SITE)
+        self.assertIn('public', ret['Cache-Control'])
+        self.assertIn('s-maxage=600', ret['Cache-Control'])
+
+    def test_authenticated_not_cached(self):
+        create_user(username=JOHN, password=PASS)
+        self.client.login(username=JOHN, password=PASS)
+
+        self.assertNotCached(reverse('index'))
+        ret = self.assertNotCached(reverse('index'))
+
+        self.assertIn('private', ret['Cache-Control'])
+
+    def test_pro_lesson_not_cached(self):
+        pro_lesson = create_live_lesson(
+            self.homepage, 3, order=3, lesson_type=PRO
+        )
+
+        ret = self.assertNotCached(pro_lesson.get_absolute_url())
+        self.assertEquals(ret.status_code, 302)
+        ret = self.assertNotCached(pro_lesson.get_absolute_url())
+        self.assertEquals(ret.status_code, 302)
+
+    def test_publish_purges_lesson_and_listing(self):
+        url = self.first.get_absolute_url()
+        self.assertCached(url)
+        self.assertCached(reverse('index'))
+
+        self.first.title = "Updated title"
+        self.first.save_revision().publish()
+
+        ret = self.assertNotCached(url)
+        self.assertContains(ret, "Updated title")
+        ret = self.assertNotCached(reverse('index'))
+        self.assertContains(ret, "Updated title")
+
+    def test_neighbors_purged(self):
+        first_url = self.first.get_absolute_url()
+        second_url = self.second.get_absolute_url()
+        self.assertCached(first_url)
+        self.assertCached(second_url)
+
+        third = create_live_lesson(self.homepage, 3, order=3)
+
+        # next of second is the new lesson
+        ret = self.assertNotCached(second_url)
+        self.assertEquals(ret.context['next_item'].id, third.id)
+
+        self.second.unpublish()
+        ret = self.assertNotCached(first_url)
+        self.assertEquals(ret.context['next_item'].id, third.id)
+
+    def test_course_pages(self):
+        course = self.create_course([self.first, self.second])
+        course_view_url = f"{self.first.get_absolute_url()}?view=course"
+        self.assertCached(course.url)
+        self.assertCached(course_view_url)
+
+        LessonGroup.objects.filter(lesson=self.second).update(order=10)
+        LessonGroup.objects.get(lesson=self.second).save()
+
+        self.assertNotCached(course.url)
+        self.assertNotCached(course_view_url)
+        self.assertCached(reverse('about'))
+
+        # course title is in navigation of every page
+        course.title = "Updated course"
+        course.save_revision().publish()
+
+        ret = self.assertNotCached(reverse('about'))
+        self.assertContains(ret, "Updated course")
+
+    def test_disabled(self):
+        with self.settings(DJANGO_LESSONS_PAGE_CACHE_SECONDS=0):
+            self.assertNotCached(reverse('index'))
+            self.assertNotCached(reverse('index'))
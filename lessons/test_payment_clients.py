@@ -0,0 +1,164 @@
+import json
+import time
+
+from django.core.cache import cache
+from django.test import TestCase
+from requests.models import Response
+
+from .payments import metrics
+from .payments.clients import stripe as stripe_clients
+from .payments.clients.paypal import TOKEN_PATH, Api
+
+
+def response(status_code, data):
+    ret = Response()
+    ret.status_code = status_code
+    ret._content = json.dumps(data).encode('utf-8')
+
+    return ret
+
+
+class FakeSession:
+    """
+    Records requests, answers token requests with a new token each time.
+    """
+
+    def __init__(self):
+        self.urls = []
+        self.tokens = 0
+        self.rejected_tokens = set()
+
+    def request(self, method, url, **kwargs):
+        self.urls.append(url)
+
+        if url.endswith(TOKEN_PATH):
+            self.tokens += 1
+            return response(200, {
+                'access_token': f"token-{self.tokens}",
+                'token_type': 'Bearer',
+                'expires_in': 32400
+            })
+
+        token = kwargs['headers']['Authorization'].split()[-1]
+        if token in self.rejected_tokens:
+            return response(401, {'error': 'invalid_token'})
+
+        return response(200, {'id': 'I-1', 'token': token})
+
+
+def api(session):
+    ret = Api(mode='sandbox', client_id='client', client_secret='secret')
+    ret.session = session
+
+    return ret
+
+
+class PaypalApiTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_token_shared_between_workers(self):
+        session = FakeSession()
+
+        first = api(session).get('v1/billing/subscriptions/I-1')
+        # e.g. Api of another gunicorn worker
+        second = api(session).get('v1/billing/subscriptions/I-1')
+
+        self.assertEquals(session.tokens, 1)
+        self.assertEquals(first['token'], second['token'])
+        self.assertEquals(len(session.urls), 3)
+
+    def test_token_refreshed_before_expiry(self):
+        session = FakeSession()
+        worker = api(session)
+        worker.get('v1/billing/subscriptions/I-1')
+
+        # token expires in a minute
+        worker.token_expires_at = time.time() + 60
+        ret = worker.get('v1/billing/subscriptions/I-1')
+
+        self.assertEquals(session.tokens, 2)
+        self.assertEquals(ret['token'], 'token-2')
+
+    def test_rejected_token_is_replaced(self):
+        session = FakeSession()
+        api(session).get('v1/billing/subscriptions/I-1')
+        session.rejected_tokens.add('token-1')
+
+        ret = api(session).get('v1/billing/subscriptions/I-1')
+
+        self.assertEquals(ret['token'], 'token-2')
+        # new token is shared
+        self.assertEquals(
+            api(session).get('v1/billing/subscriptions/I-1')['token'],
+            'token-2'
+        )
+
+    def test_calls_are_timed(self):
+        api(FakeSession()).get('v1/billing/subscriptions/I-1')
+
+        stats = metrics.stats()
+        self.assertEquals(stats['paypal.oauth2_token'][metrics.CALLS], 1)
+        self.assertEquals(stats['paypal.api_call'][metrics.CALLS], 1)
+        self.assertEquals(stats['paypal.api_call'][metrics.ERRORS], 0)
+
+
+class BrokenStripeClient(stripe_clients.FakeClient):
+
+    def confirm_payment_intent(self, payment_intent):
+        raise ConnectionError("Stripe is down")
+
+
+class StripeClientTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fake_latency_is_timed(self):
+        client = stripe_clients.FakeClient('key', latency=0.01)
+        client.create_customer(
+            email='john@mail.com',
+            payment_method_id='pm_1',
+            invoice_settings={}
+        )
+
+        counters = metrics.stats()['stripe.create_customer']
+        self.assertEquals(counters[metrics.CALLS], 1)
+        self.assertGreaterEqual(counters['avg_ms'], 10)
+
+    def test_errors_are_counted(self):
+        with self.assertRaises(ConnectionError):
+            BrokenStripeClient('key').confirm_payment_intent('pi_1')
+
+        counters = metrics.stats()['stripe.confirm_payment_intent']
+        self.assertEquals(counters[metrics.CALLS], 1)
+        self.assertEquals(counters[metrics.ERRORS], 1)
+
+    def test_real_client_http_settings(self):
+        orig_client = stripe_clients.orig_stripe.default_http_client
+        orig_retries = stripe_clients.orig_stripe.max_network_retries
+        self.addCleanup(
+            setattr,
+            stripe_clients.orig_stripe,
+            'default_http_client',
+            orig_client
+        )
+        self.addCleanup(
+            setattr,
+            stripe_clients.orig_stripe,
+            'max_network_retries',
+            orig_retries
+        )
+
+        stripe_clients.RealClient(api_key='sk_test')
+
+        http_client = stripe_clients.orig_stripe.default_http_client
+        self.assertEquals(
+            http_client._timeout,
+            (stripe_clients.CONNECT_TIMEOUT, stripe_clients.READ_TIMEOUT)
+        )
+        self.assertEquals(
+            stripe_clients.orig_stripe.max_network_retries,
+            stripe_clients.MAX_NETWORK_RETRIES
+        )
@@ -0,0 +1,188 @@
+import os
+import tempfile
+from base64 import b64encode
+from datetime import datetime, timedelta, timezone
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+from django.core.cache import cache
+from django.test import TestCase
+
+from .webhooks.paypal_certs import (CertStore, expected_signature_input,
+                                    load_chain)
+
+CERT_URL = 'https://api.sandbox.paypal.com/v1/notifications/certs/CERT-1'
+PAYPAL_NAME = 'messageverificationcerts.sandbox.paypal.com'
+WEBHOOK_ID = 'WH-1'
+BODY = '{"event_type": "PAYMENT.SALE.COMPLETED"}'
+
+
+def make_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def make_cert(common_name, key, issuer_key=None, issuer=None, days=30):
+    """
+    Self signed CA certificate, unless issuer is given.
+    """
+    now = datetime.now(timezone.utc)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+
+    return x509.CertificateBuilder().subject_name(
+        name
+    ).issuer_name(
+        issuer.subject if issuer else name
+    ).public_key(
+        key.public_key()
+    ).serial_number(
+        x509.random_serial_number()
+    ).not_valid_before(
+        now - timedelta(days=1)
+    ).not_valid_after(
+        now + timedelta(days=days)
+    ).add_extension(
+        x509.BasicConstraints(ca=issuer is None, path_length=None),
+        critical=True
+    ).sign(issuer_key or key, hashes.SHA256())
+
+
+def to_pem(cert):
+    return cert.public_bytes(serialization.Encoding.PEM)
+
+
+def sign(key, transmission_id='T-1', timestamp='2020-01-01T00:00:00Z'):
+    signature = key.sign(
+        expected_signature_input(transmission_id, timestamp, WEBHOOK_ID, BODY),
+        padding.PKCS1v15(),
+        hashes.SHA256()
+    )
+
+    return b64encode(signature).decode('ascii')
+
+
+class PaypalCertStoreTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.ca_key = make_key()
+        cls.ca = make_cert("Test Root CA", cls.ca_key)
+        cls.key = make_key()
+        cls.cert = make_cert(PAYPAL_NAME, cls.key, cls.ca_key, cls.ca)
+
+    def setUp(self):
+        cache.clear()
+        self.fetched = []
+
+    def fetch(self, pem):
+        def _fetch(cert_url):
+            self.fetched.append(cert_url)
+            return pem
+
+        return _fetch
+
+    def store(self, pem=None, **kwargs):
+        return CertStore(
+            chain=[self.ca],
+            fetch=self.fetch(pem or to_pem(self.cert)),
+            **kwargs
+        )
+
+    def verify(self, store, cert_url=CERT_URL, body=BODY, signature=None):
+        return store.verify(
+            'T-1',
+            '2020-01-01T00:00:00Z',
+            WEBHOOK_ID,
+            body,
+            cert_url,
+            signature or sign(self.key),
+            'SHA256withRSA'
+        )
+
+    def test_certificate_downloaded_once(self):
+        store = self.store()
+
+        self.assertTrue(self.verify(store))
+        self.assertTrue(self.verify(store))
+        self.assertEquals(self.fetched, [CERT_URL])
+
+    def test_certificate_shared_through_cache(self):
+        self.assertTrue(self.verify(self.store()))
+        # e.g. another worker process
+        self.assertTrue(self.verify(self.store()))
+
+        self.assertEquals(len(self.fetched), 1)
+
+    def test_tampered_body(self):
+        self.assertFalse(
+            self.verify(self.store(), body='{"event_type": "FAKE"}')
+        )
+
+    def test_host_not_allowed(self):
+        store = self.store()
+
+        self.assertFalse(
+            self.verify(store, cert_url='https://evil.com/cert')
+        )
+        self.assertFalse(
+            self.verify(
+                store,
+                cert_url='http://api.sandbox.paypal.com/v1/cert'
+            )
+        )
+        self.assertEquals(self.fetched, [])
+
+    def test_untrusted_certificate(self):
+        other_ca_key = make_key()
+        other_ca = make_cert("Other CA", other_ca_key)
+        cert = make_cert(PAYPAL_NAME, self.key, other_ca_key, other_ca)
+        store = self.store(pem=to_pem(cert))
+
+        self.assertFalse(self.verify(store))
+        # rejected certificate is not cached
+        self.assertFalse(self.verify(store))
+        self.assertEquals(len(self.fetched), 2)
+
+    def test_common_name_not_paypal(self):
+        cert = make_cert("example.com", self.key, self.ca_key, self.ca)
+
+        self.assertFalse(self.verify(self.store(pem=to_pem(cert))))
+
+    def test_expired_certificate(self):
+        cert = make_cert(PAYPAL_NAME, self.key, self.ca_key, self.ca, days=-1)
+
+        self.assertFalse(self.verify(self.store(pem=to_pem(cert))))
+
+    def test_expired_certificate_is_evicted(self):
+        store = self.store()
+        self.assertTrue(self.verify(store))
+
+        later = datetime.now(timezone.utc) + timedelta(days=31)
+        self.assertIsNone(store.from_memory(CERT_URL, later))
+
+    def test_lru_eviction(self):
+        store = self.store(max_size=1)
+        other_url = CERT_URL.replace('CERT-1', 'CERT-2')
+
+        self.verify(store)
+        self.verify(store, cert_url=other_url)
+        cache.clear()
+        self.verify(store, cert_url=other_url)
+        self.assertEquals(len(self.fetched), 2)
+
+        # CERT-1 was evicted by CERT-2
+        self.verify(store)
+        self.assertEquals(len(self.fetched), 3)
+
+    def test_load_chain(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for number, cert in enumerate([self.ca, self.cert]):
+                path = os.path.join(directory, f"cert{number}.pem")
+                with open(path, 'wb') as cert_file:
+                    cert_file.write(to_pem(cert))
+                paths.append(path)
+
+            self.assertEquals(load_chain(paths), [self.ca, self.cert])
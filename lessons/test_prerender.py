@@ -0,0 +1,109 @@
+import gzip
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from wagtail.core.models import Page
+
+from . import prerender
+from .models import Course
+from .test_views import JOHN, PASS, create_user
+
+
+class PrerenderTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            DJANGO_LESSONS_PRERENDER_ROOT=self.root
+        )
+        self.settings_override.enable()
+        self.client = Client()
+        self.homepage = Page.objects.get(url_path='/home/')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.root)
+
+    def create_course(self, title):
+        course = Course(
+            title=title,
+            slug="course-1",
+            short_description="Course"
+        )
+        self.homepage.add_child(instance=course)
+        course.save_revision().publish()
+
+        return course
+
+    def test_served_without_queries_and_rendering(self):
+        prerender.build()
+        with self.settings(DJANGO_LESSONS_PRERENDER_ROOT=None):
+            rendered = self.client.get(reverse('about'))
+
+        # only wagtail's site lookup
+        with self.assertNumQueries(1):
+            ret = self.client.get(reverse('about'))
+
+        self.assertEquals(ret.status_code, 200)
+        self.assertIsNone(ret.context)
+        self.assertEquals(ret.content, rendered.content)
+        self.assertIn('public', ret['Cache-Control'])
+        self.assertIn('Accept-Encoding', ret['Vary'])
+
+    def test_compressed(self):
+        prerender.build()
+        plain = self.client.get(reverse('privacy'))
+
+        ret = self.client.get(
+            reverse('privacy'),
+            HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+
+        self.assertEquals(ret['Content-Encoding'], 'gzip')
+        self.assertEquals(gzip.decompress(ret.content), plain.content)
+        self.assertEquals(int(ret['Content-Length']), len(ret.content))
+
+    def test_not_modified(self):
+        prerender.build()
+        ret = self.client.get(reverse('mission'))
+
+        ret = self.client.get(
+            reverse('mission'),
+            HTTP_IF_NONE_MATCH=ret['ETag']
+        )
+
+        self.assertEquals(ret.status_code, 304)
+
+    def test_authenticated_rendered(self):
+        prerender.build()
+        create_user(username=JOHN, password=PASS)
+        self.client.login(username=JOHN, password=PASS)
+
+        ret = self.client.get(reverse('about'))
+
+        self.assertIsNotNone(ret.context)
+        self.assertContains(ret, "Logout")
+
+    def test_course_change_rebuilds(self):
+        prerender.build()
+
+        self.create_course("Brand new course")
+        # pages are rebuilt after commit, until then rendered as usual
+        ret = self.client.get(reverse('about'))
+        self.assertIsNotNone(ret.context)
+        self.assertContains(ret, "Brand new course")
+
+        prerender.build()
+        ret = self.client.get(reverse('about'))
+        self.assertIsNone(ret.context)
+        self.assertContains(ret, "Brand new course")
+
+    def test_build_some_pages(self):
+        prerender.build()
+        prerender.build(['about'])
+
+        self.assertEquals(set(prerender.load()), set(prerender.STATIC_PAGES))
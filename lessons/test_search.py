@@ -0,0 +1,140 @@
+import json
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from wagtail.core.models import Page
+
+from . import search
+from .models import PRO, SearchDocument
+from .test_views import create_live_lesson
+
+
+def content(*blocks):
+    return json.dumps([
+        {'type': block_type, 'value': value} for block_type, value in blocks
+    ])
+
+
+class SearchTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.homepage = Page.objects.get(url_path='/home/')
+        self.lesson = create_live_lesson(
+            self.homepage,
+            1,
+            order=1,
+            script="<p>Transcript mentions gunicorn.</p>",
+            content=content(
+                ('paragraph', "<p>Deploy with <b>nginx</b> &amp; docker.</p>"),
+                ('code', {'code': "class Invoice(models.Model):", 'lang': ''}),
+                ('note', {'text': "Remember the migrations", 'note_type': ''}),
+                ('pro_paragraph', "<p>Secret celery configuration.</p>"),
+            )
+        )
+
+    def test_content_is_indexed(self):
+        for query in ("nginx", "Invoice", "migrations", "gunicorn", "celery"):
+            self.assertEquals(search.search(query), [self.lesson.id], query)
+
+        self.assertEquals(search.search("number 1"), [self.lesson.id])
+        self.assertEquals(search.search("flask"), [])
+
+    def test_all_words_match(self):
+        self.assertEquals(search.search("nginx docker"), [self.lesson.id])
+        self.assertEquals(search.search("nginx flask"), [])
+
+    def test_stemming(self):
+        self.assertEquals(search.search("deploying"), [self.lesson.id])
+
+    def test_title_ranks_first(self):
+        titled = create_live_lesson(self.homepage, 2, order=2)
+        titled.title = "Nginx in production"
+        titled.save_revision().publish()
+
+        self.assertEquals(
+            search.search("nginx"),
+            [titled.id, self.lesson.id]
+        )
+
+    def test_lesson_type(self):
+        pro_lesson = create_live_lesson(
+            self.homepage, 2, order=2, lesson_type=PRO
+        )
+
+        self.assertEquals(search.search("lesson", PRO), [pro_lesson.id])
+
+    def test_query_syntax_is_ignored(self):
+        for query in ('"nginx', "nginx OR", "nginx*", "(", "-"):
+            search.search(query)
+
+        self.assertEquals(search.search("   "), [])
+
+    def test_snippets(self):
+        snippets = search.snippets("docker", [self.lesson.id])
+
+        self.assertIn("<mark>docker</mark>", snippets[self.lesson.id])
+        # text is escaped
+        self.assertIn("&amp;", snippets[self.lesson.id])
+
+    def test_no_pro_content_in_snippets(self):
+        snippets = search.snippets("celery", [self.lesson.id])
+
+        self.assertNotIn("celery", snippets[self.lesson.id].lower())
+        self.assertIn("lesson number 1", snippets[self.lesson.id])
+
+    def test_no_pro_lesson_content_in_snippets(self):
+        pro_lesson = create_live_lesson(
+            self.homepage,
+            2,
+            order=2,
+            lesson_type=PRO,
+            content=content(('paragraph', "<p>Paid kubernetes setup.</p>"))
+        )
+
+        self.assertEquals(search.search("kubernetes"), [pro_lesson.id])
+        snippet = search.snippets("kubernetes", [pro_lesson.id])[pro_lesson.id]
+        self.assertNotIn("kubernetes", snippet.lower())
+        self.assertIn("lesson number 2", snippet)
+
+    def test_publish_updates_index(self):
+        self.lesson.content = content(('paragraph', "<p>Postgres.</p>"))
+        self.lesson.save_revision().publish()
+
+        self.assertEquals(search.search("nginx"), [])
+        self.assertEquals(search.search("postgres"), [self.lesson.id])
+
+    def test_unpublish_and_delete(self):
+        self.lesson.unpublish()
+
+        self.assertEquals(search.search("nginx"), [])
+        self.assertFalse(SearchDocument.objects.exists())
+
+        self.lesson.save_revision().publish()
+        self.assertEquals(search.search("nginx"), [self.lesson.id])
+
+        self.lesson.delete()
+        self.assertEquals(search.search("nginx"), [])
+
+    def test_rebuild(self):
+        second = create_live_lesson(self.homepage, 2, order=2)
+        SearchDocument.objects.all().delete()
+        search.SqliteIndex().clear()
+
+        self.assertEquals(search.rebuild(), 2)
+
+        self.assertEquals(
+            sorted(search.search("lesson")),
+            sorted([self.lesson.id, second.id])
+        )
+
+    def test_index_view(self):
+        create_live_lesson(self.homepage, 2, order=2)
+
+        ret = self.client.get(reverse('index'), {'q': 'docker'})
+
+        self.assertEquals(ret.status_code, 200)
+        self.assertEquals(list(ret.context['lessons']), [self.lesson])
+        self.assertContains(ret, "<mark>docker</mark>")
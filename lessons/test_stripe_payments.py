@@ -3,10 +3,57 @@ from django.test import TestCase
 # my stripe = my own stripe module located in
 # lessons.payments.stripe
 from .payments import stripe as my_stripe
+from .payments.clients.stripe import Fake, FakeInvoice, FakeSubscription
 from .payments.clients.stripe import FakeClient as PaymentTestClient
 from .utils import create_user
 
 
+class FakeRequiresAction(Fake):
+    @property
+    def status(self):
+        return my_stripe.PaymentStatus.REQUIRES_ACTION
+
+
+class RequiresActionTestClient(PaymentTestClient):
+    """
+    Card with 3D Secure
+    """
+
+    def create_and_confirm_payment_intent(
+        self,
+        amount,
+        currency,
+        receipt_email,
+        payment_method_id
+    ):
+        return FakeRequiresAction()
+
+
+class FakeRequiresActionInvoice(FakeInvoice):
+    @property
+    def payment_intent(self):
+        return FakeRequiresAction()
+
+
+class FakeIncompleteSubscription(FakeSubscription):
+    @property
+    def status(self):
+        return my_stripe.SUBSCRIPTION_INCOMPLETE
+
+    @property
+    def latest_invoice(self):
+        return FakeRequiresActionInvoice()
+
+
+class IncompleteSubscriptionTestClient(PaymentTestClient):
+    """
+    Subscription paid with 3D Secure card
+    """
+
+    def create_subscription(self, customer_id, stripe_plan_id):
+        return FakeIncompleteSubscription()
+
+
 class UserProfileTest(TestCase):
     def setUp(self):
         self.user = create_user(
@@ -70,3 +117,76 @@ class UserProfileTest(TestCase):
             lesson_plan_id='m'  # LessonsPlan, monthly
         )
         payment.pay()
+
+    def test_one_time_payment_round_trips(self):
+        client = PaymentTestClient("fake")
+        payment = my_stripe.OneTimePayment(
+            client=client,
+            user=self.user,
+            payment_method_id="blah",
+            lesson_plan_id='m'
+        )
+        payment.pay()
+
+        self.assertEquals(
+            client.calls, ['create_and_confirm_payment_intent']
+        )
+        self.assertEquals(payment.status, my_stripe.PaymentStatus.SUCCESS)
+
+    def test_one_time_payment_3ds_round_trips(self):
+        client = RequiresActionTestClient("fake")
+        payment = my_stripe.OneTimePayment(
+            client=client,
+            user=self.user,
+            payment_method_id="blah",
+            lesson_plan_id='m'
+        )
+        payment_intent = payment.pay()
+        context = payment.get_3ds_context(payment_intent.id)
+
+        self.assertTrue(payment.requires_action)
+        self.assertEquals(context['payment_intent_secret'], 'fake_secret')
+        # client secret is taken from confirmed intent, not retrieved again
+        self.assertEquals(
+            client.calls, ['create_and_confirm_payment_intent']
+        )
+
+    def recurring_payment(self, client):
+        return my_stripe.RecurringPayment(
+            client=client,
+            user=self.user,
+            stripe_plan_id='whatever_id',
+            payment_method_id='whatever_id'
+        )
+
+    def test_recurring_payment_round_trips(self):
+        client = PaymentTestClient("fake")
+        self.recurring_payment(client).create_subscription()
+
+        self.assertEquals(
+            client.calls, ['create_customer', 'create_subscription']
+        )
+
+    def test_recurring_payment_existing_customer_round_trips(self):
+        self.user.profile.stripe_customer_id = 'cus_1'
+        self.user.profile.save()
+        client = PaymentTestClient("fake")
+
+        self.recurring_payment(client).create_subscription()
+
+        # customer is not retrieved
+        self.assertEquals(client.calls, ['create_subscription'])
+
+    def test_recurring_payment_3ds_round_trips(self):
+        client = IncompleteSubscriptionTestClient("fake")
+        payment = self.recurring_payment(client)
+
+        latest_invoice = payment.create_subscription()
+        context = payment.get_3ds_context(latest_invoice)
+
+        self.assertTrue(payment.requires_action)
+        self.assertEquals(context['payment_intent_secret'], 'fake_secret')
+        # expanded invoice and payment intent are used as they are
+        self.assertEquals(
+            client.calls, ['create_customer', 'create_subscription']
+        )
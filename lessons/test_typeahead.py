@@ -0,0 +1,118 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from wagtail.core.models import Page
+
+from . import typeahead
+from .models import Course, LessonTagIndex
+from .test_views import create_live_lesson
+
+
+class TypeaheadTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.homepage = Page.objects.get(url_path='/home/')
+        self.tags_page = LessonTagIndex(title="Tags", slug="tags")
+        self.homepage.add_child(instance=self.tags_page)
+        self.lesson = create_live_lesson(self.homepage, 1, order=1)
+        self.lesson.title = "Deploy Django with Nginx"
+        self.lesson.save_revision().publish()
+        self.course = Course(
+            title="Django Deployment",
+            slug="course-1",
+            short_description="Course"
+        )
+        self.homepage.add_child(instance=self.course)
+        self.course.save_revision().publish()
+
+    def titles(self, items):
+        return [(item['type'], item['title']) for item in items]
+
+    def test_title_prefix(self):
+        self.assertEquals(
+            self.titles(typeahead.lookup("depl")),
+            [
+                (typeahead.LESSON, "Deploy Django with Nginx"),
+                (typeahead.COURSE, "Django Deployment"),
+            ]
+        )
+
+    def test_word_prefix(self):
+        items = typeahead.lookup("NGI")
+
+        self.assertEquals(
+            self.titles(items),
+            [(typeahead.LESSON, "Deploy Django with Nginx")]
+        )
+        self.assertEquals(items[0]['url'], self.lesson.get_absolute_url())
+
+    def test_title_matches_first(self):
+        self.assertEquals(
+            self.titles(typeahead.lookup("django")),
+            [
+                # "django" tag of the lesson
+                (typeahead.COURSE, "Django Deployment"),
+                (typeahead.TAG, "django"),
+                (typeahead.LESSON, "Deploy Django with Nginx"),
+            ]
+        )
+
+    def test_types_and_limit(self):
+        self.assertEquals(
+            self.titles(typeahead.lookup("d", types=[typeahead.COURSE])),
+            [(typeahead.COURSE, "Django Deployment")]
+        )
+        self.assertEquals(len(typeahead.lookup("d", limit=1)), 1)
+        self.assertEquals(typeahead.lookup("  "), [])
+
+    def test_tag_url(self):
+        items = typeahead.lookup("tag-1")
+
+        self.assertEquals(items[0]['url'], f"{self.tags_page.url}?tag=tag-1")
+
+    def test_lookup_runs_no_queries(self):
+        typeahead.lookup("dep")
+
+        with self.assertNumQueries(0):
+            typeahead.lookup("dja")
+
+    def test_rebuilt_on_publish(self):
+        typeahead.lookup("dep")
+
+        self.lesson.unpublish()
+        self.assertEquals(
+            self.titles(typeahead.lookup("dep")),
+            [(typeahead.COURSE, "Django Deployment")]
+        )
+
+        create_live_lesson(self.homepage, 2, order=2)
+        self.assertEquals(
+            self.titles(typeahead.lookup("lesson")),
+            [(typeahead.LESSON, "Lesson 2")]
+        )
+
+    def test_view(self):
+        ret = self.client.get(
+            reverse('typeahead'),
+            {'q': "dep", 'type': typeahead.COURSE}
+        )
+
+        self.assertEquals(ret.status_code, 200)
+        self.assertEquals(
+            ret.json()['results'],
+            [{
+                'type': typeahead.COURSE,
+                'title': "Django Deployment",
+                'url': self.course.url,
+            }]
+        )
+
+    def test_view_bad_request(self):
+        for params in ({'type': 'page'}, {'limit': 'x'}, {'limit': 0}):
+            ret = self.client.get(
+                reverse('typeahead'),
+                dict(params, q="dep")
+            )
+            self.assertEquals(ret.status_code, 400, params)
@@ -1,11 +1,15 @@
 from datetime import date, timedelta
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from wagtail.core.models import Page
 
-from .models import PRO, Lesson
+from . import caching, feed
+from .models import PRO, Course, Lesson, LessonGroup, LessonTagIndex
 from .payments import utils as pay_utils
 from .payments.stripe import create_or_update_user_profile
 
@@ -102,3 +106,188 @@ class TestBasicUpload(TestCase):
             ret.status_code,
             200
         )
+
+
+def create_live_lesson(parent, number, **kwargs):
+    lesson = Lesson(
+        title=f"Lesson {number}",
+        slug=f"lesson-{number}",
+        short_description=f"This is lesson number {number}.",
+        **kwargs
+    )
+    parent.add_child(instance=lesson)
+    lesson.tags.add('django', f"tag-{number}")
+    lesson.save_revision().publish()
+
+    return lesson
+
+
+class TestListingQueries(TestCase):
+    """
+    Lesson listings (index, tag index, feed) must run a fixed number
+    of queries, no matter how many lessons (and tags) are displayed.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.homepage = Page.objects.get(url_path='/home/')
+        self.tags_page = LessonTagIndex(title="Tags", slug="tags")
+        self.homepage.add_child(instance=self.tags_page)
+
+    def add_lessons(self, count):
+        start = Lesson.objects.count() + 1
+        for number in range(start, start + count):
+            create_live_lesson(self.homepage, number)
+
+    def assertConstantQueries(self, num, url):
+        self.add_lessons(1)
+        for count in (0, 9):
+            self.add_lessons(count)
+            # warm up process wide caches (e.g. content types) and caches
+            # refreshed on publish (e.g. tag cloud)
+            self.client.get(url)
+            with self.assertNumQueries(num):
+                ret = self.client.get(url)
+            self.assertEquals(ret.status_code, 200)
+
+    def test_index_queries(self):
+        self.assertConstantQueries(6, reverse('index'))
+
+    def test_tag_index_queries(self):
+        self.assertConstantQueries(
+            8, f"{self.tags_page.url}?tag=django"
+        )
+
+    def test_feed_queries(self):
+        # polls read the feed from cache (see test_feed), building it must
+        # not depend on the number of lessons either
+        self.add_lessons(1)
+        # warm up process wide caches (e.g. content types)
+        feed.build(feed.LATEST)
+        for count in (0, 9):
+            self.add_lessons(count)
+            with self.assertNumQueries(3):
+                feed.build(feed.LATEST)
+
+
+class TestLessonNavigation(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.homepage = Page.objects.get(url_path='/home/')
+        # there is a gap in orders: 1, 2, 4
+        self.first = create_live_lesson(self.homepage, 1, order=1)
+        self.second = create_live_lesson(self.homepage, 2, order=2)
+        self.fourth = create_live_lesson(self.homepage, 4, order=4)
+
+    def create_course(self, number, lessons):
+        course = Course(
+            title=f"Course {number}",
+            slug=f"course-{number}",
+            short_description="Course"
+        )
+        self.homepage.add_child(instance=course)
+        for order, lesson in enumerate(lessons, start=1):
+            LessonGroup.objects.create(
+                title=f"Part {order}",
+                short_description="Part",
+                order=order,
+                lesson=lesson,
+                course=course
+            )
+
+        return course
+
+    def test_neighbors_without_queries(self):
+        caching.lesson_neighbor_ids(self.first)
+
+        with self.assertNumQueries(0):
+            self.assertEquals(
+                caching.lesson_neighbor_ids(self.second),
+                (self.first.id, self.fourth.id)
+            )
+            self.assertEquals(
+                caching.lesson_neighbor_ids(self.first),
+                (None, self.second.id)
+            )
+            self.assertEquals(
+                caching.lesson_neighbor_ids(self.fourth),
+                (self.second.id, None)
+            )
+
+    def test_unpublish_updates_neighbors(self):
+        self.second.unpublish()
+
+        self.assertEquals(
+            caching.lesson_neighbor_ids(self.first),
+            (None, self.fourth.id)
+        )
+
+    def test_lesson_view_neighbors(self):
+        ret = self.client.get(self.second.get_absolute_url())
+
+        self.assertEquals(ret.context['prev_item'].id, self.first.id)
+        self.assertEquals(ret.context['next_item'].id, self.fourth.id)
+        self.assertContains(ret, self.first.get_absolute_url())
+        self.assertContains(ret, self.fourth.get_absolute_url())
+
+    def test_neighbor_cards_without_queries(self):
+        caching.lesson_neighbors(self.second)
+
+        with self.assertNumQueries(0):
+            prev_item, next_item = caching.lesson_neighbors(self.second)
+        self.assertIn("This is lesson number 1.", prev_item.html)
+        self.assertEquals(next_item.title, "Lesson 4")
+
+    def test_lesson_view_queries(self):
+        url = self.second.get_absolute_url()
+
+        def count_queries():
+            # warm up neighbor cards (and process wide caches)
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            return len(queries)
+
+        with_neighbors = count_queries()
+        self.first.unpublish()
+        self.fourth.unpublish()
+
+        # neighbors add no query to the lesson view
+        self.assertEquals(count_queries(), with_neighbors)
+
+    def test_publish_updates_neighbor_card(self):
+        self.client.get(self.second.get_absolute_url())
+
+        self.first.title = "Renamed lesson"
+        self.first.save_revision().publish()
+
+        ret = self.client.get(self.second.get_absolute_url())
+        self.assertContains(ret, "Renamed lesson")
+
+    def test_course_view_neighbors_within_course(self):
+        self.create_course(1, [self.first, self.second])
+        self.create_course(2, [self.fourth])
+
+        ret = self.client.get(
+            f"{self.second.get_absolute_url()}?view=course"
+        )
+        self.assertEquals(ret.context['prev_item'].lesson, self.first)
+        self.assertIsNone(ret.context['next_item'])
+
+        ret = self.client.get(
+            f"{self.fourth.get_absolute_url()}?view=course"
+        )
+        # lesson groups of other courses (with order 2) do not matter
+        self.assertIsNone(ret.context['prev_item'])
+        self.assertIsNone(ret.context['next_item'])
+
+    def test_course_view_of_lesson_without_course(self):
+        ret = self.client.get(
+            f"{self.first.get_absolute_url()}?view=course"
+        )
+
+        self.assertEquals(ret.status_code, 200)
+        self.assertEquals(ret.context['next_item'].id, self.second.id)
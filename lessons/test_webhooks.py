@@ -0,0 +1,177 @@
+import hashlib
+import hmac
+import json
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .models import PaymentEvent
+from .payments.plans import MONTHLY_AMOUNT
+from .utils import create_user
+from .webhooks import events
+
+SIGNING_KEY = 'whsec_test'
+
+
+def charge_event(event_id, email, amount=MONTHLY_AMOUNT):
+    return json.dumps({
+        'id': event_id,
+        'object': 'event',
+        'type': events.CHARGE_SUCCESS,
+        'data': {
+            'object': {
+                'id': 'ch_1',
+                'object': 'charge',
+                'amount': amount,
+                'receipt_email': email,
+            }
+        }
+    })
+
+
+def invoice_event(event_id, email, period_end):
+    return json.dumps({
+        'id': event_id,
+        'object': 'event',
+        'type': events.INVOICE_PAYMENT_SUCCESS,
+        'data': {
+            'object': {
+                'id': 'in_1',
+                'object': 'invoice',
+                'customer_email': email,
+                'paid': True,
+                'subscription': 'sub_1',
+                'lines': {
+                    'object': 'list',
+                    'data': [{
+                        'type': 'subscription',
+                        'period': {'start': 0, 'end': period_end}
+                    }]
+                }
+            }
+        }
+    })
+
+
+def signature(payload, secret=SIGNING_KEY):
+    timestamp = int(time.time())
+    digest = hmac.new(
+        secret.encode('utf-8'),
+        f"{timestamp}.{payload}".encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+
+    return f"t={timestamp},v1={digest}"
+
+
+@override_settings(STRIPE_WEBHOOK_SIGNING_KEY=SIGNING_KEY)
+class StripeWebhookTest(TestCase):
+
+    def setUp(self):
+        self.user = create_user(username="john", password="test")
+        self.user.email = 'john@mail.com'
+        self.user.save()
+
+    def post(self, payload, secret=SIGNING_KEY):
+        return self.client.post(
+            reverse('stripe_webhooks'),
+            data=payload,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=signature(payload, secret)
+        )
+
+    def test_webhook_only_stores_event(self):
+        payload = charge_event('evt_1', self.user.email)
+
+        # wagtail site lookup + INSERT (wrapped in a savepoint)
+        with self.assertNumQueries(4):
+            response = self.post(payload)
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(events.queue_depth(), 1)
+        self.user.profile.refresh_from_db()
+        self.assertIsNone(self.user.profile.pro_enddate)
+
+    def test_invalid_signature(self):
+        response = self.post(
+            charge_event('evt_1', self.user.email),
+            secret='whsec_other'
+        )
+
+        self.assertEquals(response.status_code, 400)
+        self.assertEquals(PaymentEvent.objects.count(), 0)
+
+    def test_unhandled_event_type_is_not_stored(self):
+        payload = json.dumps({
+            'id': 'evt_1',
+            'object': 'event',
+            'type': 'customer.created',
+            'data': {'object': {}}
+        })
+
+        self.assertEquals(self.post(payload).status_code, 200)
+        self.assertEquals(PaymentEvent.objects.count(), 0)
+
+    def test_duplicate_delivery(self):
+        payload = charge_event('evt_1', self.user.email)
+
+        self.post(payload)
+        self.assertEquals(self.post(payload).status_code, 200)
+
+        self.assertEquals(PaymentEvent.objects.count(), 1)
+        self.assertEquals(events.process_batch(), 1)
+        # already processed event delivered once again
+        self.post(payload)
+        self.assertEquals(events.process_batch(), 0)
+
+    def test_process_charge(self):
+        self.post(charge_event('evt_1', self.user.email))
+
+        self.assertEquals(events.process_batch(), 1)
+
+        self.user.profile.refresh_from_db()
+        self.assertTrue(self.user.profile.is_pro_user())
+        payment_event = PaymentEvent.objects.get()
+        self.assertEquals(payment_event.status, PaymentEvent.DONE)
+        self.assertEquals(payment_event.attempts, 1)
+        self.assertIsNotNone(payment_event.processing_time)
+        self.assertIsNotNone(payment_event.processed_at)
+
+    def test_process_invoice_without_subscription_retrieve(self):
+        period_end = int(time.time()) + 30 * 24 * 3600
+        self.post(invoice_event('evt_1', self.user.email, period_end))
+
+        # would fail with an API call (there is no Stripe key in tests)
+        self.assertEquals(events.process_batch(), 1)
+
+        self.user.profile.refresh_from_db()
+        self.assertTrue(self.user.profile.is_pro_user())
+
+    def test_failed_event_is_retried_later(self):
+        events.store_event(
+            provider=PaymentEvent.STRIPE,
+            event_id='evt_1',
+            event_type=events.CHARGE_SUCCESS,
+            payload=json.dumps({'id': 'evt_1', 'type': events.CHARGE_SUCCESS})
+        )
+
+        self.assertEquals(events.process_batch(), 1)
+
+        payment_event = PaymentEvent.objects.get()
+        self.assertEquals(payment_event.status, PaymentEvent.PENDING)
+        self.assertEquals(payment_event.attempts, 1)
+        self.assertNotEquals(payment_event.last_error, '')
+        # not due yet
+        self.assertEquals(events.process_batch(), 0)
+
+    def test_command_once(self):
+        self.post(charge_event('evt_1', self.user.email))
+
+        out = StringIO()
+        call_command('process_payment_events', '--once', stdout=out)
+
+        self.assertIn("processed=1", out.getvalue())
+        self.assertEquals(events.queue_depth(), 0)
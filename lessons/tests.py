@@ -1,8 +1,14 @@
 from datetime import date, datetime, timedelta
 
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from wagtail.core.models import Page
 
+from .entitlements import get_entitlement
 from .models import Lesson, User
 from .payments.stripe import create_or_update_user_profile
 from .payments.utils import PLUS_ONE_MONTH, PLUS_ONE_YEAR
@@ -157,6 +163,20 @@ class UserProfileTest(TestCase):
 
 
 class LessonsOrderTests(TestCase):
+    def add_lesson(self, number, **kwargs):
+        lesson = Lesson(
+            title=f"Lesson {number}",
+            slug=f"lesson-{number}",
+            short_description="Lesson",
+            **kwargs
+        )
+        self.homepage.add_child(instance=lesson)
+
+        return lesson
+
+    def setUp(self):
+        self.homepage = Page.objects.get(url_path='/home/')
+
     def test_initial_order(self):
         # if no other lesson is found in DB, initial
         # lesson order will be = 1
@@ -164,6 +184,42 @@ class LessonsOrderTests(TestCase):
             1, Lesson.next_order()
         )
 
+    def test_new_lessons_get_consecutive_orders(self):
+        first = self.add_lesson(1)
+        second = self.add_lesson(2)
+
+        self.assertEqual(first.order, 1)
+        self.assertEqual(second.order, 2)
+
+    def test_order_above_manually_set_one(self):
+        self.add_lesson(1, order=40)
+
+        self.assertEqual(self.add_lesson(2).order, 41)
+
+    def test_orders_are_not_reused(self):
+        self.add_lesson(1)
+        self.add_lesson(2).delete()
+
+        self.assertEqual(self.add_lesson(3).order, 3)
+
+    def test_next_order_query_count(self):
+        """
+        next_order runs same (small) number of queries regardless of number
+        of lessons and never loads lessons themselves.
+        """
+        self.add_lesson(1)
+        for count in (1, 10):
+            while Lesson.objects.count() < count:
+                self.add_lesson(Lesson.objects.count() + 1)
+
+            with CaptureQueriesContext(connection) as ctx:
+                Lesson.next_order()
+
+            # savepoint, counter, max(order), update, release savepoint
+            self.assertEqual(len(ctx), 5)
+            for query in ctx.captured_queries:
+                self.assertNotIn('"lessons_lesson"."content"', query['sql'])
+
 
 class PageViewTests(TestCase):
 
@@ -190,3 +246,56 @@ class PageViewTests(TestCase):
         self.assertEqual(
             resp.status_code, 200
         )
+
+
+class EntitlementTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User(username="user1")
+        self.user.save()
+
+    def test_not_pro(self):
+        entitlement = get_entitlement(self.user)
+
+        self.assertTrue(entitlement.is_authenticated)
+        self.assertFalse(entitlement.is_pro)
+        self.assertIsNone(entitlement.expires)
+
+    def test_anonymous(self):
+        entitlement = get_entitlement(AnonymousUser())
+
+        self.assertFalse(entitlement.is_authenticated)
+        self.assertFalse(entitlement.is_pro)
+
+    def test_discount(self):
+        enddate = date.today() + timedelta(days=15)
+        self.user.profile.discount_enddate = enddate
+        self.user.profile.save()
+
+        entitlement = get_entitlement(self.user)
+        self.assertTrue(entitlement.has_discount)
+        self.assertTrue(entitlement.is_pro)
+        self.assertEqual(entitlement.expires, enddate)
+
+    def test_cached_and_invalidated_on_profile_change(self):
+        get_entitlement(self.user)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(get_entitlement(self.user).is_pro)
+
+        create_or_update_user_profile(
+            self.user,
+            date.today() + timedelta(days=30)
+        )
+        self.assertTrue(get_entitlement(self.user).is_pro)
+
+    def test_request_entitlement(self):
+        self.user.set_password("test")
+        self.user.save()
+        client = Client()
+        client.login(username="user1", password="test")
+
+        ret = client.get(reverse('user_profile'))
+
+        self.assertFalse(ret.wsgi_request.entitlement.is_pro)
+        self.assertFalse(ret.context['is_pro'])
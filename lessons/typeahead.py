@@ -0,0 +1,179 @@
+"""
+Typeahead (autocomplete) of lesson, course and tag titles.
+
+Every process keeps a prefix index in memory: for each type, two sorted
+lists of normalized keys - whole titles and title suffixes starting at
+each later word (so that "ngi" finds "Deploy with Nginx"). A query is a
+bisect into those lists and a scan of the matching range; it runs no SQL
+query and does no cache lookups besides the index version.
+
+The index is versioned by the time lessons content changed last (see
+page_cache.content_changed_at, set on lesson publish/unpublish, course and
+tag changes). A process rebuilds its index on the first query after
+content changed - two small queries (courses and tags come from
+navigation menu and tag cloud caches).
+"""
+import bisect
+import logging
+import threading
+import unicodedata
+from urllib.parse import urlencode
+
+from . import page_cache
+from .caching import course_nav, tag_cloud
+from .models import Lesson, LessonTagIndex
+
+logger = logging.getLogger(__name__)
+
+LESSON = 'lesson'
+COURSE = 'course'
+TAG = 'tag'
+TYPES = (LESSON, COURSE, TAG)
+
+LIMIT = 8
+MAX_LIMIT = 20
+
+_lock = threading.Lock()
+_loaded = {'version': None, 'index': None}
+
+
+def normalize(text):
+    """
+    Lower case text without accents and with single spaces.
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = "".join(char for char in text if not unicodedata.combining(char))
+
+    return " ".join(text.casefold().split())
+
+
+class PrefixIndex:
+    """
+    Items (dictionaries with type, title and url) of one type, searchable
+    by prefix of their title or of any word in it.
+    """
+
+    def __init__(self, items):
+        self.items = items
+        titles = []
+        words = []
+        for position, item in enumerate(items):
+            key = normalize(item['title'])
+            titles.append((key, position))
+            parts = key.split(" ")
+            for start in range(1, len(parts)):
+                words.append((" ".join(parts[start:]), position))
+        titles.sort()
+        words.sort()
+        self.title_keys = [key for key, _ in titles]
+        self.title_items = [position for _, position in titles]
+        self.word_keys = [key for key, _ in words]
+        self.word_items = [position for _, position in words]
+
+    def scan(self, keys, positions, prefix, found, limit):
+        start = bisect.bisect_left(keys, prefix)
+        for index in range(start, len(keys)):
+            if len(found) >= limit or not keys[index].startswith(prefix):
+                break
+            if positions[index] not in found:
+                found.append(positions[index])
+
+    def lookup(self, prefix, limit):
+        """
+        Returns items whose title starts with prefix (normalized) and
+        items with a later word starting with it (at most limit items).
+        """
+        found = []
+        self.scan(self.title_keys, self.title_items, prefix, found, limit)
+        title_matches = len(found)
+        self.scan(self.word_keys, self.word_items, prefix, found, limit)
+
+        return (
+            [self.items[position] for position in found[:title_matches]],
+            [self.items[position] for position in found[title_matches:]]
+        )
+
+
+def tags_page_url():
+    page = LessonTagIndex.objects.live().first()
+
+    return page.url if page else "/"
+
+
+def build():
+    """
+    Returns a dictionary type => PrefixIndex of published lessons,
+    courses and tags of published lessons.
+    """
+    lessons = [
+        {
+            'type': LESSON,
+            'title': title,
+            'url': Lesson(order=order, slug=slug).get_absolute_url(),
+        }
+        for title, order, slug in Lesson.objects.live().values_list(
+            'title', 'order', 'slug'
+        )
+    ]
+    courses = [
+        {'type': COURSE, 'title': course['title'], 'url': course['url']}
+        for course in course_nav()
+    ]
+    tags_url = tags_page_url()
+    tags = [
+        {
+            'type': TAG,
+            'title': tag['name'],
+            'url': f"{tags_url}?{urlencode({'tag': tag['name']})}",
+        }
+        for tag in tag_cloud()
+    ]
+    logger.debug(
+        f"Built typeahead index of {len(lessons)} lessons,"
+        f" {len(courses)} courses and {len(tags)} tags"
+    )
+
+    return {
+        LESSON: PrefixIndex(lessons),
+        COURSE: PrefixIndex(courses),
+        TAG: PrefixIndex(tags),
+    }
+
+
+def index():
+    """
+    Index of this process, rebuilt if content changed since it was built.
+    """
+    version = page_cache.content_changed_at()
+
+    if _loaded['version'] == version:
+        return _loaded['index']
+
+    with _lock:
+        if _loaded['version'] != version:
+            _loaded['index'] = build()
+            _loaded['version'] = version
+
+    return _loaded['index']
+
+
+def lookup(query, types=TYPES, limit=LIMIT):
+    """
+    Returns up to limit items of given types matching query; titles which
+    start with query come first, then lessons, courses and tags.
+    """
+    prefix = normalize(query)
+
+    if not prefix:
+        return []
+
+    indexes = index()
+    title_matches = []
+    word_matches = []
+    for item_type in TYPES:
+        if item_type in types:
+            titles, words = indexes[item_type].lookup(prefix, limit)
+            title_matches += titles
+            word_matches += words
+
+    return (title_matches + word_matches)[:limit]
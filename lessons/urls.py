@@ -1,7 +1,8 @@
 from django.urls import path
 
 from . import views
-from .feed import LatestLessonsFeed
+from .feed import ATOM, COURSE, TAG, feed_view
+from .prerender import STATIC_PAGES
 from .views import PageView
 from .webhooks.paypal import webhook as paypal_webhook
 from .webhooks.stripe import webhook as stripe_webhook
@@ -32,23 +33,45 @@ urlpatterns = [
     path('stripe-webhooks', stripe_webhook, name='stripe_webhooks'),
     path('paypal-webhooks', paypal_webhook, name='paypal_webhooks'),
     path('profile', views.user_profile, name='user_profile'),
-    path('latest/feed/', LatestLessonsFeed(), name='feed'),
+    path('latest/feed/', feed_view, name='feed'),
+    path(
+        'latest/feed/atom/',
+        feed_view,
+        {'feed_format': ATOM},
+        name='feed_atom'
+    ),
+    path('tags/popular/', views.tags_by_popularity, name='popular_tags'),
+    path(
+        'tags/<slug:slug>/feed/',
+        feed_view,
+        {'kind': TAG},
+        name='tag_feed'
+    ),
+    path(
+        'tags/<slug:slug>/feed/atom/',
+        feed_view,
+        {'kind': TAG, 'feed_format': ATOM},
+        name='tag_feed_atom'
+    ),
+    path(
+        'courses/<slug:slug>/feed/',
+        feed_view,
+        {'kind': COURSE},
+        name='course_feed'
+    ),
+    path(
+        'courses/<slug:slug>/feed/atom/',
+        feed_view,
+        {'kind': COURSE, 'feed_format': ATOM},
+        name='course_feed_atom'
+    ),
+    path('typeahead', views.typeahead, name='typeahead'),
+    path('metrics', views.metrics, name='metrics'),
     path('500', views.handler500, name='handler500'),
     path('sentry-debug/', views.trigger_error)
 ]
 
-pages = [
-    'privacy',
-    'impressum',
-    'about',
-    'cookies',
-    'services',
-    'prices',
-    'mission',
-    'terms'
-]
-
-for page in pages:
+for page in STATIC_PAGES:
     urlpatterns.append(
         path(
             page,
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
 
 def create_user(username, password):
@@ -11,3 +13,30 @@ def create_user(username, password):
     user.set_password(password)
     user.save()
     return user
+
+
+def incr_counter(key, delta=1):
+    """
+    Adds delta to a counter in Django's default cache (shared by all
+    gunicorn workers).
+    """
+    # incr fails on missing keys
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # evicted in meantime; not worth a retry
+        pass
+
+
+def default_host():
+    """
+    Host header accepted by ALLOWED_HOSTS, for requests made by the
+    application itself (e.g. benchmarks, prerendering).
+    """
+    for name in settings.ALLOWED_HOSTS:
+        if name != '*' and not name.startswith('.'):
+            return name
+
+    # allowed in DEBUG mode when ALLOWED_HOSTS is empty
+    return 'localhost'
@@ -5,14 +5,21 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.http import Http404, HttpResponseBadRequest, HttpResponseRedirect
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest,
+                         HttpResponseForbidden, HttpResponseRedirect,
+                         JsonResponse)
 from django.shortcuts import render
 from django.views.decorators.http import require_GET, require_POST
 from django.views.generic import TemplateView
-from taggit.models import Tag
 
+from . import metrics as request_metrics
+from . import page_cache, prerender, search
+from . import typeahead as lesson_typeahead
+from .caching import (lesson_body, lesson_group_neighbors, lesson_neighbors,
+                      popular_tags, tag_cloud)
+from .conditional import conditional
 from .forms import ContactForm, SubscribeForm
-from .models import (PRO, Contact, Course, Lesson, LessonGroup, Subscription,
+from .models import (FREE, PRO, Contact, Lesson, LessonGroup, Subscription,
                      UserProfile)
 from .payments import paypal as my_paypal
 from .payments import plans
@@ -70,25 +77,41 @@ def index(request):
 
     lesson_type = request.GET.get('ltype', False)
 
-    lessons = Lesson.objects.filter(live=True).order_by('-first_published_at')
+    lessons = Lesson.objects.for_listing().filter(
+        live=True
+    ).order_by('-first_published_at')
     q = request.GET.get('q', None)
 
-    if q:
-        lessons = lessons.search(q)
-
+    # filter before search: search results are not
+    # a queryset anymore and cannot be filtered further
     if lesson_type:
         lessons = lessons.filter(lesson_type=lesson_type)
 
+    full_text = q and search.available()
+
+    if full_text:
+        # ranked ids of matching lessons; only lessons of displayed page
+        # are loaded (with snippets), see below
+        lessons = search.search(q, lesson_type)
+    elif q:
+        lessons = lessons.search(q)
+
+    page_cache.add_keys(request, page_cache.LESSON_LIST)
+
     paginator = Paginator(lessons, ITEMS_PER_PAGE)
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
+    page_lessons = page_obj.object_list
+
+    if full_text:
+        page_lessons = search.results(q, page_lessons)
 
     return render(
         request,
         'lessons/index.html',
         {
-            'lessons': page_obj.object_list,
-            'tags': Tag.objects.order_by('name'),
+            'lessons': page_lessons,
+            'tags': tag_cloud(),
             'page_obj': page_obj,
             'page_number': int(page_number),
             'paginator': paginator,
@@ -97,6 +120,21 @@ def index(request):
     )
 
 
+def lesson_resource(request, order, slug):
+    row = Lesson.objects.filter(order=order).values_list(
+        'id',
+        'last_published_at'
+    ).first()
+
+    if row is None:
+        return None
+
+    lesson_id, published_at = row
+
+    return page_cache.lesson_key(lesson_id), published_at
+
+
+@conditional(lesson_resource)
 def lesson(request, order, slug):
     """
     One lesson can be viewed in two different ways:
@@ -140,50 +178,72 @@ def lesson(request, order, slug):
         raise Http404("Lesson not found")
 
     user = request.user
+    is_pro = request.entitlement.is_pro
 
     if lesson.lesson_type == PRO and not user.is_authenticated:
         return login_with_pro(lesson_order=order)
     elif lesson.lesson_type == PRO and user.is_authenticated:
-        if user.profile and not user.profile.is_pro_user():
+        if not is_pro:
             # means an authenticated user which is not PRO
             # wants to access a PRO lesson => he will be redirected
             # to upgrade view with lesson_ord argument
             return upgrade_with_pro(lesson_order=order)
 
-    view = request.GET.get('view', 'lesson')
-
-    if view == 'lesson':
-        template_name = 'lessons/lesson.html'
-    else:
-        template_name = 'lessons/lesson_within_course.html'
+    page_cache.add_keys(request, page_cache.lesson_key(lesson.id))
 
+    view = request.GET.get('view', 'lesson')
+    template_name = 'lessons/lesson.html'
     course = None
     lesson_group = None
+    lesson_groups = []
+    similar_lessons = []
 
     if view == 'course':
-        if lesson.lesson_groups.count() > 0:
-            lesson_group = lesson.lesson_groups.first()
-            course = lesson_group.course
-            similar_lessons = []
-            lesson_groups = LessonGroup.objects.filter(
+        lesson_group = lesson.lesson_groups.select_related('course').first()
+
+    if lesson_group:
+        template_name = 'lessons/lesson_within_course.html'
+        course = lesson_group.course
+        lesson_groups = list(
+            LessonGroup.objects.filter(
                 course=course
+            ).select_related('lesson').defer(
+                'lesson__content',
+                'lesson__script'
             ).order_by('order')
-            next_item = lesson_group.get_next_lesson_group_obj()
-            prev_item = lesson_group.get_prev_lesson_group_obj()
+        )
+        prev_item, next_item = lesson_group_neighbors(
+            lesson_group,
+            lesson_groups
+        )
+        page_cache.add_keys(
+            request,
+            page_cache.course_key(course.id),
+            *[
+                page_cache.lesson_key(item.lesson_id)
+                for item in lesson_groups if item.lesson_id
+            ]
+        )
     else:
-        lesson_groups = []
+        # also lesson which is not part of any course is displayed
+        # as independent lesson
         similar_lessons = [
             sim_lesson.post
             for sim_lesson in lesson.similar_lessons.all()
         ]
-        next_item = lesson.get_next_lesson_obj()
-        prev_item = lesson.get_prev_lesson_obj()
+        prev_item, next_item = lesson_neighbors(lesson)
+        page_cache.add_keys(request, *[
+            page_cache.lesson_key(item.id)
+            for item in similar_lessons + [prev_item, next_item]
+            if item
+        ])
 
     return render(
         request,
         template_name,
         {
             'page': lesson,
+            'lesson_body': lesson_body(lesson, PRO if is_pro else FREE),
             'course': course,
             'lesson_group': lesson_group,
             'similar_lessons': similar_lessons,
@@ -196,13 +256,21 @@ def lesson(request, order, slug):
 
 class PageView(TemplateView):
 
+    def get(self, request, *args, **kwargs):
+        response = prerender.serve(request, request.resolver_match.url_name)
+
+        if response is not None:
+            return response
+
+        # static content; only navigation (courses) changes
+        page_cache.add_keys(request)
+
+        return super().get(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
         context = super().get_context_data(**kwargs)
-        courses = Course.objects.order_by(
-            '-first_published_at'
-        )
-        context['courses'] = courses
+        # courses are provided by lessons.context_processors.courses
         context['website'] = settings.WEBSITE
         context['service_name'] = settings.SERVICE_NAME
         context['email'] = settings.SERVICE_EMAIL
@@ -286,18 +354,13 @@ def user_profile(request):
         )
         user_profile.save()
 
-    is_pro = False
-
-    if user_profile:
-        is_pro = user_profile.is_pro_user()
-
     return render(
         request,
         'account/profile.html',
         {
             'user': user,
             'user_profile': user_profile,
-            'is_pro': is_pro,
+            'is_pro': request.entitlement.is_pro,
             'automatic_renew': user_profile.is_with_automatic_renew
         }
     )
@@ -517,3 +580,68 @@ def card(request):
 
 
 login_view = LessonLoginView.as_view()
+
+
+@require_GET
+def metrics(request):
+    """
+    Per view metrics (see lessons.metrics) for Prometheus.
+    """
+    if not request_metrics.authorized(request):
+        return HttpResponseForbidden()
+
+    # numbers of this worker would be visible only after next flush
+    request_metrics.flush()
+
+    return HttpResponse(
+        request_metrics.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+@require_GET
+def tags_by_popularity(request):
+    """
+    Tags of live lessons, most used first.
+    """
+    page_cache.add_keys(request, page_cache.LESSON_LIST)
+
+    return render(
+        request,
+        'lessons/popular_tags.html',
+        {'popular_tags': popular_tags()}
+    )
+
+
+@require_GET
+def typeahead(request):
+    """
+    Lessons, courses and tags with title (or a word in it) starting with
+    q, as JSON. Optional: limit, type (repeated; lesson, course, tag).
+    """
+    types = request.GET.getlist('type') or lesson_typeahead.TYPES
+
+    try:
+        limit = int(request.GET.get('limit', lesson_typeahead.LIMIT))
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    if limit < 1 or not set(types) <= set(lesson_typeahead.TYPES):
+        return HttpResponseBadRequest()
+
+    q = request.GET.get('q', '')
+    response = JsonResponse({
+        'query': q,
+        'results': lesson_typeahead.lookup(
+            q,
+            types=types,
+            limit=min(limit, lesson_typeahead.MAX_LIMIT)
+        )
+    })
+    page_cache.set_headers(
+        response,
+        [page_cache.SITE, page_cache.LESSON_LIST],
+        csrf=False
+    )
+
+    return response
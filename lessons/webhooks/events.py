@@ -0,0 +1,169 @@
+"""
+Queue of received payment webhook events.
+
+Webhook views only verify the signature and store the event (store_event)
+- a single INSERT, so provider gets its 200 response right away.
+process_batch (run by process_payment_events management command) applies
+stored events, each one in its own transaction together with its status
+update. Failed events are retried with exponential backoff.
+"""
+import json
+import logging
+import time
+
+import stripe
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Max
+from django.utils import timezone
+from lessons.models import PaymentEvent
+from lessons.notifications import backoff
+from lessons.payments.stripe import (API_KEY, upgrade_customer_from_charge,
+                                     upgrade_customer_from_invoice)
+
+logger = logging.getLogger(__name__)
+
+INVOICE_PAYMENT_SUCCESS = 'invoice.payment_succeeded'
+CHARGE_SUCCESS = 'charge.succeeded'
+
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 8
+
+
+def handle_stripe_event(event):
+    if event.type == INVOICE_PAYMENT_SUCCESS:
+        # recurring payments
+        upgrade_customer_from_invoice(
+            invoice=event.data.object
+        )
+    if event.type == CHARGE_SUCCESS:
+        # one time charges
+        upgrade_customer_from_charge(
+            charge=event.data.object
+        )
+
+
+HANDLERS = {
+    PaymentEvent.STRIPE: (
+        handle_stripe_event,
+        [INVOICE_PAYMENT_SUCCESS, CHARGE_SUCCESS]
+    ),
+}
+
+
+def is_handled(provider, event_type):
+    _, event_types = HANDLERS[provider]
+
+    return event_type in event_types
+
+
+def store_event(provider, event_id, event_type, payload):
+    """
+    Stores event for processing, unless it was already received.
+    Returns True if event is new.
+    """
+    try:
+        with transaction.atomic():
+            PaymentEvent.objects.create(
+                provider=provider,
+                event_id=event_id,
+                event_type=event_type,
+                payload=payload
+            )
+    except IntegrityError:
+        logger.info(f"Duplicate {provider} event {event_id} ignored")
+        return False
+
+    return True
+
+
+def load_event(payment_event):
+    if payment_event.provider == PaymentEvent.STRIPE:
+        return stripe.Event.construct_from(
+            json.loads(payment_event.payload),
+            API_KEY
+        )
+
+    raise ValueError(f"Unknown provider {payment_event.provider}")
+
+
+def process(payment_event):
+    handler, _ = HANDLERS[payment_event.provider]
+    started = time.monotonic()
+
+    try:
+        # on error, changes done by handler are rolled back
+        with transaction.atomic():
+            handler(load_event(payment_event))
+    except Exception as error:
+        logger.exception(f"Failed to process event {payment_event}")
+        payment_event.attempts += 1
+        payment_event.last_error = str(error)
+        if payment_event.attempts >= MAX_ATTEMPTS:
+            payment_event.status = PaymentEvent.FAILED
+        else:
+            payment_event.next_attempt_at = timezone.now() + backoff(
+                payment_event.attempts
+            )
+    else:
+        payment_event.attempts += 1
+        payment_event.status = PaymentEvent.DONE
+        payment_event.processed_at = timezone.now()
+
+    payment_event.processing_time = (time.monotonic() - started) * 1000
+    payment_event.save()
+
+    return payment_event.status == PaymentEvent.DONE
+
+
+def process_next():
+    """
+    Processes one due event. Returns None if there is nothing to process,
+    otherwise True/False (processed successfully or not).
+
+    Event row stays locked until it is processed; locked rows are
+    skipped, so several workers can run at the same time.
+    """
+    with transaction.atomic():
+        payment_event = PaymentEvent.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            status=PaymentEvent.PENDING,
+            next_attempt_at__lte=timezone.now()
+        ).order_by('next_attempt_at').first()
+
+        if payment_event is None:
+            return None
+
+        return process(payment_event)
+
+
+def process_batch(batch_size=BATCH_SIZE):
+    """
+    Returns number of processed events (successfully or not).
+    """
+    count = 0
+
+    while count < batch_size:
+        if process_next() is None:
+            break
+        count += 1
+
+    return count
+
+
+def queue_depth():
+    return PaymentEvent.objects.filter(
+        status=PaymentEvent.PENDING
+    ).count()
+
+
+def latency_stats():
+    """
+    Average and max processing time (ms) of processed events.
+    """
+    return PaymentEvent.objects.filter(
+        status=PaymentEvent.DONE
+    ).aggregate(
+        avg=Avg('processing_time'),
+        max=Max('processing_time')
+    )
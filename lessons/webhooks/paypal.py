@@ -5,7 +5,8 @@ from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from lessons.payments import paypal as my_paypal
-from paypalrestsdk.notifications import WebhookEvent
+
+from .paypal_certs import cert_store
 
 
 @require_POST
@@ -19,7 +20,8 @@ def webhook(request):
     auth_algo = request.headers['Paypal-Auth-Algo']
     actual_signature = request.headers['Paypal-Transmission-Sig']
 
-    response = WebhookEvent.verify(
+    # signing certificate is downloaded only once (see paypal_certs)
+    response = cert_store.verify(
         transmission_id,
         timestamp,
         webhook_id,
@@ -0,0 +1,253 @@
+"""
+Verification of PayPal webhook signatures without a certificate download
+per delivery.
+
+paypalrestsdk's WebhookEvent.verify downloads the signing certificate from
+Paypal-Cert-Url header on every call. CertStore downloads it only once:
+certificate is fetched only from allowed hosts, verified (chain of trust,
+common name, validity period) and kept in a small in-process LRU and in
+django cache (shared by all workers) until it expires.
+"""
+import binascii
+import hashlib
+import logging
+import os
+from base64 import b64decode
+from collections import OrderedDict
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+import paypalrestsdk
+import requests
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.x509.oid import NameOID
+from django.conf import settings
+from django.core.cache import cache
+from OpenSSL import crypto
+
+logger = logging.getLogger(__name__)
+
+# can be overridden with PAYPAL_CERT_HOSTS setting
+CERT_HOSTS = ['api.paypal.com', 'api.sandbox.paypal.com']
+COMMON_NAME_SUFFIX = '.paypal.com'
+# trust chain shipped with paypalrestsdk
+CHAIN_PATHS = [
+    os.path.join(
+        os.path.dirname(paypalrestsdk.__file__),
+        'data',
+        name
+    ) for name in (
+        'DigiCertHighAssuranceEVRootCA.crt.pem',
+        'DigiCertSHA2ExtendedValidationServerCA.crt.pem',
+    )
+]
+
+CERT_KEY = 'lessons:paypal_cert:{digest}'
+# certificate is kept at most this long (seconds), even if valid longer
+CERT_TIMEOUT = 24 * 3600
+FETCH_TIMEOUT = 5
+MAX_SIZE = 16
+
+AUTH_ALGOS = {
+    'SHA256withRSA': hashes.SHA256,
+    'sha256WithRSAEncryption': hashes.SHA256,
+    'sha256': hashes.SHA256,
+}
+
+
+class CertError(Exception):
+    pass
+
+
+def load_chain(paths):
+    chain = []
+    for path in paths:
+        with open(path, 'rb') as cert_file:
+            chain.append(x509.load_pem_x509_certificate(cert_file.read()))
+
+    return chain
+
+
+def expected_signature_input(transmission_id, timestamp, webhook_id, body):
+    """
+    Same input as in paypalrestsdk's WebhookEvent._get_expected_sig
+    """
+    crc = binascii.crc32(body.encode('utf-8')) & 0xffffffff
+
+    return f"{transmission_id}|{timestamp}|{webhook_id}|{crc}".encode(
+        'utf-8'
+    )
+
+
+def not_valid_after(cert):
+    if hasattr(cert, 'not_valid_after_utc'):
+        # cryptography >= 42
+        return cert.not_valid_after_utc
+
+    return cert.not_valid_after.replace(tzinfo=timezone.utc)
+
+
+class CertStore:
+
+    def __init__(
+        self,
+        chain=None,
+        hosts=None,
+        max_size=MAX_SIZE,
+        fetch=None,
+    ):
+        self._chain = chain if chain is not None else load_chain(CHAIN_PATHS)
+        self._hosts = hosts if hosts is not None else getattr(
+            settings, 'PAYPAL_CERT_HOSTS', CERT_HOSTS
+        )
+        self._max_size = max_size
+        self._fetch = fetch or self.download
+        # url -> certificate, least recently used first
+        self._certs = OrderedDict()
+
+    def check_url(self, cert_url):
+        url = urlparse(cert_url)
+
+        if url.scheme != 'https' or url.hostname not in self._hosts:
+            raise CertError(f"Certificate url {cert_url} not allowed")
+
+    def download(self, cert_url):
+        response = requests.get(cert_url, timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+
+        return response.content
+
+    def verify_cert(self, cert, now=None):
+        """
+        Raises CertError if certificate is not issued (through the chain)
+        for a paypal.com name or is not valid at this moment.
+        """
+        now = now or datetime.now(timezone.utc)
+
+        if not_valid_after(cert) <= now:
+            raise CertError("Certificate expired")
+
+        names = cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
+        if not names or not names[0].value.lower().endswith(
+            COMMON_NAME_SUFFIX
+        ):
+            raise CertError("Certificate common name is not PayPal's")
+
+        store = crypto.X509Store()
+        for trusted in self._chain:
+            store.add_cert(crypto.X509.from_cryptography(trusted))
+
+        try:
+            crypto.X509StoreContext(
+                store,
+                crypto.X509.from_cryptography(cert)
+            ).verify_certificate()
+        except crypto.X509StoreContextError as error:
+            raise CertError(f"Untrusted certificate: {error}")
+
+    def remember(self, cert_url, cert):
+        self._certs[cert_url] = cert
+        self._certs.move_to_end(cert_url)
+
+        while len(self._certs) > self._max_size:
+            self._certs.popitem(last=False)
+
+    def from_memory(self, cert_url, now):
+        cert = self._certs.get(cert_url)
+
+        if cert is None:
+            return None
+
+        if not_valid_after(cert) <= now:
+            del self._certs[cert_url]
+            return None
+
+        self._certs.move_to_end(cert_url)
+
+        return cert
+
+    def get(self, cert_url):
+        """
+        Returns verified certificate (cryptography.x509.Certificate).
+        """
+        now = datetime.now(timezone.utc)
+        cert = self.from_memory(cert_url, now)
+
+        if cert is not None:
+            return cert
+
+        self.check_url(cert_url)
+        key = CERT_KEY.format(
+            digest=hashlib.sha1(cert_url.encode('utf-8')).hexdigest()
+        )
+        pem = cache.get(key)
+
+        if pem is None:
+            logger.info(f"Downloading PayPal certificate {cert_url}")
+            pem = self._fetch(cert_url)
+
+        try:
+            cert = x509.load_pem_x509_certificate(pem)
+            # certificates from shared cache are verified once per process
+            # too
+            self.verify_cert(cert, now)
+        except (ValueError, CertError) as error:
+            cache.delete(key)
+            raise CertError(f"Invalid certificate: {error}")
+
+        timeout = min(
+            CERT_TIMEOUT,
+            int((not_valid_after(cert) - now).total_seconds())
+        )
+        cache.set(key, pem, timeout)
+        self.remember(cert_url, cert)
+
+        return cert
+
+    def verify(
+        self,
+        transmission_id,
+        timestamp,
+        webhook_id,
+        event_body,
+        cert_url,
+        actual_sig,
+        auth_algo='SHA256withRSA'
+    ):
+        """
+        Same arguments as paypalrestsdk's WebhookEvent.verify.
+        Returns True if signature is valid.
+        """
+        algo = AUTH_ALGOS.get(auth_algo)
+
+        if algo is None:
+            logger.warning(f"Unsupported auth algo {auth_algo}")
+            return False
+
+        try:
+            cert = self.get(cert_url)
+            cert.public_key().verify(
+                b64decode(actual_sig),
+                expected_signature_input(
+                    transmission_id,
+                    timestamp,
+                    webhook_id,
+                    event_body
+                ),
+                padding.PKCS1v15(),
+                algo()
+            )
+        except (CertError, InvalidSignature, binascii.Error) as error:
+            logger.warning(f"PayPal webhook not verified: {error!r}")
+            return False
+        except requests.RequestException as error:
+            logger.error(f"PayPal certificate download failed: {error}")
+            return False
+
+        return True
+
+
+cert_store = CertStore()
@@ -6,24 +6,24 @@ from django.views.decorators.http import require_POST
 from django.http import (HttpResponseBadRequest, HttpResponse)
 from django.conf import settings
 
-from lessons.payments.stripe import (
-    upgrade_customer_from_invoice,
-    upgrade_customer_from_charge
-)
+from lessons.models import PaymentEvent
 
-logger = logging.getLogger(__name__)
+from .events import is_handled, store_event
 
-INVOICE_PAYMENT_SUCCESS = 'invoice.payment_succeeded'
-CHARGE_SUCCESS = 'charge.succeeded'
+logger = logging.getLogger(__name__)
 
 
 @require_POST
 @csrf_exempt
 def webhook(request):
+    """
+    Verifies and stores the event; events are processed by
+    process_payment_events management command (lessons.webhooks.events).
+    """
     logger.info("Stripe webhook received")
 
     payload = request.body
-    sig_header = request.META['HTTP_STRIPE_SIGNATURE']
+    sig_header = request.META.get('HTTP_STRIPE_SIGNATURE', '')
     event = None
 
     try:
@@ -40,15 +40,12 @@ def webhook(request):
         logger.warning("Invalid signature")
         return HttpResponseBadRequest()
 
-    if event.type == INVOICE_PAYMENT_SUCCESS:
-        # recurring payments
-        upgrade_customer_from_invoice(
-            invoice=event.data.object
-        )
-    if event.type == CHARGE_SUCCESS:
-        # one time charges
-        upgrade_customer_from_charge(
-            charge=event.data.object
+    if is_handled(PaymentEvent.STRIPE, event.type):
+        store_event(
+            provider=PaymentEvent.STRIPE,
+            event_id=event.id,
+            event_type=event.type,
+            payload=payload.decode('utf-8')
         )
 
     return HttpResponse(status=200)